@@ -0,0 +1,78 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Compares the records per second parsed by the previous ALT dispatch (trying the regex of each kind of record
+in order) against the single-pass ALT classifier, on the records of a VCF file
+Expected usage:
+    $ python bench_alt_classifier.py <vcf_file>
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import time
+
+
+def _legacy_parse(rec):
+    # Dispatch of VariantExtractor.__handle_record prior to classify_alt
+    from variant_extractor.private._parser import parse_breakend_sv, parse_shorthand_sv, parse_sgl_sv, \
+        parse_standard_record
+    return parse_breakend_sv(rec) or parse_shorthand_sv(rec) or parse_sgl_sv(rec) or parse_standard_record(rec)
+
+
+def _classifier_parse(rec):
+    from variant_extractor.private._parser import parse_breakend_sv, parse_shorthand_sv, create_sgl_record, \
+        create_standard_record, classify_alt, ALT_BREAKEND, ALT_SHORTHAND, ALT_SGL, ALT_STANDARD
+    alt = rec.alts[0]
+    alt_class = classify_alt(alt)
+    if alt_class == ALT_BREAKEND:
+        return parse_breakend_sv(rec)
+    if alt_class == ALT_SHORTHAND:
+        return parse_shorthand_sv(rec)
+    if alt_class == ALT_SGL and 'SVTYPE' in rec.info:
+        return create_sgl_record(rec)
+    if alt_class == ALT_SGL or alt_class == ALT_STANDARD:
+        return create_standard_record(rec, alt)
+    return None
+
+
+def _measure(function, records, repeats):
+    best = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        for rec in records:
+            function(rec)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+    import pysam
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the ALT classifier')
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of runs, the fastest one is reported')
+    args = parser.parse_args()
+
+    pysam.set_verbosity(0)
+    with pysam.VariantFile(args.vcf_file) as variant_file:
+        # Only biallelic records are parsed directly, multiallelic ones are split beforehand
+        records = [rec for rec in variant_file if rec.alts and len(rec.alts) == 1]
+    # Both implementations must parse the same records
+    for rec in records:
+        legacy_record, classifier_record = _legacy_parse(rec), _classifier_parse(rec)
+        assert (legacy_record is None) == (classifier_record is None), f'Different result for:\n{rec}'
+        if legacy_record is not None:
+            assert legacy_record.variant_type == classifier_record.variant_type, f'Different type for:\n{rec}'
+
+    legacy_time = _measure(_legacy_parse, records, args.repeats)
+    classifier_time = _measure(_classifier_parse, records, args.repeats)
+    print(f'Records: {len(records)}')
+    print(f'{"implementation":<20}{"time (s)":>10}{"records/s":>14}')
+    for name, elapsed in [('regex chain', legacy_time), ('ALT classifier', classifier_time)]:
+        print(f'{name:<20}{elapsed:>10.2f}{len(records) / elapsed:>14.0f}')
+    print(f'Speedup: {legacy_time / classifier_time:.2f}x')
@@ -0,0 +1,53 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the time to extract several VCF files into a single DataFrame, one after another in a loop of
+VariantExtractor.to_dataframe and with extract_many using several worker processes
+Expected usage:
+    $ python bench_batch.py <vcf_file> [<vcf_file> ...] [--workers 1 4] [--fasta_ref <fasta_file>]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import os
+import time
+
+
+def _serial(vcf_files, **kwargs):
+    import pandas as pd
+    from variant_extractor import VariantExtractor
+    dataframes = []
+    for vcf_file in vcf_files:
+        extractor = VariantExtractor(vcf_file, **kwargs)
+        df = extractor.to_dataframe()
+        extractor.close()
+        df.insert(0, 'source', vcf_file)
+        dataframes.append(df)
+    return pd.concat(dataframes, ignore_index=True)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+    from variant_extractor.batch import extract_many
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the extraction of several VCF files')
+    parser.add_argument('vcf_files', nargs='+', help='VCF files')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help='Numbers of worker processes')
+    parser.add_argument('--fasta_ref', help='FASTA reference')
+    args = parser.parse_args()
+    kwargs = {'ensure_pairs': False, 'fasta_ref': args.fasta_ref}
+
+    print(f'{"run":<28}{"time (s)":>10}{"variants/s":>12}')
+    start_time = time.perf_counter()
+    df = _serial(args.vcf_files, **kwargs)
+    elapsed = time.perf_counter() - start_time
+    print(f'{"serial loop":<28}{elapsed:>10.2f}{len(df) / elapsed:>12.0f}')
+    for workers in args.workers:
+        start_time = time.perf_counter()
+        result = extract_many(args.vcf_files, workers=workers, **kwargs)
+        elapsed = time.perf_counter() - start_time
+        print(f'{f"extract_many, {workers} workers":<28}{elapsed:>10.2f}{len(result.table) / elapsed:>12.0f}')
+        for report in result.failed:
+            print(f'  {report.source}: {report.error}')
@@ -0,0 +1,43 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the time to iterate the variants of a VCF file without the extraction cache, storing them in the cache (first
+run) and loading them from it (later runs)
+Expected usage:
+    $ python bench_cache.py <vcf_file> [--runs 3]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import os
+import tempfile
+import time
+
+
+def _measure(vcf_file, **kwargs):
+    from variant_extractor import VariantExtractor
+    start_time = time.perf_counter()
+    total = sum(1 for _ in VariantExtractor(vcf_file, ensure_pairs=False, **kwargs))
+    return total, time.perf_counter() - start_time
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the extraction cache')
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('--runs', type=int, default=3, help='Number of runs loading the variants from the cache')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        runs = [('extraction', {}), ('extraction, keep_raw=False', {'keep_raw': False}),
+                ('first run (stores the cache)', {'cache_dir': cache_dir})]
+        runs += [(f'cached run {i + 1}', {'cache_dir': cache_dir}) for i in range(args.runs)]
+        print(f'{"run":<32}{"time (s)":>10}{"variants/s":>12}')
+        for name, kwargs in runs:
+            total, elapsed = _measure(args.vcf_file, **kwargs)
+            print(f'{name:<32}{elapsed:>10.2f}{total / elapsed:>12.0f}')
+        size = sum(os.path.getsize(os.path.join(cache_dir, file_name)) for file_name in os.listdir(cache_dir))
+        print(f'Cache size: {size / 1024 / 1024:.1f} MiB, VCF file: {os.path.getsize(args.vcf_file) / 1024 / 1024:.1f} MiB')
@@ -0,0 +1,73 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the extraction time of a synthetic VCF file of paired breakends with many annotation INFO fields,
+comparing the extraction alone, the extraction decoding the whole INFO column of every breakend (as the
+pairing of breakends did prior to the single-key lookups) and the extraction with info_keys
+Expected usage:
+    $ python bench_info_projection.py [--pairs 20000] [--annotations 40]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import os
+import random
+import tempfile
+import time
+
+
+def _write_vcf(path, n_pairs, n_annotations):
+    random.seed(0)
+    with open(path, 'w') as vcf:
+        vcf.write('##fileformat=VCFv4.2\n##contig=<ID=1,length=1000000000>\n')
+        vcf.write('##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of SV">\n')
+        vcf.write('##INFO=<ID=MATEID,Number=1,Type=String,Description="ID of the mate breakend">\n')
+        for j in range(n_annotations):
+            vcf.write(f'##INFO=<ID=ANN{j},Number=.,Type=Float,Description="Annotation {j}">\n')
+        vcf.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n')
+        lines = []
+        for i in range(n_pairs):
+            pos_a = 1000 + i * 100
+            pos_b = pos_a + 50
+            for name, pos, mate, mate_pos in [('a', pos_a, 'b', pos_b), ('b', pos_b, 'a', pos_a)]:
+                annotations = ';'.join(f'ANN{j}={random.random():.4f},{random.random():.4f}' for j in range(n_annotations))
+                lines.append((pos, f'1\t{pos}\tbnd{i}{name}\tN\tN[1:{mate_pos}[\t.\tPASS\t'
+                                   f'SVTYPE=BND;MATEID=bnd{i}{mate};{annotations}\n'))
+        for _, line in sorted(lines):
+            vcf.write(line)
+
+
+def _measure(vcf_file, access, **kwargs):
+    from variant_extractor import VariantExtractor
+    start_time = time.perf_counter()
+    total = 0
+    for variant_record in VariantExtractor(vcf_file, **kwargs):
+        access(variant_record)
+        total += 1
+    return total, time.perf_counter() - start_time
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the INFO decoding of breakend extraction')
+    parser.add_argument('--pairs', type=int, default=20000, help='Number of breakend pairs')
+    parser.add_argument('--annotations', type=int, default=40, help='Number of annotation INFO fields per breakend')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vcf_file = os.path.join(tmp_dir, 'breakends.vcf')
+        _write_vcf(vcf_file, args.pairs, args.annotations)
+        runs = [
+            ('extraction', lambda r: None, {}),
+            ('extraction + whole INFO (previous)', lambda r: r.info, {}),
+            ('info_keys=[\'SVTYPE\'] + INFO', lambda r: r.info, {'info_keys': ['SVTYPE']}),
+            ('info_keys=[\'SVTYPE\'], keep_raw=False', lambda r: r.info, {'info_keys': ['SVTYPE'], 'keep_raw': False}),
+        ]
+        print(f'Breakend pairs: {args.pairs}, annotation INFO fields: {args.annotations}')
+        print(f'{"extraction":<40}{"time (s)":>10}{"variants/s":>12}')
+        for name, access, kwargs in runs:
+            total, elapsed = _measure(vcf_file, access, **kwargs)
+            print(f'{name:<40}{elapsed:>10.2f}{total / elapsed:>12.0f}')
@@ -0,0 +1,97 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the time to match a test set against a truth set of synthetic variants with match() and with pandas merges
+(an exact merge for SNVs and, for SVs, a merge by contigs, type and bins of the window size filtered by distance,
+without one-to-one assignment)
+Expected usage:
+    $ python bench_match.py [--snvs 1000000] [--svs 100000]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+CONTIGS = [str(i) for i in range(1, 23)]
+SV_TYPES = ['DEL', 'DUP', 'INV', 'TRA']
+BRACKETS = {'DEL': 'N[', 'DUP': ']N', 'INV': 'N]]', 'TRA': 'N[['}
+
+
+def _synthetic(n_snvs, n_svs, rng):
+    # DataFrame with the columns of VariantExtractor.to_dataframe
+    n = n_snvs + n_svs
+    start_chrom = np.array(CONTIGS)[rng.integers(0, len(CONTIGS), n)]
+    start = rng.integers(1, 200_000_000, n)
+    sv_types = np.array(SV_TYPES)[rng.integers(0, len(SV_TYPES), n_svs)]
+    translocation = sv_types == 'TRA'
+    sv_length = np.where(translocation, 0, rng.integers(50, 100_000, n_svs))
+    end_chrom = start_chrom.copy()
+    end_chrom[n_snvs:] = np.where(translocation, np.array(CONTIGS)[rng.integers(0, len(CONTIGS), n_svs)],
+                                  start_chrom[n_snvs:])
+    end = start.copy()
+    end[n_snvs:] = np.where(translocation, rng.integers(1, 200_000_000, n_svs), start[n_snvs:] + sv_length)
+    bases = np.array(list('ACGT'))
+    return pd.DataFrame({
+        'start_chrom': pd.Categorical(start_chrom),
+        'start': start.astype(np.uint64),
+        'end_chrom': pd.Categorical(end_chrom),
+        'end': end.astype(np.uint64),
+        'ref': pd.Categorical(np.concatenate((bases[rng.integers(0, 4, n_snvs)], ['N'] * n_svs))),
+        'alt': pd.Categorical(np.concatenate((bases[rng.integers(0, 4, n_snvs)],
+                                              np.where(translocation, 'N[1:1[', '<' + sv_types + '>')))),
+        'length': np.concatenate((np.ones(n_snvs), sv_length)).astype(np.uint64),
+        'brackets': pd.Categorical(np.concatenate(([''] * n_snvs, [BRACKETS[t] for t in sv_types]))),
+        'type_inferred': pd.Categorical(np.concatenate((['SNV'] * n_snvs, sv_types))),
+    })
+
+
+def _pandas_match(truth, test, window):
+    snv_columns = ['start_chrom', 'start', 'ref', 'alt']
+    snvs = truth[truth['type_inferred'] == 'SNV'][snv_columns].astype({'start_chrom': str, 'ref': str, 'alt': str}) \
+        .merge(test[test['type_inferred'] == 'SNV'][snv_columns].astype({'start_chrom': str, 'ref': str, 'alt': str}))
+    sv_columns = ['start_chrom', 'end_chrom', 'type_inferred']
+    truth_svs = truth[truth['type_inferred'] != 'SNV'].astype({column: str for column in sv_columns})
+    test_svs = test[test['type_inferred'] != 'SNV'].astype({column: str for column in sv_columns})
+    truth_svs['bin'] = truth_svs['start'].astype(np.int64) // window
+    # Each test SV is merged with the truth SVs of its bin and the adjacent ones
+    test_svs = pd.concat([test_svs.assign(bin=test_svs['start'].astype(np.int64) // window + offset)
+                          for offset in (-1, 0, 1)])
+    svs = truth_svs.merge(test_svs, on=sv_columns + ['bin'])
+    svs = svs[((svs['start_x'].astype(np.int64) - svs['start_y'].astype(np.int64)).abs() <= window) &
+              ((svs['end_x'].astype(np.int64) - svs['end_y'].astype(np.int64)).abs() <= window)]
+    return len(snvs) + len(svs)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+    from variant_extractor.match import match, MATCH_WINDOW
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark truth vs test matching')
+    parser.add_argument('--snvs', type=int, default=1_000_000, help='Number of SNVs of the truth set')
+    parser.add_argument('--svs', type=int, default=100_000, help='Number of SVs of the truth set')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    truth = _synthetic(args.snvs, args.svs, rng)
+    # 90% of the truth set, with the SVs moved up to 300 bp, plus 10% of false positives
+    test = truth.sample(frac=0.9, random_state=1)
+    sv = (test['type_inferred'] != 'SNV').to_numpy()
+    shift = rng.integers(-300, 300, sv.sum())
+    test.loc[sv, 'start'] = (test.loc[sv, 'start'].astype(np.int64) + shift).astype(np.uint64)
+    test.loc[sv, 'end'] = (test.loc[sv, 'end'].astype(np.int64) + shift).astype(np.uint64)
+    test = pd.concat([test, _synthetic(args.snvs // 10, args.svs // 10, rng)], ignore_index=True)
+    print(f'{len(truth)} truth variants, {len(test)} test variants')
+
+    start_time = time.perf_counter()
+    matched = _pandas_match(truth, test, MATCH_WINDOW)
+    print(f'{"pandas merges":<16}{time.perf_counter() - start_time:>8.2f} s, {matched} pairs')
+    start_time = time.perf_counter()
+    result = match(truth, test)
+    print(f'{"match()":<16}{time.perf_counter() - start_time:>8.2f} s, {(result.truth_match >= 0).sum()} pairs')
+    print(result.summary.to_string())
@@ -0,0 +1,147 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Compares the splitting of multiallelic records into one record per ALT allele against the previous
+implementation (copying the record and rebuilding the samples of every allele), on a synthetic VCF file
+with many samples
+Expected usage:
+    $ python bench_multiallelic.py [--samples 1000] [--alts 4] [--records 2000]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import os
+import random
+import tempfile
+import time
+
+FORMAT_HEADER = '''##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">
+##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype quality">
+##FORMAT=<ID=PL,Number=G,Type=Integer,Description="Phred-scaled genotype likelihoods">
+'''
+
+
+def _write_vcf(path, n_samples, n_alts, n_records):
+    random.seed(0)
+    n_genotypes = (n_alts + 1) * (n_alts + 2) // 2
+    bases = 'ACGT'
+    with open(path, 'w') as vcf:
+        vcf.write('##fileformat=VCFv4.2\n##contig=<ID=1,length=1000000000>\n' + FORMAT_HEADER)
+        vcf.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t' +
+                  '\t'.join(f'S{i}' for i in range(n_samples)) + '\n')
+        for i in range(n_records):
+            ref = random.choice(bases)
+            alts = [ref + ''.join(random.choice(bases) for _ in range(j + 1)) for j in range(n_alts)]
+            samples = []
+            for _ in range(n_samples):
+                gt = f'{random.randint(0, n_alts)}/{random.randint(0, n_alts)}'
+                ad = ','.join(str(random.randint(0, 30)) for _ in range(n_alts + 1))
+                pl = ','.join(str(random.randint(0, 99)) for _ in range(n_genotypes))
+                samples.append(f'{gt}:{ad}:{random.randint(1, 99)}:{random.randint(1, 99)}:{pl}')
+            vcf.write(f'1\t{1000 + i * 10}\tvar{i}\t{ref}\t{",".join(alts)}\t50\tPASS\t.\tGT:AD:DP:GQ:PL\t' +
+                      '\t'.join(samples) + '\n')
+
+
+def _legacy_split(rec, header):
+    # Splitting of VariantExtractor.__handle_multiallelic_record prior to AlleleSplitter
+    fake_rec = rec.copy()
+    alts = fake_rec.alts
+    samples = dict()
+    for sample_name in rec.samples:
+        sample_dict = dict()
+        for key, value in rec.samples[sample_name].items():
+            sample_dict[key] = value
+        samples[sample_name] = sample_dict
+    split = []
+    for i, alt in enumerate(alts):
+        fake_rec.alts = (alt,)
+        new_samples = dict()
+        for sample_name in samples:
+            new_samples[sample_name] = dict()
+            for key, value in samples[sample_name].items():
+                if not hasattr(value, '__iter__') or len(value) == header.formats[key].number:
+                    new_samples[sample_name][key] = value
+                else:
+                    if key == 'GT':
+                        new_samples[sample_name][key] = (0, samples[sample_name][key][1])
+                    elif len(value) == len(alts) + 1:
+                        new_samples[sample_name][key] = (value[0], value[i + 1])
+                    elif hasattr(value, '__iter__') and len(value) % len(alts) == 0:
+                        new_samples[sample_name][key] = value[i::len(alts)]
+                    else:
+                        new_samples[sample_name][key] = value
+        split.append(new_samples)
+    return split
+
+
+def _split(splitter, rec, access_samples):
+    from variant_extractor.private._AlleleSplitter import AlleleRecord
+    split_samples = splitter.split(rec)
+    split = []
+    for i, alt in enumerate(rec.alts):
+        AlleleRecord(rec, alt, f'{rec.id}_{i}')
+        split.append(split_samples.allele_samples(i) if access_samples else None)
+    return split
+
+
+def _measure(functions, records):
+    # Records are split one at a time by every function, so that the results can be compared without keeping
+    # them all in memory
+    times = [0.0] * len(functions)
+    for rec in records:
+        results = []
+        for i, function in enumerate(functions):
+            start_time = time.perf_counter()
+            results.append(function(rec))
+            times[i] += time.perf_counter() - start_time
+        assert all(result == results[0] for result in results[1:]), 'Split samples differ'
+    return times
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+    import pysam
+    from variant_extractor import VariantExtractor
+    from variant_extractor.private._AlleleSplitter import AlleleSplitter
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the splitting of multiallelic records')
+    parser.add_argument('--samples', type=int, default=1000, help='Number of samples')
+    parser.add_argument('--alts', type=int, default=4, help='Number of ALT alleles per record')
+    parser.add_argument('--records', type=int, default=2000, help='Number of records')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vcf_file = os.path.join(tmp_dir, 'multiallelic.vcf')
+        _write_vcf(vcf_file, args.samples, args.alts, args.records)
+        with pysam.VariantFile(vcf_file) as variant_file:
+            header = variant_file.header
+            records = list(variant_file)
+
+            splitter = AlleleSplitter()
+            legacy_time, split_time = _measure([lambda rec: _legacy_split(rec, header),
+                                                lambda rec: _split(splitter, rec, True)], records)
+            lazy_time, = _measure([lambda rec: _split(splitter, rec, False)], records)
+
+        # Whole extraction, with and without accessing the samples
+        start_time = time.perf_counter()
+        for variant_record in VariantExtractor(vcf_file):
+            pass
+        extract_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        for variant_record in VariantExtractor(vcf_file):
+            dict(variant_record.samples)
+        extract_samples_time = time.perf_counter() - start_time
+
+    n_split = args.records * args.alts
+    print(f'Records: {args.records}, samples: {args.samples}, ALT alleles: {args.alts}')
+    print(f'{"splitting":<36}{"time (s)":>10}{"alleles/s":>12}')
+    for name, elapsed in [('copy + rebuild (previous)', legacy_time), ('AlleleSplitter, samples accessed', split_time),
+                          ('AlleleSplitter, samples not accessed', lazy_time)]:
+        print(f'{name:<36}{elapsed:>10.2f}{n_split / elapsed:>12.0f}')
+    print(f'{"extraction":<36}{"time (s)":>10}')
+    print(f'{"VariantExtractor":<36}{extract_time:>10.2f}')
+    print(f'{"VariantExtractor + samples":<36}{extract_samples_time:>10.2f}')
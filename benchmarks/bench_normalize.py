@@ -0,0 +1,71 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the time and peak memory (max RSS) of normalizing a VCF file, comparing the sorting of all the variants in memory
+(as examples/normalize_vcf.py did prior to normalize()) against normalize() with several memory limits
+Expected usage:
+    $ python bench_normalize.py <vcf_file> [--max-memory 1 16 512]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import os
+import resource
+import tempfile
+import time
+
+
+def _normalize_in_memory(vcf_file, output_vcf_file):
+    # Normalization prior to normalize()
+    from variant_extractor import VariantExtractor
+    extractor = VariantExtractor(vcf_file, ensure_pairs=False)
+    with open(output_vcf_file, 'w') as output_vcf:
+        output_vcf.write(str(extractor.header))
+        records = list(extractor)
+        contig_order = extractor.contig_order
+        contig_order.update(record.contig for record in records)
+        records.sort(key=lambda x: (contig_order.rank(x.contig), x.pos))
+        for variant_record in records:
+            output_vcf.write(str(variant_record)+'\n')
+
+
+def _normalize(vcf_file, output_vcf_file, max_memory):
+    from variant_extractor.normalize import normalize
+    normalize(vcf_file, output_vcf_file, max_memory=max_memory * 1024 * 1024, ensure_pairs=False)
+
+
+def _run(function, *args):
+    start_time = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start_time
+    # Kilobytes in Linux
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(function, *args):
+    # Each normalization runs in a new process, so that the peak memory is not shared
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_run, function, *args).result()
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the normalization of a VCF file')
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('--max-memory', type=int, nargs='+', default=[1, 16, 512],
+                        help='Memory limits (in MiB) of normalize()')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_vcf = os.path.join(tmp_dir, 'normalized.vcf')
+        runs = [('in memory (previous)', _normalize_in_memory, (args.vcf_file, output_vcf))]
+        for max_memory in args.max_memory:
+            runs.append((f'normalize(), {max_memory} MiB', _normalize, (args.vcf_file, output_vcf, max_memory)))
+        print(f'{"normalization":<30}{"time (s)":>10}{"max RSS (MiB)":>15}')
+        for name, function, function_args in runs:
+            elapsed, max_rss = _measure(function, *function_args)
+            print(f'{name:<30}{elapsed:>10.2f}{max_rss:>15.1f}')
@@ -0,0 +1,84 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the time and peak memory (max RSS) of getting the variants of a sorted VCF file in order, comparing the sorting
+of all the extracted variants against the ordered mode, and the number of variants out of order in each case
+Expected usage:
+    $ python bench_ordered.py <vcf_file> [--reorder-window 100000]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import resource
+import time
+
+
+def _inversions(extractor, variant_records):
+    contig_order = extractor.contig_order
+    previous = None
+    inversions = 0
+    for variant_record in variant_records:
+        key = (contig_order.rank(variant_record.contig), variant_record.pos)
+        if previous is not None and key < previous:
+            inversions += 1
+        previous = key
+    return inversions
+
+
+def _extract(vcf_file):
+    from variant_extractor import VariantExtractor
+    extractor = VariantExtractor(vcf_file, ensure_pairs=False)
+    return _inversions(extractor, extractor)
+
+
+def _sorted(vcf_file):
+    from variant_extractor import VariantExtractor
+    extractor = VariantExtractor(vcf_file, ensure_pairs=False)
+    variant_records = list(extractor)
+    contig_order = extractor.contig_order
+    contig_order.update(variant_record.contig for variant_record in variant_records)
+    variant_records.sort(key=lambda x: (contig_order.rank(x.contig), x.pos))
+    return _inversions(extractor, variant_records)
+
+
+def _ordered(vcf_file, reorder_window):
+    from variant_extractor import VariantExtractor
+    extractor = VariantExtractor(vcf_file, ensure_pairs=False, ordered=True, reorder_window=reorder_window)
+    return _inversions(extractor, extractor)
+
+
+def _run(function, *args):
+    start_time = time.perf_counter()
+    inversions = function(*args)
+    elapsed = time.perf_counter() - start_time
+    # Kilobytes in Linux
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, inversions
+
+
+def _measure(function, *args):
+    # Each run is in a new process, so that the peak memory is not shared
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_run, function, *args).result()
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the ordered extraction of a sorted VCF file')
+    parser.add_argument('vcf_file', help='Sorted VCF file')
+    parser.add_argument('--reorder-window', type=int, default=100_000, help='Window (in bp) of the ordered mode')
+    args = parser.parse_args()
+
+    runs = [
+        ('extraction', _extract, (args.vcf_file,)),
+        ('extraction + sort', _sorted, (args.vcf_file,)),
+        (f'ordered=True, {args.reorder_window} bp', _ordered, (args.vcf_file, args.reorder_window)),
+    ]
+    print(f'{"extraction":<32}{"time (s)":>10}{"max RSS (MiB)":>15}{"out of order":>14}')
+    for name, function, function_args in runs:
+        elapsed, max_rss, inversions = _measure(function, *function_args)
+        print(f'{name:<32}{elapsed:>10.2f}{max_rss:>15.1f}{inversions:>14}')
@@ -0,0 +1,103 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the memory held per VariantRecord when all the records of a VCF file are kept in a list,
+comparing the previous __dict__-based layout, the __slots__ layout, detached records and
+records extracted with keep_raw=False keeping only some INFO and FORMAT fields
+Expected usage:
+    $ python bench_record_memory.py <vcf_file>
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import gc
+import tracemalloc
+
+
+class _LegacyVariantRecord():
+    # Attribute layout of VariantRecord prior to __slots__: an instance __dict__ with eager qual and filter
+    def __init__(self, variant_record):
+        self._rec = variant_record._rec
+        self.contig = variant_record.contig
+        self.pos = variant_record.pos
+        self.end = variant_record.end
+        self.length = variant_record.length
+        self.id = variant_record.id
+        self.ref = variant_record.ref
+        self.alt = variant_record.alt
+        self.qual = variant_record._rec.qual
+        self.filter = [f for f in variant_record._rec.filter]
+        self.variant_type = variant_record.variant_type
+        self.alt_sv_breakend = variant_record.alt_sv_breakend
+        self.alt_sv_shorthand = variant_record.alt_sv_shorthand
+        self._info = None
+        self._format = None
+        self._samples = None
+
+
+def _rss():
+    # Resident set size in bytes (Linux only), it accounts for the htslib buffers too
+    import resource
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+
+
+def _measure(build):
+    gc.collect()
+    rss_before = _rss()
+    tracemalloc.start()
+    records = build()
+    python_heap, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    rss = _rss() - rss_before
+    return records, python_heap, rss
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+    from variant_extractor import VariantExtractor
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark memory held per VariantRecord')
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('--info-keys', nargs='*', default=['SVTYPE', 'SVLEN'], help='INFO fields kept with keep_raw=False')
+    parser.add_argument('--format-keys', nargs='*', default=['GT'], help='FORMAT fields kept with keep_raw=False')
+    args = parser.parse_args()
+
+    def _extract():
+        return list(VariantExtractor(args.vcf_file, ensure_pairs=False))
+
+    def _detached():
+        records = []
+        for variant_record in VariantExtractor(args.vcf_file, ensure_pairs=False):
+            variant_record.detach()
+            records.append(variant_record)
+        return records
+
+    def _projected():
+        return list(VariantExtractor(args.vcf_file, ensure_pairs=False, keep_raw=False,
+                                     info_keys=args.info_keys, format_keys=args.format_keys))
+
+    slots_records, slots_heap, slots_rss = _measure(_extract)
+    # Object-only sizes are measured on top of the records already held by slots_records, sharing all their values
+    _, legacy_object, _ = _measure(lambda: [_LegacyVariantRecord(r) for r in slots_records])
+    # Touch the lazy filter, as the legacy layout builds it eagerly
+    _, slots_object, _ = _measure(lambda: [r._clone() for r in slots_records if r.filter is not None])
+    total = len(slots_records)
+    del slots_records
+    detached_records, detached_heap, detached_rss = _measure(_detached)
+    del detached_records
+    _, projected_heap, projected_rss = _measure(_projected)
+
+    print(f'Records: {total}')
+    print(f'{"record object only":<28}{"Python heap (B/record)":>24}')
+    print(f'{"__dict__":<28}{legacy_object / total:>24.0f}')
+    print(f'{"__slots__":<28}{slots_object / total:>24.0f}')
+    print()
+    print(f'{"whole record":<28}{"Python heap (B/record)":>24}{"RSS (B/record)":>16}')
+    print(f'{"attached to pysam":<28}{slots_heap / total:>24.0f}{slots_rss / total:>16.0f}')
+    print(f'{"detach()":<28}{detached_heap / total:>24.0f}{detached_rss / total:>16.0f}')
+    print(f'{"keep_raw=False (projected)":<28}{projected_heap / total:>24.0f}{projected_rss / total:>16.0f}')
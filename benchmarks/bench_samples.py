@@ -0,0 +1,60 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the time to read the sample information of every record of a VCF file with many samples, comparing
+the decoding of all the samples (as VariantRecord.samples did prior to the lazy SamplesView) against reading
+a single sample or a single FORMAT field of every sample
+Expected usage:
+    $ python bench_samples.py <vcf_file> [--key DP]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import time
+
+
+def _build_samples(rec):
+    # Decoding of VariantRecord.samples prior to SamplesView
+    samples = dict()
+    for sample_name in rec.samples:
+        sample_dict = dict()
+        for key, value in rec.samples[sample_name].items():
+            sample_dict[key] = value
+        samples[sample_name] = sample_dict
+    return samples
+
+
+def _measure(vcf_file, access, **kwargs):
+    from variant_extractor import VariantExtractor
+    records = list(VariantExtractor(vcf_file, ensure_pairs=False, **kwargs))
+    start_time = time.perf_counter()
+    for variant_record in records:
+        access(variant_record)
+    return len(records), time.perf_counter() - start_time
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the access to the samples of VariantRecord')
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('--key', default='DP', help='FORMAT field read for every sample')
+    args = parser.parse_args()
+    key = args.key
+
+    accesses = [
+        ('all samples (previous)', lambda r: _build_samples(r._rec), {}),
+        ('all samples (SamplesView)', lambda r: dict(r.samples), {}),
+        ('first sample', lambda r: r.samples[0], {}),
+        (f'samples.values_of({key!r})', lambda r: r.samples.values_of(key), {}),
+        (f'format_array({key!r})', lambda r: r.format_array(key), {}),
+        ('format_array(\'GT\')', lambda r: r.format_array('GT'), {}),
+        (f'format_array({key!r}), keep_raw=False', lambda r: r.format_array(key), {'keep_raw': False}),
+    ]
+    print(f'{"access":<40}{"time (s)":>10}{"ms/record":>12}')
+    for name, access, kwargs in accesses:
+        total, elapsed = _measure(args.vcf_file, access, **kwargs)
+        print(f'{name:<40}{elapsed:>10.2f}{elapsed / total * 1000:>12.3f}')
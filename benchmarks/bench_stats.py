@@ -0,0 +1,46 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the overhead of the extraction stats and prints the time spent in each stage of the extraction of a VCF file
+Expected usage:
+    $ python bench_stats.py <vcf_file> [--runs 3] [--fasta_ref <fasta_file>]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import os
+import time
+
+
+def _measure(vcf_file, runs, **kwargs):
+    from variant_extractor import VariantExtractor
+    best = None
+    for _ in range(runs):
+        extractor = VariantExtractor(vcf_file, ensure_pairs=False, **kwargs)
+        start_time = time.perf_counter()
+        total = sum(1 for _ in extractor)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best[1]:
+            best = (total, elapsed, extractor.stats)
+        extractor.close()
+    return best
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the extraction stats')
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('--runs', type=int, default=3, help='Number of runs, the fastest one is reported')
+    parser.add_argument('--fasta_ref', help='FASTA reference')
+    args = parser.parse_args()
+
+    print(f'{"run":<20}{"time (s)":>10}{"variants/s":>12}')
+    total, baseline, _ = _measure(args.vcf_file, args.runs, fasta_ref=args.fasta_ref)
+    print(f'{"stats=False":<20}{baseline:>10.2f}{total / baseline:>12.0f}')
+    total, elapsed, stats = _measure(args.vcf_file, args.runs, fasta_ref=args.fasta_ref, stats=True)
+    print(f'{"stats=True":<20}{elapsed:>10.2f}{total / elapsed:>12.0f}  ({(elapsed / baseline - 1) * 100:+.0f}%)')
+    print()
+    print(stats)
@@ -0,0 +1,66 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the time of overlap and nearest breakend queries with a linear scan of the DataFrame of a VCF file and with a
+VariantStore built from it
+Expected usage:
+    $ python bench_store.py <vcf_file> [--queries 1000] [--width 10000]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import os
+import random
+import time
+
+import numpy as np
+
+
+def _scan_overlap(df, contig, start, end):
+    return np.flatnonzero(((df['start_chrom'] == contig) & (df['start'] <= end) & (df['end'] >= start)).to_numpy())
+
+
+def _scan_nearest(df, contig, pos, k):
+    distances = np.where((df['start_chrom'] == contig).to_numpy(), np.abs(df['start'].to_numpy(np.int64) - pos),
+                         np.iinfo(np.int64).max)
+    return np.argsort(distances, kind='stable')[:k]
+
+
+def _measure(queries, function):
+    start_time = time.perf_counter()
+    found = sum(len(function(*query)) for query in queries)
+    return found, time.perf_counter() - start_time
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+    from variant_extractor import VariantExtractor
+    from variant_extractor.store import VariantStore
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark VariantStore queries')
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('--queries', type=int, default=1000, help='Number of queries of each kind')
+    parser.add_argument('--width', type=int, default=10000, help='Width of the regions of the overlap queries')
+    args = parser.parse_args()
+
+    df = VariantExtractor(args.vcf_file, ensure_pairs=False).to_dataframe()
+    start_time = time.perf_counter()
+    store = VariantStore.from_dataframe(df)
+    print(f'{len(store)} variants, store built in {time.perf_counter() - start_time:.2f} s')
+
+    random.seed(0)
+    contigs = df['start_chrom'].astype(str).unique().tolist()
+    max_pos = int(df['start'].max())
+    positions = [(random.choice(contigs), random.randint(1, max_pos)) for _ in range(args.queries)]
+    overlap_queries = [(contig, pos, pos + args.width) for contig, pos in positions]
+    nearest_queries = [(contig, pos, 10) for contig, pos in positions]
+
+    print(f'{"query":<24}{"time (s)":>10}{"queries/s":>12}{"found":>10}')
+    for name, queries, function in [('overlap, linear scan', overlap_queries, lambda *q: _scan_overlap(df, *q)),
+                                    ('overlap, VariantStore', overlap_queries, store.overlap),
+                                    ('nearest, linear scan', nearest_queries, lambda *q: _scan_nearest(df, *q)),
+                                    ('nearest, VariantStore', nearest_queries, store.nearest)]:
+        found, elapsed = _measure(queries, function)
+        print(f'{name:<24}{elapsed:>10.3f}{len(queries) / elapsed:>12.0f}{found:>10}')
@@ -0,0 +1,79 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Compares the time and peak memory of VariantExtractor.to_dataframe against the previous
+row-based implementation (a list of Python lists converted with astype afterwards)
+Expected usage:
+    $ python bench_to_dataframe.py <vcf_file>
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import time
+import tracemalloc
+
+
+def _legacy_to_dataframe(extractor, extra_fields=[]):
+    # Implementation of VariantExtractor.to_dataframe prior to the columnar builder
+    import pandas as pd
+    from variant_extractor.VariantExtractor import DATAFRAME_COLUMNS, DATAFRAME_DTYPES
+    from variant_extractor.private._ColumnBuilder import _breakends, _downcast
+    variants = []
+    for variant_record in extractor:
+        start_chrom = variant_record.contig.replace('chr', '')
+        end = variant_record.end
+        if variant_record.alt_sv_breakend:
+            end_chrom = variant_record.alt_sv_breakend.contig.replace('chr', '')
+            if start_chrom != end_chrom:
+                end = variant_record.alt_sv_breakend.pos
+        else:
+            end_chrom = start_chrom
+        extra_values = [getattr(variant_record, field, None) for field in extra_fields]
+        variants.append([start_chrom, variant_record.pos, end_chrom, end, variant_record.ref, variant_record.alt,
+                         variant_record.length, _breakends(variant_record), variant_record.variant_type.name] + extra_values)
+    df = pd.DataFrame(variants, columns=DATAFRAME_COLUMNS + extra_fields)
+    for col in DATAFRAME_COLUMNS:
+        df[col] = df[col].astype(DATAFRAME_DTYPES[col])
+    df['start'] = _downcast(df['start'])
+    df['end'] = _downcast(df['end'])
+    df['length'] = _downcast(df['length'])
+    return df
+
+
+def _measure(function):
+    # Time and memory are measured in different runs, as tracing allocations slows down the execution
+    start_time = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start_time
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+    from variant_extractor import VariantExtractor
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark VariantExtractor.to_dataframe')
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('--extra-fields', nargs='*', default=['id'], help='Extra fields added to the DataFrame')
+    args = parser.parse_args()
+    # Import pandas beforehand so that its import time is not measured
+    import pandas  # noqa: F401
+
+    legacy_df, legacy_time, legacy_peak = _measure(
+        lambda: _legacy_to_dataframe(VariantExtractor(args.vcf_file, ensure_pairs=False), args.extra_fields))
+    df, columnar_time, columnar_peak = _measure(
+        lambda: VariantExtractor(args.vcf_file, ensure_pairs=False).to_dataframe(extra_fields=args.extra_fields))
+
+    assert df.equals(legacy_df) and (df.dtypes == legacy_df.dtypes).all(), 'DataFrames differ'
+    final_size = df.memory_usage(deep=True).sum()
+    print(f'Variants: {len(df)}, final DataFrame size: {final_size / 2**20:.1f} MiB')
+    print(f'{"implementation":<15}{"time (s)":>10}{"peak (MiB)":>12}{"peak/final":>12}')
+    for name, elapsed, peak in [('row-based', legacy_time, legacy_peak), ('columnar', columnar_time, columnar_peak)]:
+        print(f'{name:<15}{elapsed:>10.2f}{peak / 2**20:>12.1f}{peak / final_size:>12.1f}')
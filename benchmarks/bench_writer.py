@@ -0,0 +1,71 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Measures the time to write the variants of a VCF file, comparing the previous VariantRecord.__str__ (which split
+and joined every column of the line) written line by line against VariantWriter with VCF, bgzipped VCF and BCF output
+Expected usage:
+    $ python bench_writer.py <vcf_file>
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import os
+import tempfile
+import time
+
+
+def _previous_str(variant_record):
+    # VariantRecord.__str__ prior to copying the INFO, FORMAT and sample columns as a single string
+    id_ = variant_record.id if variant_record.id else '.'
+    qual = f'{variant_record.qual:.2f}' if variant_record.qual is not None else '.'
+    filter_ = ";".join(map(str, variant_record.filter)) if variant_record.filter else '.'
+    columns = str(variant_record._rec).split('\t') if variant_record._rec is not None else \
+        [''] * 7 + variant_record._raw_columns()
+    info = columns[7] if len(columns) > 7 else '.'
+    format_ = columns[8] if len(columns) > 8 else ''
+    samples = '\t'.join(columns[9:])
+    return f'{variant_record.contig}\t{variant_record.pos}\t{id_}\t{variant_record.ref}\t{variant_record.alt}\t' \
+        f'{qual}\t{filter_}\t{info}\t{format_}\t{samples}'.strip()
+
+
+def _write_lines(path, header, records, to_str):
+    with open(path, 'w') as output_vcf:
+        output_vcf.write(str(header))
+        for variant_record in records:
+            output_vcf.write(to_str(variant_record) + '\n')
+
+
+def _write(path, header, records):
+    from variant_extractor.writer import VariantWriter
+    with VariantWriter(path, header) as writer:
+        writer.write_all(records)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+    from variant_extractor import VariantExtractor
+
+    # Parse arguments
+    parser = ArgumentParser(description='Benchmark the output of the extracted variants')
+    parser.add_argument('vcf_file', help='VCF file')
+    args = parser.parse_args()
+
+    extractor = VariantExtractor(args.vcf_file, ensure_pairs=False)
+    records = list(extractor)
+    header = extractor.header
+    runs = [
+        ('str() per line (previous)', 'out.vcf', lambda path: _write_lines(path, header, records, _previous_str)),
+        ('str() per line', 'out.vcf', lambda path: _write_lines(path, header, records, str)),
+        ('VariantWriter VCF', 'out.vcf', lambda path: _write(path, header, records)),
+        ('VariantWriter bgzipped VCF', 'out.vcf.gz', lambda path: _write(path, header, records)),
+        ('VariantWriter BCF', 'out.bcf', lambda path: _write(path, header, records)),
+    ]
+    print(f'Variants: {len(records)}')
+    print(f'{"output":<30}{"time (s)":>10}{"variants/s":>12}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, file_name, write in runs:
+            start_time = time.perf_counter()
+            write(os.path.join(tmp_dir, file_name))
+            elapsed = time.perf_counter() - start_time
+            print(f'{name:<30}{elapsed:>10.2f}{len(records) / elapsed:>12.0f}')
@@ -0,0 +1,184 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Runs the benchmark suite on synthetic VCF files (see synthetic_vcf.py) and saves the results as JSON. Each benchmark
+runs in a new process, and reports the fastest of its runs in records/s and its peak memory (max RSS). Benchmarks:
+    iterate: iteration over the variants.
+    to_dataframe: VariantExtractor.to_dataframe() (needs pandas).
+    str_roundtrip: writing the variants with str() and extracting the written VCF file again.
+    normalize: normalize() to a new VCF file.
+The synthetic files are written to --data-dir (a temporary directory by default) and reused if they already exist.
+Expected usage:
+    $ python run_benchmarks.py [--records 50000] [--profiles snv bnd multiallelic shorthand]
+                               [--benchmarks iterate to_dataframe str_roundtrip normalize] [--runs 3]
+                               [--data-dir <dir>] [--output results.json] [--compare <previous_results.json>]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+
+from synthetic_vcf import PROFILES, write_vcf
+
+
+def _iterate(vcf_file, tmp_dir):
+    from variant_extractor import VariantExtractor
+    extractor = VariantExtractor(vcf_file, ensure_pairs=False)
+    variants = sum(1 for _ in extractor)
+    extractor.close()
+    return variants
+
+
+def _to_dataframe(vcf_file, tmp_dir):
+    from variant_extractor import VariantExtractor
+    extractor = VariantExtractor(vcf_file, ensure_pairs=False)
+    variants = len(extractor.to_dataframe())
+    extractor.close()
+    return variants
+
+
+def _str_roundtrip(vcf_file, tmp_dir):
+    from variant_extractor import VariantExtractor
+    output_vcf = os.path.join(tmp_dir, 'roundtrip.vcf')
+    extractor = VariantExtractor(vcf_file, ensure_pairs=False)
+    with open(output_vcf, 'w') as output:
+        output.write(str(extractor.header))
+        for variant_record in extractor:
+            output.write(str(variant_record) + '\n')
+    extractor.close()
+    extractor = VariantExtractor(output_vcf, ensure_pairs=False)
+    variants = sum(1 for _ in extractor)
+    extractor.close()
+    return variants
+
+
+def _normalize(vcf_file, tmp_dir):
+    from variant_extractor.normalize import normalize
+    return normalize(vcf_file, os.path.join(tmp_dir, 'normalized.vcf'), index=False, ensure_pairs=False)
+
+
+BENCHMARKS = {
+    'iterate': _iterate,
+    'to_dataframe': _to_dataframe,
+    'str_roundtrip': _str_roundtrip,
+    'normalize': _normalize,
+}
+
+
+def _run(benchmark, vcf_file, runs):
+    best = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            variants = BENCHMARKS[benchmark](vcf_file, tmp_dir)
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+    # Kilobytes in Linux
+    return variants, best, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(benchmark, vcf_file, runs):
+    # Each benchmark runs in a new process, so that the peak memory is not shared
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_run, benchmark, vcf_file, runs).result()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment():
+    import pysam
+    import variant_extractor
+    return {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'variant_extractor': variant_extractor.__version__,
+        'pysam': pysam.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def _compare(results, previous_results):
+    previous = {(result['profile'], result['benchmark']): result for result in previous_results['results']}
+    print()
+    print(f'Compared with {previous_results["environment"]["commit"]} ({previous_results["environment"]["date"]})')
+    print(f'{"profile":<14}{"benchmark":<16}{"records/s":>12}{"previous":>12}{"change":>9}{"max RSS":>9}'
+          f'{"previous":>10}')
+    for result in results:
+        old = previous.get((result['profile'], result['benchmark']))
+        if old is None or 'error' in result or 'error' in old:
+            continue
+        change = (result['records_per_second'] / old['records_per_second'] - 1) * 100
+        print(f'{result["profile"]:<14}{result["benchmark"]:<16}{result["records_per_second"]:>12.0f}'
+              f'{old["records_per_second"]:>12.0f}{change:>+8.0f}%{result["max_rss_mib"]:>9.1f}'
+              f'{old["max_rss_mib"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+
+    # Parse arguments
+    parser = ArgumentParser(description='Run the benchmark suite on synthetic VCF files')
+    parser.add_argument('--records', type=int, default=50_000, help='Approximate number of records of each file')
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES),
+                        help='Synthetic VCF files to benchmark')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help='Benchmarks to run')
+    parser.add_argument('--runs', type=int, default=3, help='Number of runs, the fastest one is reported')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic VCF files')
+    parser.add_argument('--data-dir', help='Directory of the synthetic VCF files')
+    parser.add_argument('--output', default='benchmark_results.json', help='Output JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare with')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir if args.data_dir else tmp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        results = []
+        print(f'{"profile":<14}{"benchmark":<16}{"records":>10}{"variants":>10}{"time (s)":>10}{"records/s":>12}'
+              f'{"max RSS (MiB)":>15}')
+        for profile in args.profiles:
+            vcf_file = os.path.join(data_dir, f'{profile}_{args.records}_{args.seed}.vcf')
+            if not os.path.exists(vcf_file):
+                write_vcf(vcf_file, profile, args.records, seed=args.seed)
+            with open(vcf_file) as vcf:
+                records = sum(1 for line in vcf if not line.startswith('#'))
+            for benchmark in args.benchmarks:
+                result = {'profile': profile, 'benchmark': benchmark, 'records': records}
+                try:
+                    variants, elapsed, max_rss = _measure(benchmark, vcf_file, args.runs)
+                except ImportError as e:
+                    # Optional dependencies, such as pandas
+                    result['error'] = str(e)
+                    print(f'{profile:<14}{benchmark:<16}  skipped: {e}')
+                    results.append(result)
+                    continue
+                result.update({'variants': variants, 'seconds': elapsed, 'records_per_second': records / elapsed,
+                               'max_rss_mib': max_rss})
+                results.append(result)
+                print(f'{profile:<14}{benchmark:<16}{records:>10}{variants:>10}{elapsed:>10.2f}'
+                      f'{records / elapsed:>12.0f}{max_rss:>15.1f}')
+
+    output = {'environment': _environment(), 'arguments': vars(args), 'results': results}
+    with open(args.output, 'w') as output_file:
+        json.dump(output, output_file, indent=2)
+    print(f'Results saved to {args.output}')
+    if args.compare:
+        with open(args.compare) as previous_file:
+            _compare(results, json.load(previous_file))
@@ -0,0 +1,205 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+'''
+Writes deterministic synthetic VCF files for the benchmarks. The same profile, number of records, samples and seed
+always produce the same file. Profiles:
+    snv: germline calls, mostly SNVs with some small indels, 2 samples.
+    bnd: SV calls in breakend notation, with paired breakends (with and without MATEID, some of them IMPRECISE with
+         CIPOS/CIEND) and unpaired breakends, among SNVs and indels, 1 sample.
+    multiallelic: records with 2 to 4 ALT alleles and Number=R/G FORMAT fields, 20 samples.
+    shorthand: SVs in shorthand notation (<DEL>, <DUP>, <INV> and <INS>), 1 sample.
+Expected usage:
+    $ python synthetic_vcf.py <profile> <output_vcf> [--records 100000] [--samples 2] [--seed 0]
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+import random
+
+# GRCh37 contigs
+CONTIGS = [('1', 249250621), ('2', 243199373), ('3', 198022430), ('4', 191154276), ('5', 180915260),
+           ('6', 171115067), ('7', 159138663), ('8', 146364022), ('9', 141213431), ('10', 135534747),
+           ('11', 135006516), ('12', 133851895), ('13', 115169878), ('14', 107349540), ('15', 102531392),
+           ('16', 90354753), ('17', 81195210), ('18', 78077248), ('19', 59128983), ('20', 63025520),
+           ('21', 48129895), ('22', 51304566), ('X', 155270560), ('Y', 59373566)]
+BASES = 'ACGT'
+
+HEADER = '''##INFO=<ID=DP,Number=1,Type=Integer,Description="Total depth">
+##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency">
+##INFO=<ID=MQ,Number=1,Type=Float,Description="Mapping quality">
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=SVLEN,Number=.,Type=Integer,Description="Length of the SV">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=IMPRECISE,Number=0,Type=Flag,Description="Imprecise SV">
+##INFO=<ID=CIPOS,Number=2,Type=Integer,Description="Confidence interval around POS">
+##INFO=<ID=CIEND,Number=2,Type=Integer,Description="Confidence interval around END">
+##FILTER=<ID=LowQual,Description="Low quality">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">
+##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype quality">
+##FORMAT=<ID=PL,Number=G,Type=Integer,Description="Phred-scaled genotype likelihoods">
+'''
+
+# Mate of each breakend orientation: t[p[ <-> ]p]t, t]p] <-> t]p], [p[t <-> [p[t
+_MATE_BRACKETS = {'t[p[': ']p]t', ']p]t': 't[p[', 't]p]': 't]p]', '[p[t': '[p[t'}
+_SV_BRACKETS = {'DEL': 't[p[', 'DUP': ']p]t', 'INV': 't]p]'}
+
+
+def _breakend_alt(brackets, base, contig, pos):
+    return brackets.replace('t', base).replace('p', f'{contig}:{pos}')
+
+
+def _positions(rng, n_records):
+    # Sorted (contig, position) pairs spread over the contigs proportionally to their length
+    total_length = sum(length for _, length in CONTIGS)
+    for contig, length in CONTIGS:
+        n = round(n_records * length / total_length)
+        for pos in sorted(rng.randrange(1, length - 200_000) for _ in range(n)):
+            yield contig, pos
+
+
+def _filter(rng):
+    return 'PASS' if rng.random() < 0.9 else 'LowQual'
+
+
+def _genotypes(rng, n_samples, n_alleles, pl=False):
+    n_genotypes = n_alleles * (n_alleles + 1) // 2
+    samples = []
+    for _ in range(n_samples):
+        gt = f'{rng.randrange(n_alleles)}/{rng.randrange(n_alleles)}'
+        ad = ','.join(str(rng.randrange(40)) for _ in range(n_alleles))
+        sample = f'{gt}:{ad}:{rng.randrange(10, 80)}:{rng.randrange(100)}'
+        if pl:
+            sample += ':' + ','.join(str(rng.randrange(500)) for _ in range(n_genotypes))
+        samples.append(sample)
+    return '\t'.join(samples)
+
+
+def _small_variant(rng, snv_ratio=0.9):
+    ref = rng.choice(BASES)
+    if rng.random() < snv_ratio:
+        return ref, rng.choice(BASES.replace(ref, ''))
+    insertion = ''.join(rng.choice(BASES) for _ in range(rng.randint(1, 20)))
+    if rng.random() < 0.5:
+        return ref, ref + insertion
+    return ref + insertion, ref
+
+
+def _snv_lines(rng, n_records, n_samples):
+    for i, (contig, pos) in enumerate(_positions(rng, n_records)):
+        ref, alt = _small_variant(rng)
+        info = f'DP={rng.randrange(10, 200)};AF={rng.random():.3f};MQ={rng.uniform(20, 60):.2f}'
+        yield contig, pos, f'{contig}\t{pos}\tsnv{i}\t{ref}\t{alt}\t{rng.uniform(10, 1000):.2f}\t{_filter(rng)}\t' \
+            f'{info}\tGT:AD:DP:GQ\t{_genotypes(rng, n_samples, 2)}'
+
+
+def _multiallelic_lines(rng, n_records, n_samples):
+    for i, (contig, pos) in enumerate(_positions(rng, n_records)):
+        ref = rng.choice(BASES)
+        n_alts = rng.randint(2, 4)
+        alts = [ref + ''.join(rng.choice(BASES) for _ in range(j)) if j else rng.choice(BASES.replace(ref, ''))
+                for j in range(n_alts)]
+        info = f'DP={rng.randrange(10, 2000)};AF=' + ','.join(f'{rng.random():.3f}' for _ in alts)
+        yield contig, pos, f'{contig}\t{pos}\tma{i}\t{ref}\t{",".join(alts)}\t{rng.uniform(10, 1000):.2f}\t' \
+            f'{_filter(rng)}\t{info}\tGT:AD:DP:GQ:PL\t{_genotypes(rng, n_samples, n_alts + 1, pl=True)}'
+
+
+def _shorthand_lines(rng, n_records, n_samples):
+    for i, (contig, pos) in enumerate(_positions(rng, n_records)):
+        sv_type = rng.choice(('DEL', 'DUP', 'INV', 'INS'))
+        length = rng.randint(50, 100_000) if sv_type != 'INS' else rng.randint(50, 5000)
+        end = pos if sv_type == 'INS' else pos + length
+        svlen = -length if sv_type == 'DEL' else length
+        info = f'SVTYPE={sv_type};END={end};SVLEN={svlen}'
+        yield contig, pos, f'{contig}\t{pos}\tsv{i}\t{rng.choice(BASES)}\t<{sv_type}>\t.\t{_filter(rng)}\t{info}\t' \
+            f'GT:AD:DP:GQ\t{_genotypes(rng, n_samples, 2)}'
+
+
+def _bnd_lines(rng, n_records, n_samples):
+    # 30% of the records are SNVs and indels, the rest are breakends of SVs: 70% paired with MATEID (a fifth of them
+    # IMPRECISE), 15% paired without MATEID (paired by position) and 15% unpaired
+    contigs = [contig for contig, _ in CONTIGS]
+    lengths = dict(CONTIGS)
+    i = 0
+    for contig, pos in _positions(rng, n_records):
+        i += 1
+        if rng.random() < 0.3:
+            ref, alt = _small_variant(rng)
+            yield contig, pos, f'{contig}\t{pos}\tsmall{i}\t{ref}\t{alt}\t.\t{_filter(rng)}\t' \
+                f'DP={rng.randrange(10, 200)}\tGT:AD:DP:GQ\t{_genotypes(rng, n_samples, 2)}'
+            continue
+        # Each event is two records, so the number of records is kept by skipping every other position
+        if rng.random() < 0.5:
+            continue
+        sv_type = rng.choice(('DEL', 'DUP', 'INV', 'TRA'))
+        if sv_type == 'TRA':
+            mate_contig = rng.choice(contigs)
+            mate_pos = rng.randrange(1, lengths[mate_contig] - 200_000)
+            brackets = rng.choice(list(_MATE_BRACKETS))
+        else:
+            mate_contig = contig
+            mate_pos = pos + rng.randint(50, 100_000)
+            brackets = _SV_BRACKETS[sv_type]
+        filter_ = _filter(rng)
+        base, mate_base = rng.choice(BASES), rng.choice(BASES)
+        samples = _genotypes(rng, n_samples, 2)
+        kind = rng.random()
+        info = 'SVTYPE=BND'
+        mate_info = 'SVTYPE=BND'
+        if kind < 0.7:
+            info += f';MATEID=bnd{i}_2'
+            mate_info += f';MATEID=bnd{i}_1'
+            if rng.random() < 0.2:
+                cipos = f'-{rng.randint(1, 200)},{rng.randint(1, 200)}'
+                ciend = f'-{rng.randint(1, 200)},{rng.randint(1, 200)}'
+                info += f';IMPRECISE;CIPOS={cipos};CIEND={ciend}'
+                mate_info += f';IMPRECISE;CIPOS={ciend};CIEND={cipos}'
+        yield contig, pos, f'{contig}\t{pos}\tbnd{i}_1\t{base}\t' \
+            f'{_breakend_alt(brackets, base, mate_contig, mate_pos)}\t.\t{filter_}\t{info}\tGT:AD:DP:GQ\t{samples}'
+        if kind < 0.85:
+            yield mate_contig, mate_pos, f'{mate_contig}\t{mate_pos}\tbnd{i}_2\t{mate_base}\t' \
+                f'{_breakend_alt(_MATE_BRACKETS[brackets], mate_base, contig, pos)}\t.\t{filter_}\t{mate_info}\t' \
+                f'GT:AD:DP:GQ\t{samples}'
+
+
+PROFILES = {
+    'snv': (_snv_lines, 2),
+    'bnd': (_bnd_lines, 1),
+    'multiallelic': (_multiallelic_lines, 20),
+    'shorthand': (_shorthand_lines, 1),
+}
+
+
+def write_vcf(path, profile, n_records, n_samples=None, seed=0):
+    """Writes a synthetic VCF file sorted by contig and position, and returns its number of records"""
+    generate, default_samples = PROFILES[profile]
+    n_samples = default_samples if n_samples is None else n_samples
+    rng = random.Random(f'{profile}:{seed}')
+    contig_rank = {contig: rank for rank, (contig, _) in enumerate(CONTIGS)}
+    # Mates of other contigs are not in order, the lines are sorted once generated
+    lines = sorted(generate(rng, n_records, n_samples), key=lambda line: (contig_rank[line[0]], line[1]))
+    with open(path, 'w') as vcf:
+        vcf.write('##fileformat=VCFv4.2\n')
+        vcf.write(''.join(f'##contig=<ID={contig},length={length}>\n' for contig, length in CONTIGS))
+        vcf.write(HEADER)
+        vcf.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t' +
+                  '\t'.join(f'SAMPLE{i}' for i in range(n_samples)) + '\n')
+        for _, _, line in lines:
+            vcf.write(line + '\n')
+    return len(lines)
+
+
+if __name__ == '__main__':
+    # Parse arguments
+    parser = ArgumentParser(description='Write a synthetic VCF file')
+    parser.add_argument('profile', choices=list(PROFILES), help='Kind of variants')
+    parser.add_argument('output_vcf', help='Output VCF file')
+    parser.add_argument('--records', type=int, default=100_000, help='Approximate number of records')
+    parser.add_argument('--samples', type=int, help='Number of samples (by default, depends on the profile)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+    args = parser.parse_args()
+
+    n_records = write_vcf(args.output_vcf, args.profile, args.records, args.samples, args.seed)
+    print(f'{n_records} records written to {args.output_vcf}')
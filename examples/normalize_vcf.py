@@ -10,44 +10,20 @@ Use --help for more information.
 import sys
 from argparse import ArgumentParser
 
-import pysam
-
-
-def _contig_to_int(contig):
-    contig = contig.lower().replace('chr', '')
-    if contig.isdigit():
-        return int(contig)
-    else:
-        return 22 + ord(contig[0])
-
 
 if __name__ == '__main__':
     import os
     import sys
     sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
-    from variant_extractor import VariantExtractor
+    from variant_extractor.normalize import normalize
 
     # Parse arguments
     parser = ArgumentParser(description='Generate normalized VCF file from a VCF file')
     parser.add_argument('vcf_file', help='VCF file')
     parser.add_argument('output_vcf_file', help='Output VCF file')
+    parser.add_argument('--max-memory', type=int, default=512, help='Approximate memory (in MiB) used to sort the variants')
     args = parser.parse_args()
 
-    # Extract header from original file
-    with open(args.vcf_file, 'r') as f:
-        with pysam.VariantFile(f) as input_file:
-            input_file.header.add_meta('cmdline', ' '.join(sys.argv))
-            header_str = str(input_file.header)
-
-    # Open output file, write as stream
-    with open(args.output_vcf_file, 'w') as output_vcf:
-        # Write header
-        output_vcf.write(header_str)
-        print(f'Reading {args.vcf_file}...')
-        # Open input file, read with variant_extractor
-        extractor = VariantExtractor(args.vcf_file)
-        records = list(extractor)
-        # Sort record by chromosome and position
-        records.sort(key=lambda x: (_contig_to_int(x.contig), x.pos))
-        for variant_record in records:
-            output_vcf.write(str(variant_record)+'\n')
+    print(f'Reading {args.vcf_file}...')
+    # The variants are sorted by chromosome and position in runs of at most max_memory, which are merged into the output
+    normalize(args.vcf_file, args.output_vcf_file, max_memory=args.max_memory * 1024 * 1024, cmdline=' '.join(sys.argv))
@@ -22,11 +22,12 @@ if __name__ == '__main__':
     parser.add_argument('-f', '--fasta-ref', help='FASTA reference file')
     args = parser.parse_args()
 
-    variants = []
-
     print(f'Reading VCF file: {args.vcf_file}')
     extractor = VariantExtractor(args.vcf_file, fasta_ref=args.fasta_ref)
-    df = extractor.to_dataframe(extra_fields=['id'])
-    # Set id column in the first position
-    df = df[['id'] + [col for col in df.columns if col != 'id']]
-    df.to_csv(f'{args.output_file}', index=False)
+    # The variants are written in chunks, so the whole VCF file is never held in memory
+    header = True
+    for df in extractor.iter_dataframes(chunk_size=100_000, extra_fields=['id']):
+        # Set id column in the first position
+        df = df[['id'] + [col for col in df.columns if col != 'id']]
+        df.to_csv(args.output_file, index=False, header=header, mode='w' if header else 'a')
+        header = False
@@ -0,0 +1,28 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# BSC Dual License
+'''
+Generates a Parquet file from an input VCF file
+Expected usage:
+    $ python vcf_to_parquet.py <vcf_file> <output_file>
+Use --help for more information.
+'''
+from argparse import ArgumentParser
+
+if __name__ == '__main__':
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../src/')
+    from variant_extractor import VariantExtractor
+
+    # Parse arguments
+    parser = ArgumentParser(description='Generate Parquet file from a VCF file')
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('output_file', help='Output file')
+    parser.add_argument('-f', '--fasta-ref', help='FASTA reference file')
+    parser.add_argument('-i', '--info-fields', nargs='*', default=[], help='INFO fields to include')
+    args = parser.parse_args()
+
+    print(f'Reading VCF file: {args.vcf_file}')
+    extractor = VariantExtractor(args.vcf_file, fasta_ref=args.fasta_ref)
+    extractor.write_parquet(args.output_file, extra_fields=['id'], info_fields=args.info_fields)
@@ -1,13 +1,29 @@
 # Copyright 2022 - Barcelona Supercomputing Center
 # Author: Rodrigo Martin
 # MIT License
-from typing import List, Optional
+from collections import Counter
+from time import perf_counter
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+import heapq
+import os
 import warnings
 import pysam
 
-from .private._utils import compare_contigs, permute_breakend_sv, convert_inv_to_breakend, convert_del_to_ins
-from .private._parser import parse_breakend_sv, parse_shorthand_sv, parse_sgl_sv, parse_standard_record
+from .private._utils import permute_breakend_sv, convert_inv_to_breakend, convert_del_to_ins, \
+    parse_region, merge_regions, in_regions
+from .private._parser import parse_breakend_sv, parse_shorthand_sv, create_sgl_record, create_standard_record, \
+    classify_alt, ALT_BREAKEND, ALT_SHORTHAND, ALT_SGL, ALT_STANDARD
 from .private._PendingBreakends import PendingBreakends
+from .private._parallel import split_tasks, run_tasks
+from .private._ColumnBuilder import ColumnBuilder, BRACKETS_VALUES, UNBOUNDED_CATEGORICAL_COLUMNS
+from .private._decoder import header_metadata
+from .private._CachedFasta import CachedFasta, FastaCacheInfo
+from .private._AlleleSplitter import AlleleSplitter, AlleleRecord
+from .private._ReorderBuffer import ReorderBuffer
+from .private._StageTimer import StageTimer
+from .cache import ExtractionCache, CACHE_MAX_SIZE
+from .contigs import ContigOrder
+from .stats import ExtractionStats, PROGRESS_INTERVAL
 from .variants import VariantType
 from .variants import VariantRecord
 
@@ -15,19 +31,17 @@ DATAFRAME_COLUMNS = ['start_chrom', 'start', 'end_chrom', 'end', 'ref',
                      'alt', 'length', 'brackets', 'type_inferred']
 DATAFRAME_DTYPES = {'start_chrom': 'category', 'start': 'uint64', 'end_chrom': 'category', 'end': 'uint64', 'ref': 'category',
                     'alt': 'category', 'length': 'uint64', 'brackets': 'category', 'type_inferred': 'category'}
+# Window (in bp) around the mate locus searched when resolving breakends whose mate is outside the requested regions.
+# It covers imprecise breakends whose POS does not exactly match the position described in their mate ALT field.
+MATE_LOOKUP_WINDOW = 1000
+# INFO fields needed to pair breakends, kept in detached records even if not requested
+PAIRING_INFO_KEYS = ['MATEID', 'PARID']
+# Maximum size (in bp) of the contig chunks extracted by each worker in parallel mode
+PARALLEL_CHUNK_SIZE = 10_000_000
+# Distance (in bp) behind the input position within which the variants are sorted in ordered mode
+REORDER_WINDOW = 100_000
 
-def _downcast(series):
-    series_max = series.max()
-    if series_max < 2 ** 8:
-        series = series.astype('uint8')
-    elif series_max < 2 ** 16:
-        series = series.astype('uint16')
-    elif series_max < 2 ** 32:
-        series = series.astype('uint32')
-    else:
-        series = series.astype('uint64')
-    return series
-
+Region = Union[str, Tuple[str, Optional[int], Optional[int]]]
 
 class VariantExtractor:
     """
@@ -35,42 +49,456 @@ class VariantExtractor:
     used in a pipeline, where the variants are ingested from VCF files and then used in downstream analysis.
     """
 
-    def __init__(self, vcf_file: str, pass_only=False, ensure_pairs=True, fasta_ref: Optional[str] = None):
+    def __init__(self, vcf_file: str, pass_only=False, ensure_pairs=True, fasta_ref: Optional[str] = None,
+                 regions: Optional[Iterable[Region]] = None, parallel: int = 1, keep_raw=True,
+                 info_keys: Optional[List[str]] = None, format_keys: Optional[List[str]] = None,
+                 contig_order: Optional[ContigOrder] = None, max_pending_breakends: Optional[int] = None,
+                 assume_sorted=False, ordered=False, reorder_window=REORDER_WINDOW, cache_dir: Optional[str] = None,
+                 cache_max_size: Optional[int] = CACHE_MAX_SIZE, stats=False,
+                 progress: Optional[Callable[[ExtractionStats], None]] = None, progress_interval=PROGRESS_INTERVAL):
         """
         Parameters
         ----------
         vcf_file : str
-            A VCF formatted file. The file is automatically opened.
+            A VCF formatted file. Plain text VCF, bgzipped VCF (:code:`.vcf.gz`) and BCF files are supported. The file is automatically opened.
         pass_only : bool, optional
             If :code:`True`, only records with PASS filter will be considered.
         ensure_pairs : bool, optional
             If :code:`True`, throws an exception if a breakend is missing a pair when all other were paired successfully.
         fasta_ref : str, optional
-            A FASTA file with the reference genome. Must be indexed.
+            A FASTA file with the reference genome. Must be indexed. The blocks of the reference used to fill the bases of
+            SVs are cached in memory (see :meth:`fasta_cache_info`).
+        regions : list, optional
+            Restricts the iteration to these regions. Each region is either a :code:`'contig:beg-end'` string (1-based, inclusive)
+            or a :code:`(contig, start, stop)` tuple (0-based, half-open). As in htslib, a string that is a contig of the
+            header is the whole contig, and :code:`'{contig}:beg-end'` gives coordinates to contigs with colons.
+            Requires a tabix (:code:`.tbi`) or CSI (:code:`.csi`) index.
+            See :meth:`fetch`.
+        parallel : int, optional
+            Number of worker processes. If greater than 1, each contig (or contig chunk) of an indexed file is extracted by a
+            different process and the results are merged back in the same order as the serial extraction. The variants are
+            returned detached from their :code:`pysam.VariantRecord` (see :class:`~variant_extractor.variants.VariantRecord`).
+        keep_raw : bool, optional
+            If :code:`False`, the variants (and the breakends waiting for their pair) are detached from their
+            :code:`pysam.VariantRecord` as soon as they are extracted, so that long-lived collections of variants do not keep
+            the htslib buffers alive (see :meth:`~variant_extractor.variants.VariantRecord.detach`).
+        info_keys : list, optional
+            INFO fields of the variants. Only these fields are decoded (and kept in detached variants), the rest are
+            discarded. By default, all of them are kept. :code:`MATEID` and :code:`PARID` are always kept, since they are
+            needed to pair breakends.
+        format_keys : list, optional
+            FORMAT fields of each sample of the variants. Only these fields are decoded (and kept in detached variants), the
+            rest are discarded. By default, all of them are kept.
+        contig_order : ContigOrder, optional
+            Order of the contigs. Breakend SVs are notated from the breakend in the lowest contig (and position). By
+            default, the contigs of the VCF header sorted in natural order (see
+            :class:`~variant_extractor.contigs.ContigOrder`).
+        max_pending_breakends : int, optional
+            Maximum number of breakends waiting for their mate kept in memory. The rest are moved to a temporary file until
+            they are paired or the end of the file is reached. With indexed files, which are sorted, breakends whose mate
+            position has already been passed are also moved out of memory. By default, all of them are kept in memory.
+        assume_sorted : bool, optional
+            If :code:`True`, the VCF file must be sorted by contig and position. When iterating the whole file, breakends
+            without :code:`MATEID` or :code:`PARID` whose mate position (or contig) has already been passed are handled as
+            unpaired right away: they are returned as soon as they are known to be unpaired instead of at the end, or the
+            :code:`ensure_pairs` exception is raised without reading the rest of the file. Breakends with :code:`MATEID` or
+            :code:`PARID` wait for their mate until the end, as imprecise mates may be far from the position in the ALT
+            field. Raises :code:`ValueError` if the file is not sorted.
+        ordered : bool, optional
+            If :code:`True`, the variants of a VCF file sorted by contig (in :code:`contig_order`) and position are returned
+            sorted too, without sorting the whole file. The variants moved back by the extraction (permuted breakends, INV
+            converted to breakends, pending breakends...) are kept in a window of :code:`reorder_window` bp behind the
+            current position of the file. Variants that fall further behind (such as breakends whose mate is read much
+            later) are returned sorted among them when the output moves to the next contig. Use
+            :func:`~variant_extractor.normalize.normalize` for a fully sorted output. Not available in parallel mode.
+        reorder_window : int, optional
+            Size (in bp) of the window used to sort the variants in ordered mode.
+        cache_dir : str, optional
+            Directory of an extraction cache (see :class:`~variant_extractor.cache.ExtractionCache`). The variants of the
+            first iteration over the VCF file are stored in it, and later iterations with the same file and options load
+            them instead of extracting them again. Variants loaded from the cache are detached (see
+            :meth:`~variant_extractor.variants.VariantRecord.detach`), and :meth:`to_dataframe` without extra or INFO
+            fields loads the stored columns directly. It does not apply to :meth:`fetch`.
+        cache_max_size : int, optional
+            Maximum size (in bytes) of the cache directory, the least recently used entries are removed beyond it. If
+            :code:`None`, entries are never removed.
+        stats : bool, optional
+            If :code:`True`, the time spent in each stage of the extraction and the counters of :attr:`stats` are
+            collected. When disabled, the extraction runs without any instrumentation.
+        progress : callable, optional
+            Function called with :attr:`stats` every :code:`progress_interval` variants returned and at the end of each
+            iteration, for example to report the records read per second. It enables :code:`stats`.
+        progress_interval : int, optional
+            Variants returned between calls to :code:`progress`.
         """
+        if ordered and parallel > 1:
+            raise ValueError('ordered is not available in parallel mode')
         self.__ensure_pairs = ensure_pairs
         self.__pass_only = pass_only
         self.__pairs_found = 0
         self.__pending_breakends = PendingBreakends()
+        self.__max_pending_breakends = max_pending_breakends
+        self.__assume_sorted = assume_sorted
+        self.__ordered = ordered
+        self.__reorder_window = reorder_window
+        self.__input_position = None
+        self.__expired_breakends = []
+        self.__allele_splitter = AlleleSplitter()
         self.__fasta_ref = None
+        self.__vcf_file = vcf_file
+        self.__fasta_ref_file = fasta_ref
+        self.__parallel = parallel
+        self.__pending_ordinals = None
+        self.__ordinal = 0
+        self.__keep_raw = keep_raw
+        self.__info_keys = None if info_keys is None else list(info_keys) + \
+            [key for key in PAIRING_INFO_KEYS if key not in info_keys]
+        self.__format_keys = None if format_keys is None else list(format_keys)
+        # Shared by all the extracted variants
+        self.__fields = None if info_keys is None and format_keys is None else \
+            (dict.fromkeys(self.__info_keys) if self.__info_keys is not None else None,
+             dict.fromkeys(self.__format_keys) if self.__format_keys is not None else None)
         # Open FASTA file
+        self.__owns_fasta_ref = True
         if fasta_ref is not None:
-            self.__fasta_ref = pysam.FastaFile(fasta_ref)
-        # Open VCF file
-        vcf_handle = open(file=vcf_file, mode='r')
+            self.__fasta_ref = CachedFasta(fasta_ref)
+        self.__stats = ExtractionStats() if stats or progress is not None else None
+        self.__progress = progress
+        self.__progress_interval = progress_interval
+        self.__stage_timer = None
+        if self.__stats is not None:
+            self.__instrument()
+        # Open VCF file, htslib detects the format (VCF, bgzipped VCF or BCF) and loads its index if available
         save = pysam.set_verbosity(0)
-        self.__variant_file = pysam.VariantFile(vcf_handle)
+        self.__variant_file = pysam.VariantFile(vcf_file)
         pysam.set_verbosity(save)
+        # Regions are parsed with the contigs of the header and the index, which may contain colons
+        contigs = self.__contigs()
+        self.__regions = merge_regions([parse_region(region, contigs) for region in regions]) if regions else None
+        self.__contig_order = contig_order if contig_order is not None else \
+            ContigOrder.from_header(self.__variant_file.header, sort=True)
+        self.__cache = None
+        if cache_dir is not None:
+            self.__cache = ExtractionCache(cache_dir, cache_max_size)
+            # Options that change the extracted variants
+            self.__cache_options = {'pass_only': pass_only, 'ensure_pairs': ensure_pairs, 'fasta_ref': fasta_ref,
+                                    'regions': self.__regions, 'info_keys': self.__info_keys,
+                                    'format_keys': self.__format_keys, 'contig_order': self.__contig_order.contigs,
+                                    'assume_sorted': assume_sorted, 'ordered': ordered,
+                                    'reorder_window': reorder_window if ordered else None}
 
     def close(self):
         """Closes the VCF file.
         """
         self.__variant_file.close()
+        if self.__fasta_ref is not None and self.__owns_fasta_ref:
+            self.__fasta_ref.close()
+
+    def __instrument(self):
+        # The stage methods are replaced in the instance, so extractors without stats run the methods of the class as
+        # they are
+        stage_timer = StageTimer(self.__stats)
+        self.__stage_timer = stage_timer
+        # The atomization of SNVs is called from the parsing, so it is not wrapped to count each record once
+        self.__handle_record = stage_timer.wrap('parse', self.__handle_record)
+        self.__handle_multiallelic_record = stage_timer.wrap('split_multiallelic', self.__handle_multiallelic_record)
+        self.__handle_breakend_individual_sv = stage_timer.wrap('breakend_notation',
+                                                                self.__handle_breakend_individual_sv)
+        self.__handle_shorthand_sv = stage_timer.wrap('breakend_notation', self.__handle_shorthand_sv)
+        if self.__fields is not None or not self.__keep_raw:
+            self.__release = stage_timer.wrap('release', self.__release)
+        if self.__fasta_ref is not None:
+            stage_timer.instrument_fasta(self.__fasta_ref)
+
+    def __contigs(self) -> set:
+        contigs = set(self.__variant_file.header.contigs)
+        if self.__variant_file.index is not None:
+            contigs.update(self.__variant_file.index)
+        return contigs
+
+    def _share_fasta(self, fasta_ref: CachedFasta, fasta_ref_file: str):
+        """Uses a reference opened by the caller, which is not closed by :meth:`close`, so that the extractions of the same
+        process share its cache of blocks.
+        """
+        if self.__fasta_ref is not None and self.__owns_fasta_ref:
+            self.__fasta_ref.close()
+        self.__fasta_ref = fasta_ref
+        self.__fasta_ref_file = fasta_ref_file
+        self.__owns_fasta_ref = False
+        if self.__cache is not None:
+            self.__cache_options['fasta_ref'] = fasta_ref_file
+
+    def fasta_cache_info(self) -> Optional[FastaCacheInfo]:
+        """Returns the hits, misses and size of the cache of reference blocks used to fill the bases of SVs, or
+        :code:`None` if no FASTA reference was given. In parallel mode, it only covers the bases fetched by this process.
+        """
+        return self.__fasta_ref.cache_info() if self.__fasta_ref is not None else None
+
+    @property
+    def stats(self) -> Optional[ExtractionStats]:
+        """Counters and timers of the extractions, or :code:`None` if the extractor was created without :code:`stats`
+        or :code:`progress`.
+        """
+        return self.__stats
+
+    @property
+    def contig_order(self) -> ContigOrder:
+        """Order of the contigs used by the extractor, it can be reused to sort the extracted variants.
+        """
+        return self.__contig_order
+
+    @property
+    def header(self) -> pysam.VariantHeader:
+        """Header of the VCF file, it can be used to write the extracted variants with
+        :class:`~variant_extractor.writer.VariantWriter`.
+        """
+        return self.__variant_file.header
 
     def __iter__(self):
-        # Read the next record from the VCF file
-        for rec in self.__variant_file:
-            yield from self.__handle_record(rec)
+        if self.__cache is None:
+            return self.__observe(self.__iter_variants())
+        key = self.__cache.key(self.__vcf_file, self.__cache_options)
+        variant_records = self.__cache.load(key, header_metadata(self.__variant_file.header))
+        if variant_records is not None:
+            return self.__observe(variant_records, extracted=False)
+        return self.__observe(self.__cache.store(key, self.__iter_variants(),
+                                                 {'vcf_file': os.path.abspath(self.__vcf_file)}))
+
+    def __iter_variants(self):
+        if self.__parallel > 1:
+            return self.__extract_parallel(self.__regions)
+        if self.__regions is not None:
+            return self.__output(self.__extract(self.__regions))
+        return self.__output(self.__extract())
+
+    def fetch(self, contig: Optional[str] = None, start: Optional[int] = None, stop: Optional[int] = None,
+              region: Optional[str] = None):
+        """Iterates over the variants whose position lies within a region of the VCF file. It requires a tabix (:code:`.tbi`)
+        or CSI (:code:`.csi`) index, so that only the blocks overlapping the region are decoded.
+
+        Breakends whose mate is outside the region are paired by looking up the mate locus in the index.
+
+        Parameters
+        ----------
+        contig : str, optional
+            Contig of the region.
+        start : int, optional
+            Start of the region (0-based, inclusive). Defaults to the start of the contig.
+        stop : int, optional
+            Stop of the region (0-based, exclusive). Defaults to the end of the contig.
+        region : str, optional
+            Region in :code:`'contig:beg-end'` or :code:`'{contig}:beg-end'` format (1-based, inclusive), parsed as
+            :code:`regions` in the constructor. Incompatible with :code:`contig`, :code:`start` and :code:`stop`.
+        """
+        if region is not None:
+            if contig is not None or start is not None or stop is not None:
+                raise ValueError('region cannot be combined with contig, start or stop')
+            region = parse_region(region, self.__contigs())
+            return self.__observe(self.__output(self.__extract([region])))
+        if contig is None:
+            raise ValueError('Either contig or region must be provided')
+        return self.__observe(self.__output(self.__extract([(contig, start or 0, stop)])))
+
+    def __observe(self, vcf_records: Iterable[VariantRecord], extracted=True) -> Iterable[VariantRecord]:
+        if self.__stats is None:
+            return vcf_records
+        return self.__observed(vcf_records, extracted)
+
+    def __observed(self, vcf_records: Iterable[VariantRecord], extracted: bool):
+        stats = self.__stats
+        variants = stats.variants
+        progress = self.__progress
+        progress_interval = self.__progress_interval
+        # Stats accumulate over the iterations of the extractor
+        pairs_found, bytes_read, elapsed = stats.pairs_found, stats.bytes_read, stats.elapsed
+        start_time = perf_counter()
+
+        def update():
+            stats.elapsed = elapsed + perf_counter() - start_time
+            if extracted:
+                stats.pairs_found = pairs_found + self.__pairs_found
+                stats.bytes_read = bytes_read + self.__bytes_read()
+        count = 0
+        for vcf_record in vcf_records:
+            name = vcf_record.variant_type.name
+            variants[name] = variants.get(name, 0) + 1
+            count += 1
+            if progress is not None and count % progress_interval == 0:
+                update()
+                progress(stats)
+            yield vcf_record
+        update()
+        if progress is not None:
+            progress(stats)
+
+    def __bytes_read(self) -> int:
+        offset = self.__variant_file.tell()
+        # Compressed files return a virtual offset, with the offset of the compressed block in the upper bits
+        return offset if self.__variant_file.compression == 'NONE' else offset >> 16
+
+    def __output(self, vcf_records: Iterable[VariantRecord]) -> Iterable[VariantRecord]:
+        if not self.__ordered:
+            return vcf_records
+        return self.__reorder(vcf_records)
+
+    def __reorder(self, vcf_records: Iterable[VariantRecord]):
+        reorder_buffer = ReorderBuffer(self.__contig_order, self.__reorder_window)
+        for vcf_record in vcf_records:
+            reorder_buffer.push(vcf_record)
+            # Position of the record of the VCF file that generated the variant
+            yield from reorder_buffer.advance(*self.__input_position)
+        yield from reorder_buffer.flush()
+
+    def __extract(self, regions: Optional[List[Tuple[str, int, Optional[int]]]] = None):
+        # Indexed files are sorted, so the mates of pending breakends can be tracked by position
+        sorted_input = self.__variant_file.index is not None or self.__assume_sorted
+        self.__pending_breakends = self.__new_pending_breakends(sorted_input)
+        self.__pairs_found = 0
+        self.__expired_breakends = []
+        track_mates = sorted_input and self.__max_pending_breakends is not None
+        try:
+            if regions is None:
+                # Read the next record from the VCF file
+                for rec in self.__records(self.__variant_file):
+                    if self.__ordered:
+                        self.__input_position = (rec.contig, rec.pos)
+                    if self.__assume_sorted:
+                        yield from self.__handle_expired_breakends(rec.contig, rec.pos)
+                    elif track_mates:
+                        self.__pending_breakends.advance(rec.contig, rec.pos)
+                    yield from self.__release(self.__handle_record(rec))
+            else:
+                if self.__variant_file.index is None:
+                    raise ValueError('Region queries require an indexed VCF file (.tbi or .csi)')
+                for contig, start, stop in regions:
+                    for rec in self.__records(self.__variant_file.fetch(contig, start, stop)):
+                        # Records are assigned to the region containing their position
+                        if rec.start < start:
+                            continue
+                        if self.__ordered:
+                            self.__input_position = (rec.contig, rec.pos)
+                        if track_mates:
+                            self.__pending_breakends.advance(rec.contig, rec.pos)
+                        yield from self.__release(self.__handle_record(rec))
+                yield from self.__handle_mates_outside_regions(regions)
+            yield from self.__handle_pending_breakends()
+        finally:
+            self.__pending_breakends.close()
+
+    def __records(self, records: Iterable[pysam.VariantRecord]) -> Iterable[pysam.VariantRecord]:
+        if self.__stage_timer is None:
+            return records
+        return self.__stage_timer.wrap_records(records)
+
+    def __new_pending_breakends(self, sorted_input=False) -> PendingBreakends:
+        if self.__max_pending_breakends is None and not (sorted_input and self.__assume_sorted):
+            pending_breakends = PendingBreakends()
+        else:
+            pending_breakends = PendingBreakends(self.__max_pending_breakends, sorted_input, MATE_LOOKUP_WINDOW)
+        if self.__stage_timer is not None:
+            self.__stage_timer.instrument_pending_breakends(pending_breakends)
+        return pending_breakends
+
+    def __extract_parallel(self, regions: Optional[List[Tuple[str, int, Optional[int]]]] = None):
+        if self.__variant_file.index is None:
+            raise ValueError('Parallel extraction requires an indexed VCF file (.tbi or .csi)')
+        self.__pending_breakends = self.__new_pending_breakends()
+        self.__pairs_found = 0
+        if regions is None:
+            regions = [(contig, 0, None) for contig in self.__variant_file.index]
+        contig_lengths = {contig: contig_record.length
+                          for contig, contig_record in self.__variant_file.header.contigs.items() if contig_record.length}
+        tasks = split_tasks(regions, contig_lengths, PARALLEL_CHUNK_SIZE)
+        extractor_kwargs = {'pass_only': self.__pass_only, 'ensure_pairs': self.__ensure_pairs,
+                            'fasta_ref': self.__fasta_ref_file, 'keep_raw': self.__keep_raw,
+                            'info_keys': self.__info_keys, 'format_keys': self.__format_keys,
+                            'contig_order': self.__contig_order}
+        for items, leftovers, pairs_found in run_tasks(self.__vcf_file, extractor_kwargs, tasks, self.__parallel):
+            self.__pairs_found += pairs_found
+            # Reconcile the breakends whose mate was extracted by a previous task, as the serial extraction would do
+            reconciled = []
+            for ordinal, vcf_record in leftovers:
+                for new_record in self.__handle_breakend_sv(vcf_record):
+                    reconciled.append((ordinal, new_record))
+            for _, vcf_record in heapq.merge(items, reconciled, key=lambda item: item[0]):
+                yield vcf_record
+        if self.__regions is not None:
+            yield from self.__handle_mates_outside_regions(regions)
+        try:
+            yield from self.__handle_pending_breakends()
+        finally:
+            self.__pending_breakends.close()
+
+    def _extract_task(self, contig: str, start: int, stop: Optional[int]):
+        """Extracts the variants of a region in a worker process of the parallel extraction. Returns the extracted variants
+        and the unpaired breakends, both tagged with the ordinal of the record that generated them, and the number of pairs found.
+        """
+        self.__pending_breakends = PendingBreakends()
+        self.__pairs_found = 0
+        self.__pending_ordinals = {}
+        items = []
+        for ordinal, rec in enumerate(self.__variant_file.fetch(contig, start, stop)):
+            if rec.start < start:
+                continue
+            self.__ordinal = ordinal
+            for vcf_record in self.__release(self.__handle_record(rec)):
+                items.append((ordinal, vcf_record))
+        leftovers = sorted((self.__pending_ordinals[id(vcf_record)], vcf_record)
+                           for vcf_record in self.__pending_breakends.values())
+        self.__pending_ordinals = None
+        return items, [(ordinal, vcf_record) for (ordinal, _), vcf_record in leftovers], self.__pairs_found
+
+    def __handle_mates_outside_regions(self, regions: List[Tuple[str, int, Optional[int]]]) -> Iterable[VariantRecord]:
+        for vcf_record in list(self.__pending_breakends.values()):
+            mate_breakend = vcf_record.alt_sv_breakend
+            assert mate_breakend is not None
+            # The mate would have already been paired
+            if in_regions(mate_breakend.contig, mate_breakend.pos, regions):
+                continue
+            try:
+                candidates = self.__variant_file.fetch(mate_breakend.contig,
+                                                       max(0, mate_breakend.pos - 1 - MATE_LOOKUP_WINDOW),
+                                                       mate_breakend.pos + MATE_LOOKUP_WINDOW)
+            except ValueError:
+                # Contig not present in the index
+                continue
+            for rec in candidates:
+                if not rec.alts or len(rec.alts) != 1 or not rec.ref or in_regions(rec.contig, rec.pos, regions):
+                    continue
+                mate_record = parse_breakend_sv(rec)
+                if mate_record is None:
+                    continue
+                previous_record = self.__pending_breakends.pop(mate_record)
+                if previous_record is not None:
+                    self.__pairs_found += 1
+                    yield from self.__release(self.__handle_braked_paired_sv(previous_record, mate_record))
+                    break
+
+    def __handle_expired_breakends(self, contig: str, pos: int) -> List[VariantRecord]:
+        # Breakends whose mate locus is before (contig, pos) in a sorted file are unpaired
+        record_list = []
+        for vcf_record in self.__pending_breakends.expire(contig, pos):
+            if self.__pass_only and 'PASS' not in vcf_record.filter:
+                continue
+            if not self.__ensure_pairs:
+                record_list.extend(self.__handle_breakend_individual_sv(vcf_record))
+            else:
+                # They are only unpaired records if other breakends are paired, so wait until a pair is found
+                self.__expired_breakends.append(vcf_record)
+        if self.__expired_breakends and self.__pairs_found > 0:
+            self.__raise_unpaired_breakends(self.__expired_breakends)
+        return record_list
+
+    def __raise_unpaired_breakends(self, vcf_records: List[VariantRecord]):
+        exception_text = ''
+        for vcf_record in vcf_records:
+            exception_text += str(vcf_record)+'\n'
+        raise Exception(
+            (f'There are {len(vcf_records)} unpaired SV breakends. '
+             'Please, check the entires shown below in VCF file. '
+             f'Use ensure_pairs=False to ignore unpaired SV breakends.\n{exception_text}'))
+
+    def __handle_pending_breakends(self) -> Iterable[VariantRecord]:
         # Remove non-PASS records from the pending breakends if pass_only is True
         if self.__pass_only:
             vcf_records = list(self.__pending_breakends.values())
@@ -79,48 +507,60 @@ class VariantExtractor:
                     self.__pending_breakends.remove(vcf_record)
         # Only single-paired records or not ensuring pairs
         if not self.__ensure_pairs or self.__pairs_found == 0:
+            if self.__fasta_ref is not None:
+                # Bases of the mates of unpaired breakends in other contigs are needed to permute them
+                self.__fasta_ref.prefetch((vcf_record.alt_sv_breakend.contig, vcf_record.alt_sv_breakend.pos - 1)
+                                          for vcf_record in self.__pending_breakends.values()
+                                          if vcf_record.alt_sv_breakend.contig != vcf_record.contig)
+            # Breakends found unpaired before the end of a sorted file
+            for vcf_record in self.__expired_breakends:
+                yield from self.__handle_breakend_individual_sv(vcf_record)
             for vcf_record in self.__pending_breakends.values():
                 yield from self.__handle_breakend_individual_sv(vcf_record)
         # Found unpaired records
-        elif len(self.__pending_breakends) > 0:
-            exception_text = ''
-            for vcf_record in self.__pending_breakends.values():
-                exception_text += str(vcf_record)+'\n'
-            raise Exception(
-                (f'There are {len(self.__pending_breakends)} unpaired SV breakends. '
-                 'Please, check the entires shown below in VCF file. '
-                 f'Use ensure_pairs=False to ignore unpaired SV breakends.\n{exception_text}'))
+        elif len(self.__pending_breakends) > 0 or self.__expired_breakends:
+            self.__raise_unpaired_breakends(self.__expired_breakends + list(self.__pending_breakends.values()))
+
+    def __release(self, vcf_records: List[VariantRecord]) -> List[VariantRecord]:
+        if self.__fields is not None:
+            for vcf_record in vcf_records:
+                vcf_record._fields = self.__fields
+        if not self.__keep_raw:
+            metadata = header_metadata(self.__variant_file.header)
+            for vcf_record in vcf_records:
+                vcf_record._detach(metadata)
+        return vcf_records
 
     def __handle_record(self, rec: pysam.VariantRecord) -> List[VariantRecord]:
-        if not rec.alts:
+        alts = rec.alts
+        if not alts:
             return []
         if not rec.ref:
             raise ValueError('Record does not have a REF field')
         # Handle multiallelic records
-        if len(rec.alts) != 1:
+        if len(alts) != 1:
             return self.__handle_multiallelic_record(rec)
+        alt_class = classify_alt(alts[0])
         # Check if breakend SV record
-        vcf_record = parse_breakend_sv(rec)
-        if vcf_record:
-            return self.__handle_breakend_sv(vcf_record)
+        if alt_class == ALT_BREAKEND:
+            vcf_record = parse_breakend_sv(rec)
+            if vcf_record:
+                return self.__handle_breakend_sv(vcf_record)
         # Check PASS filter
         if self.__pass_only and 'PASS' not in rec.filter:
             return []
         # Check if shorthand SV record
-        vcf_record = parse_shorthand_sv(rec)
-        if vcf_record:
-            return self.__handle_shorthand_sv(vcf_record)
-        # Check if single breakend SV record
-        vcf_record = parse_sgl_sv(rec)
-        if vcf_record:
-            return [vcf_record]
-        # Check if standard record
-        vcf_record = parse_standard_record(rec)
-        if vcf_record:
-            return self.__handle_standard_record(vcf_record)
-        else:
-            warnings.warn(f'Skipping unrecognized record:\n{rec}')
-            return []
+        if alt_class == ALT_SHORTHAND:
+            vcf_record = parse_shorthand_sv(rec)
+            if vcf_record:
+                return self.__handle_shorthand_sv(vcf_record)
+        # Check if single breakend SV record, otherwise it is a standard record
+        elif alt_class == ALT_SGL and 'SVTYPE' in rec.info:
+            return [create_sgl_record(rec)]
+        elif alt_class == ALT_SGL or alt_class == ALT_STANDARD:
+            return self.__handle_standard_record(create_standard_record(rec, alts[0]))
+        warnings.warn(f'Skipping unrecognized record:\n{rec}')
+        return []
 
     def __handle_standard_record(self, vcf_record: VariantRecord) -> List[VariantRecord]:
         record_list = []
@@ -147,7 +587,10 @@ class VariantExtractor:
         # Check for pending breakends
         previous_record = self.__pending_breakends.pop(vcf_record)
         if previous_record is None:
+            self.__release([vcf_record])
             self.__pending_breakends.push(vcf_record)
+            if self.__pending_ordinals is not None:
+                self.__pending_ordinals[id(vcf_record)] = (self.__ordinal, len(self.__pending_ordinals))
             return []
         # Mate breakend found, handle it
         self.__pairs_found += 1
@@ -163,7 +606,7 @@ class VariantExtractor:
         if len(filters) > 0:
             vcf_record_1.filter = list(filters)
             vcf_record_2.filter = list(filters)
-        contig_comparison = compare_contigs(vcf_record_1.contig, vcf_record_2.contig)
+        contig_comparison = self.__contig_order.compare(vcf_record_1.contig, vcf_record_2.contig)
         if contig_comparison == 0:
             if vcf_record_1.pos < vcf_record_2.pos:
                 return self.__handle_breakend_individual_sv(vcf_record_1)
@@ -176,7 +619,7 @@ class VariantExtractor:
 
     def __handle_breakend_individual_sv(self, vcf_record: VariantRecord) -> List[VariantRecord]:
         assert vcf_record.alt_sv_breakend is not None
-        contig_comparison = compare_contigs(vcf_record.contig, vcf_record.alt_sv_breakend.contig)
+        contig_comparison = self.__contig_order.compare(vcf_record.contig, vcf_record.alt_sv_breakend.contig)
         # Transform REF/ALT to equivalent notation so that REF contains the lowest contig and position
         if contig_comparison == 1 or (contig_comparison == 0 and vcf_record.pos > vcf_record.alt_sv_breakend.pos):
             vcf_record = permute_breakend_sv(vcf_record, self.__fasta_ref)
@@ -197,41 +640,17 @@ class VariantExtractor:
 
     def __handle_multiallelic_record(self, rec: pysam.VariantRecord) -> List[VariantRecord]:
         record_list = []
-        fake_rec = rec.copy()
-        assert fake_rec.alts is not None and len(fake_rec.alts) > 1
-        alts = fake_rec.alts
-        samples = dict()
-        for sample_name in rec.samples:
-            sample_dict = dict()
-            for key, value in rec.samples[sample_name].items():
-                sample_dict[key] = value
-            samples[sample_name] = sample_dict
-
-        original_id = fake_rec.id
-        for i, alt in enumerate(alts):
-            # WARNING: This overrides the record
-            fake_rec.alts = (alt,)
-            if original_id:
-                new_id = f'{original_id}_{i}'
-                fake_rec.id = new_id
-            new_records = self.__handle_record(fake_rec)
-            new_samples = dict()
-            for sample_name in samples:
-                new_samples[sample_name] = dict()
-                for key, value in samples[sample_name].items():
-                    if not hasattr(value, '__iter__') or len(value) == self.__variant_file.header.formats[key].number:
-                        new_samples[sample_name][key] = value
-                    else:
-                        if key == 'GT':
-                            new_samples[sample_name][key] = (0, samples[sample_name][key][1])
-                        elif len(value) == len(alts) + 1:
-                            new_samples[sample_name][key] = (value[0], value[i + 1])
-                        elif hasattr(value, '__iter__') and len(value) % len(alts) == 0:
-                            new_samples[sample_name][key] = value[i::len(alts)]
-                        else:
-                            new_samples[sample_name][key] = value
+        assert rec.alts is not None and len(rec.alts) > 1
+        # Samples are decoded once for all the alleles, and only if they are accessed
+        split_samples = self.__allele_splitter.split(rec, self.__format_keys)
+        original_id = rec.id
+        for i, alt in enumerate(rec.alts):
+            new_id = f'{original_id}_{i}' if original_id else original_id
+            new_records = self.__handle_record(AlleleRecord(rec, alt, new_id))
             for new_record in new_records:
-                new_record.samples = new_samples
+                new_record._rec = rec
+                new_record._samples = None
+                new_record._split = (split_samples, i)
             record_list.extend(new_records)
         return record_list
 
@@ -246,7 +665,7 @@ class VariantExtractor:
             df[field] = None
         return df
 
-    def to_dataframe(self, extra_fields=[]):
+    def to_dataframe(self, extra_fields=[], info_fields=[]):
         """Returns a pandas DataFrame with the variants extracted from the VCF file. The columns are:
 
         - start_chrom: chromosome of the start position
@@ -267,59 +686,120 @@ class VariantExtractor:
         The DataFrame can be extended with extra fields from the VariantRecord
         by passing their names in the extra_fields parameter. For example, passing 'id' will add the id field to the DataFrame.
         If :code:`variant_record_obj` is passed in extra_fields, the original VariantRecord object will be added to the DataFrame in a column named 'variant_record_obj'.
+        INFO fields can be added as well by passing their keys in the info_fields parameter. For example, passing 'SVTYPE' will add
+        a column named 'info_SVTYPE' to the DataFrame.
         """
-        import pandas as pd
-        variants = []
+        if self.__cache is not None and not extra_fields and not info_fields:
+            # The columns of a cached entry are loaded without restoring its variants
+            builder = self.__cache.load_columns(self.__cache.key(self.__vcf_file, self.__cache_options))
+            if builder is not None:
+                if self.__stats is not None:
+                    self.__count_types(builder)
+                return builder.to_dataframe(DATAFRAME_COLUMNS)
+        builder = ColumnBuilder(extra_fields, info_fields)
+        for variant_record in self:
+            builder.append(variant_record)
+        return builder.to_dataframe(DATAFRAME_COLUMNS)
+
+    def __count_types(self, builder: ColumnBuilder):
+        variants = self.__stats.variants
+        names = list(builder.categories['type_inferred'])
+        for code, count in Counter(builder.codes['type_inferred']).items():
+            variants[names[code]] = variants.get(names[code], 0) + count
 
+    def __iter_column_chunks(self, chunk_size, extra_fields, info_fields) -> Iterable[ColumnBuilder]:
+        builder = ColumnBuilder(extra_fields, info_fields)
+        contigs = [contig.replace('chr', '') for contig in self.__variant_file.header.contigs]
+        builder.seed('start_chrom', contigs)
+        builder.seed('end_chrom', contigs)
+        builder.seed('brackets', BRACKETS_VALUES)
+        builder.seed('type_inferred', [variant_type.name for variant_type in VariantType])
         for variant_record in self:
-            start_chrom = variant_record.contig.replace('chr', '')
-            start = variant_record.pos
-            ref = variant_record.ref
-            alt = variant_record.alt
-            length = variant_record.length
-            end = variant_record.end
-            if variant_record.alt_sv_breakend:
-                end_chrom = variant_record.alt_sv_breakend.contig.replace('chr', '')
-                if start_chrom != end_chrom:
-                    end = variant_record.alt_sv_breakend.pos
-            else:
-                end_chrom = start_chrom
-
-            # Inferred type
-            type_inferred = variant_record.variant_type.name
-            # breakends
-            breakends = ''
-            if type_inferred == VariantType.DEL.name:
-                breakends = 'N['
-            elif type_inferred == VariantType.DUP.name:
-                breakends = ']N'
-            elif type_inferred == VariantType.INV.name:
-                assert variant_record.alt_sv_breakend is not None
-                prefix = 'N' if variant_record.alt_sv_breakend.prefix else ''
-                suffix = 'N' if variant_record.alt_sv_breakend.suffix else ''
-                breakends = prefix + variant_record.alt_sv_breakend.bracket + suffix
-            elif type_inferred == VariantType.TRA.name:
-                assert variant_record.alt_sv_breakend is not None
-                prefix = 'N' if variant_record.alt_sv_breakend.prefix else ''
-                suffix = 'N' if variant_record.alt_sv_breakend.suffix else ''
-                breakends = prefix + variant_record.alt_sv_breakend.bracket + variant_record.alt_sv_breakend.bracket + suffix
-            
-            extra_values = []
-            for field in extra_fields:
-                if field == 'variant_record_obj':
-                    extra_values.append(variant_record)
-                elif hasattr(variant_record, field):
-                    extra_values.append(getattr(variant_record, field))
-                else:
-                    extra_values.append(None)
-            variants.append([start_chrom, start, end_chrom, end, ref, alt,
-                            length, breakends, type_inferred] + extra_values)
-
-        df = pd.DataFrame(variants, columns=DATAFRAME_COLUMNS + extra_fields)
-        for col in DATAFRAME_COLUMNS:
-            df[col] = df[col].astype(DATAFRAME_DTYPES[col])
-        # Reduce memory usage by using the smallest possible data type for start, end and length
-        df['start'] = _downcast(df['start'])
-        df['end'] = _downcast(df['end'])
-        df['length'] = _downcast(df['length'])
-        return df
+            builder.append(variant_record)
+            if len(builder) >= chunk_size:
+                yield builder
+                # The REF and ALT values of each chunk are its own, so the memory used does not grow with the file
+                builder.clear(reset_categories=UNBOUNDED_CATEGORICAL_COLUMNS)
+        if len(builder) > 0:
+            yield builder
+
+    def iter_dataframes(self, chunk_size=1_000_000, extra_fields=[], info_fields=[]):
+        """Iterates over pandas DataFrames of at most :code:`chunk_size` variants, so that the whole VCF file can be processed
+        in bounded memory. The columns are the same as in :meth:`to_dataframe`.
+
+        Breakend pairs are returned in the DataFrame where their pair is completed, even if the first breakend was read
+        while building a previous DataFrame.
+
+        The integer columns are not downcasted and keep the :code:`DATAFRAME_DTYPES` types. The categories of
+        :code:`start_chrom`, :code:`end_chrom`, :code:`brackets` and :code:`type_inferred` are known beforehand (from the
+        VCF header contigs and the possible variant types), so they are identical in every DataFrame unless a contig
+        missing from the header is found. The categories of :code:`ref` and :code:`alt` only contain the values of each
+        DataFrame, so the memory used does not grow with the VCF file. :code:`pandas.concat` converts columns with
+        different categories to :code:`object`, use :code:`pandas.api.types.union_categoricals` to keep them
+        categorical when combining the DataFrames.
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            Maximum number of variants in each DataFrame.
+        extra_fields : list, optional
+            Extra fields from the VariantRecord added to the DataFrames. See :meth:`to_dataframe`.
+        info_fields : list, optional
+            INFO fields added to the DataFrames. See :meth:`to_dataframe`.
+        """
+        for builder in self.__iter_column_chunks(chunk_size, extra_fields, info_fields):
+            yield builder.to_dataframe(DATAFRAME_COLUMNS, downcast=False, sort_categories=False)
+
+    def iter_record_batches(self, batch_size=1_000_000, extra_fields=[], info_fields=[]):
+        """Iterates over :code:`pyarrow.RecordBatch` objects of at most :code:`batch_size` variants. Requires :code:`pyarrow`.
+
+        The columns are the same as in :meth:`to_dataframe`. :code:`start`, :code:`end` and :code:`length` are
+        :code:`uint64` arrays built without copying the extracted values, and the categorical columns are dictionary-encoded
+        with the values of each RecordBatch.
+        Extra fields from the VariantRecord (except :code:`variant_record_obj`) can be added with the extra_fields parameter,
+        and INFO fields with the info_fields parameter (as :code:`info_<KEY>` columns typed after the VCF header).
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Maximum number of variants in each RecordBatch.
+        extra_fields : list, optional
+            Extra fields from the VariantRecord added to the RecordBatches.
+        info_fields : list, optional
+            INFO fields added to the RecordBatches.
+        """
+        from .private._arrow import build_schema, to_record_batch
+        schema = build_schema(DATAFRAME_COLUMNS, extra_fields, info_fields, self.__variant_file.header)
+        for builder in self.__iter_column_chunks(batch_size, extra_fields, info_fields):
+            yield to_record_batch(builder, schema)
+
+    def to_arrow(self, extra_fields=[], info_fields=[], batch_size=1_000_000):
+        """Returns a :code:`pyarrow.Table` with the variants extracted from the VCF file. Requires :code:`pyarrow`.
+        See :meth:`iter_record_batches` for the columns.
+        """
+        import pyarrow as pa
+        from .private._arrow import build_schema
+        schema = build_schema(DATAFRAME_COLUMNS, extra_fields, info_fields, self.__variant_file.header)
+        return pa.Table.from_batches(list(self.iter_record_batches(batch_size, extra_fields, info_fields)), schema=schema)
+
+    def write_parquet(self, path: str, row_group_size=1_000_000, extra_fields=[], info_fields=[]):
+        """Writes the variants extracted from the VCF file to a Parquet file, one row group at a time, so the whole VCF
+        file is never held in memory. Requires :code:`pyarrow`. See :meth:`iter_record_batches` for the columns.
+
+        Parameters
+        ----------
+        path : str
+            Output Parquet file.
+        row_group_size : int, optional
+            Maximum number of variants in each row group.
+        extra_fields : list, optional
+            Extra fields from the VariantRecord added to the Parquet file.
+        info_fields : list, optional
+            INFO fields added to the Parquet file.
+        """
+        import pyarrow.parquet as pq
+        from .private._arrow import build_schema
+        schema = build_schema(DATAFRAME_COLUMNS, extra_fields, info_fields, self.__variant_file.header)
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in self.iter_record_batches(row_group_size, extra_fields, info_fields):
+                writer.write_batch(batch, row_group_size=row_group_size)
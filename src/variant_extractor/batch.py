@@ -0,0 +1,147 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from array import array
+from typing import Any, Iterable, List, NamedTuple, Optional
+
+import pysam
+
+from .VariantExtractor import DATAFRAME_COLUMNS
+from .private._ColumnBuilder import ColumnBuilder
+from .private._parallel import init_batch_worker, close_batch_worker, extract_columns
+
+OUTPUT_TYPES = ('dataframe', 'arrow')
+
+
+class FileReport(NamedTuple):
+    """Result of the extraction of a VCF file of a batch
+    """
+    source: str
+    """Label of the VCF file in the :code:`source` column"""
+    variants: int
+    """Number of variants extracted"""
+    seconds: float
+    """Time taken by the extraction"""
+    error: Optional[str]
+    """Error that stopped the extraction, or :code:`None` if it succeeded"""
+
+    @property
+    def variants_per_second(self) -> float:
+        """Throughput of the extraction"""
+        return self.variants / self.seconds if self.seconds > 0 else 0.0
+
+
+class BatchResult(NamedTuple):
+    """Variants extracted from a batch of VCF files
+    """
+    table: Any
+    """pandas DataFrame or :code:`pyarrow.Table` with the variants of all the files that were extracted successfully"""
+    reports: List[FileReport]
+    """Report of each file, in the same order as the files"""
+
+    @property
+    def failed(self) -> List[FileReport]:
+        """Reports of the files whose extraction failed"""
+        return [report for report in self.reports if report.error is not None]
+
+
+def _merged_header(vcf_files: Iterable[str]) -> pysam.VariantHeader:
+    # Header with the INFO fields of all the files, the first definition of each field is kept
+    header = pysam.VariantHeader()
+    for vcf_file in vcf_files:
+        with pysam.VariantFile(vcf_file) as variant_file:
+            for key, metadata in variant_file.header.info.items():
+                if key not in header.info:
+                    header.info.add(key, metadata.number, metadata.type, metadata.description)
+    return header
+
+
+def _run(vcf_files, fasta_ref, extractor_kwargs, extra_fields, info_fields, workers):
+    args = [(vcf_file, fasta_ref, extractor_kwargs, extra_fields, info_fields) for vcf_file in vcf_files]
+    if workers <= 1:
+        init_batch_worker(fasta_ref)
+        try:
+            for task_args in args:
+                yield extract_columns(*task_args)
+        finally:
+            close_batch_worker()
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker, initargs=(fasta_ref,)) as executor:
+        # Results are returned in the order of the files
+        yield from executor.map(extract_columns, *zip(*args))
+
+
+def extract_many(vcf_files: List[str], workers: int = 1, sources: Optional[List[str]] = None, output='dataframe',
+                 extra_fields=[], info_fields=[], fasta_ref: Optional[str] = None, **kwargs) -> BatchResult:
+    """Extracts the variants of several VCF files, each one in a different process, into a single table with a
+    :code:`source` column identifying the file of each variant. The columns are the same as in
+    :meth:`VariantExtractor.to_dataframe` (or :meth:`VariantExtractor.to_arrow`), and the categories of the categorical
+    columns are unified across the files.
+
+    A file whose extraction fails does not stop the batch. Its error is reported in :attr:`BatchResult.reports`, along
+    with the number of variants and time taken by each file, and its variants are not included in the table.
+
+    Parameters
+    ----------
+    vcf_files : list
+        VCF files.
+    workers : int, optional
+        Number of worker processes. Each worker opens the FASTA reference once and shares it (and its cache of blocks)
+        between the files it extracts.
+    sources : list, optional
+        Label of each file in the :code:`source` column. By default, the paths of the files.
+    output : str, optional
+        Either :code:`'dataframe'` (pandas DataFrame) or :code:`'arrow'` (:code:`pyarrow.Table`, requires
+        :code:`pyarrow`). The types of the INFO fields of an Arrow table are taken from the first file that defines them.
+    extra_fields : list, optional
+        Extra fields from the VariantRecord added to the table. See :meth:`VariantExtractor.to_dataframe`.
+    info_fields : list, optional
+        INFO fields added to the table. See :meth:`VariantExtractor.to_dataframe`.
+    fasta_ref : str, optional
+        A FASTA file with the reference genome, see :class:`VariantExtractor`.
+    **kwargs
+        Other parameters of :class:`VariantExtractor`, such as :code:`pass_only` or :code:`ensure_pairs`.
+
+    Returns
+    -------
+    BatchResult
+        The table and the report of each file.
+    """
+    if output not in OUTPUT_TYPES:
+        raise ValueError(f'Invalid output {output}, must be one of {", ".join(OUTPUT_TYPES)}')
+    vcf_files = list(vcf_files)
+    sources = list(sources) if sources is not None else [str(vcf_file) for vcf_file in vcf_files]
+    if len(sources) != len(vcf_files):
+        raise ValueError('sources must have the same length as vcf_files')
+    # Files with the same label share its code in the source column
+    labels = {}
+    for source in sources:
+        labels.setdefault(source, len(labels))
+    builder = ColumnBuilder(extra_fields, info_fields)
+    source_codes = array('i')
+    reports = []
+    results = _run(vcf_files, fasta_ref, kwargs, extra_fields, info_fields, workers)
+    for source, (file_builder, seconds, error) in zip(sources, results):
+        variants = 0
+        if file_builder is not None:
+            variants = len(file_builder)
+            builder.extend(file_builder)
+            source_codes.extend(array('i', [labels[source]]) * variants)
+        reports.append(FileReport(source, variants, seconds, error))
+    if output == 'dataframe':
+        import numpy as np
+        import pandas as pd
+        table = builder.to_dataframe(DATAFRAME_COLUMNS)
+        codes = np.frombuffer(source_codes, dtype=np.int32) if len(source_codes) else np.empty(0, dtype=np.int32)
+        table.insert(0, 'source', pd.Categorical.from_codes(codes, categories=list(labels)))
+    else:
+        import pyarrow as pa
+        from .private._arrow import build_schema, to_record_batch, DICTIONARY_TYPE
+        succeeded = [vcf_file for vcf_file, report in zip(vcf_files, reports) if report.error is None]
+        schema = build_schema(DATAFRAME_COLUMNS, extra_fields, info_fields, _merged_header(succeeded))
+        batch = to_record_batch(builder, schema)
+        indices = pa.Array.from_buffers(pa.int32(), len(source_codes), [None, pa.py_buffer(source_codes)])
+        source_column = pa.DictionaryArray.from_arrays(indices, pa.array(list(labels), type=pa.string()))
+        table = pa.Table.from_batches([batch]).add_column(0, pa.field('source', DICTIONARY_TYPE), source_column)
+    return BatchResult(table, reports)
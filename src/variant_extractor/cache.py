@@ -0,0 +1,356 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from argparse import ArgumentParser
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .private._AlleleSplitter import TextSplitSamples
+from .private._ColumnBuilder import ColumnBuilder, NUMERIC_COLUMNS, CATEGORICAL_COLUMNS
+from .private._decoder import HeaderMetadata
+from .variants import SamplesView, VariantRecord, _restore_record
+
+# Maximum total size (in bytes) of the cache directory, the least recently used entries are removed beyond it
+CACHE_MAX_SIZE = 4 * 1024 * 1024 * 1024
+# Variants stored together in each compressed chunk of an entry
+CACHE_CHUNK_SIZE = 10000
+# Bytes of the beginning of the VCF file hashed in the key, besides its size and modification time
+HASHED_BYTES = 1024 * 1024
+_ENTRY_SUFFIX = '.vxc'
+_INFO_SUFFIX = '.json'
+_MAGIC = b'VXCACHE1'
+# Length of each block, and offset of the columns block at the end of the entry
+_BLOCK_LENGTH = struct.Struct('<Q')
+# Fields of the variants stored in each chunk, the INFO, FORMAT and sample columns are kept as text
+_RECORD_FIELDS = ['contig', 'pos', 'end', 'length', 'id', 'ref', 'alt', 'variant_type', 'alt_sv_breakend',
+                  'alt_sv_shorthand', 'qual', 'filter', 'raw', 'split']
+
+
+class _InvalidEntry(ValueError):
+    pass
+
+
+def _file_signature(path: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        digest = hashlib.blake2b(f.read(HASHED_BYTES)).hexdigest()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest}
+
+
+def _write_block(entry, data: bytes):
+    data = zlib.compress(data, 1)
+    entry.write(_BLOCK_LENGTH.pack(len(data)))
+    entry.write(data)
+
+
+def _read_block(entry) -> bytes:
+    length = entry.read(_BLOCK_LENGTH.size)
+    if len(length) != _BLOCK_LENGTH.size:
+        raise _InvalidEntry('Truncated entry')
+    data = entry.read(_BLOCK_LENGTH.unpack(length)[0])
+    try:
+        return zlib.decompress(data)
+    except zlib.error as e:
+        raise _InvalidEntry(str(e))
+
+
+def _record_fields(variant_record: VariantRecord) -> tuple:
+    # The columns are taken as written by str(), so they are the ones the variant had when it was returned, including
+    # the changes of the extraction. Unchanged columns are copied from the original line
+    split = None
+    if variant_record._tail_unchanged():
+        raw = _original_tail(variant_record)
+    elif variant_record._split is not None and variant_record._rec is not None and variant_record._info is None and \
+            variant_record._format is None and variant_record._fields is None and \
+            not variant_record._samples_loaded():
+        # Alleles of a multiallelic record keep the columns of the record and the index of their ALT allele, so their
+        # samples are split again when accessed instead of being written
+        raw = _original_tail(variant_record)
+        split = [variant_record._split[1], len(variant_record._rec.alts)]
+    else:
+        columns = str(variant_record).split('\t', 7)
+        raw = columns[7] if len(columns) > 7 else None
+    breakend = variant_record.alt_sv_breakend
+    shorthand = variant_record.alt_sv_shorthand
+    return (variant_record.contig, variant_record.pos, variant_record.end, variant_record.length, variant_record.id,
+            variant_record.ref, variant_record.alt, variant_record.variant_type.value,
+            list(breakend) if breakend is not None else None,
+            list(shorthand) if shorthand is not None else None,
+            variant_record.qual, variant_record.filter, raw, split)
+
+
+def _original_tail(variant_record: VariantRecord) -> Optional[str]:
+    if variant_record._rec is None:
+        return variant_record._raw
+    columns = str(variant_record._rec).split('\t', 7)
+    return columns[7].rstrip() if len(columns) > 7 else None
+
+
+def _encode_columns(builder: ColumnBuilder) -> bytes:
+    arrays = [builder.numeric[column] for column in NUMERIC_COLUMNS] + \
+        [builder.codes[column] for column in CATEGORICAL_COLUMNS]
+    header = json.dumps({'byteorder': sys.byteorder, 'length': len(builder),
+                         'categories': {column: list(builder.categories[column]) for column in CATEGORICAL_COLUMNS},
+                         'arrays': [[a.typecode, len(a)] for a in arrays]}).encode()
+    return _BLOCK_LENGTH.pack(len(header)) + header + b''.join(a.tobytes() for a in arrays)
+
+
+def _decode_columns(data: bytes) -> ColumnBuilder:
+    header_length = _BLOCK_LENGTH.unpack_from(data)[0]
+    offset = _BLOCK_LENGTH.size + header_length
+    header = json.loads(data[_BLOCK_LENGTH.size:offset])
+    if header['byteorder'] != sys.byteorder:
+        raise _InvalidEntry('Entry stored with a different byte order')
+    arrays = []
+    for typecode, length in header['arrays']:
+        values = array(typecode)
+        end = offset + length * values.itemsize
+        values.frombytes(data[offset:end])
+        if len(values) != header['length']:
+            raise _InvalidEntry('Column of a different length')
+        arrays.append(values)
+        offset = end
+    builder = ColumnBuilder()
+    builder.numeric = dict(zip(NUMERIC_COLUMNS, arrays))
+    builder.codes = dict(zip(CATEGORICAL_COLUMNS, arrays[len(NUMERIC_COLUMNS):]))
+    builder.categories = {column: {value: code for code, value in enumerate(header['categories'][column])}
+                          for column in CATEGORICAL_COLUMNS}
+    return builder
+
+
+class ExtractionCache:
+    """Directory with the variants extracted from VCF files, so that later extractions with the same options load them
+    instead of extracting them again. Each entry is identified by the size, modification time and a hash of the
+    beginning of the VCF file, the extraction options and the version of the package. When the directory exceeds
+    :code:`max_size`, the least recently used entries are removed.
+
+    Entries are not pickled, so loading them never runs code from the cache directory. The fields of the variants are
+    stored as compressed JSON in chunks, with their INFO, FORMAT and sample columns as text (decoded when accessed, as
+    in detached variants). The DataFrame columns of the variants (see
+    :meth:`~variant_extractor.VariantExtractor.to_dataframe`) are stored after them as typed arrays, so they can be
+    loaded without restoring the variants.
+    """
+
+    def __init__(self, cache_dir: str, max_size: Optional[int] = CACHE_MAX_SIZE):
+        """
+        Parameters
+        ----------
+        cache_dir : str
+            Directory of the cache, created if it does not exist.
+        max_size : int, optional
+            Maximum total size in bytes of the entries. If :code:`None`, entries are never removed.
+        """
+        self.__cache_dir = cache_dir
+        self.__max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(vcf_file: str, options: Dict[str, Any]) -> str:
+        """Returns the key of the entry of a VCF file extracted with the given options."""
+        from . import __version__
+        signature = {'vcf_file': _file_signature(vcf_file), 'options': options, 'version': __version__}
+        fasta_ref = options.get('fasta_ref')
+        if fasta_ref is not None:
+            signature['fasta_ref'] = _file_signature(fasta_ref)
+        return hashlib.sha256(json.dumps(signature, sort_keys=True, default=str).encode()).hexdigest()
+
+    def __path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.__cache_dir, key + suffix)
+
+    def __open(self, key: str):
+        # Returns the entry positioned after its header and the offset of its columns block, or None if it is not
+        # cached or it is not valid
+        path = self.__path(key, _ENTRY_SUFFIX)
+        try:
+            entry = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            size = os.fstat(entry.fileno()).st_size
+            if entry.read(len(_MAGIC)) != _MAGIC or size < len(_MAGIC) + _BLOCK_LENGTH.size:
+                raise _InvalidEntry('Not an entry')
+            entry.seek(size - _BLOCK_LENGTH.size)
+            columns_offset = _BLOCK_LENGTH.unpack(entry.read(_BLOCK_LENGTH.size))[0]
+            if not len(_MAGIC) <= columns_offset < size:
+                raise _InvalidEntry('Not an entry')
+            entry.seek(len(_MAGIC))
+        except _InvalidEntry:
+            entry.close()
+            return None
+        # The modification time of an entry is its last use
+        os.utime(path)
+        return entry, columns_offset
+
+    def load(self, key: str, metadata: HeaderMetadata) -> Optional[Iterator[VariantRecord]]:
+        """Returns an iterator over the variants of an entry, or :code:`None` if it is not cached. The variants are
+        detached, :code:`metadata` is the metadata of the header of the VCF file, used to decode their INFO, FORMAT and
+        sample columns.
+        """
+        opened = self.__open(key)
+        if opened is None:
+            return None
+        return self.__read(*opened, metadata)
+
+    @staticmethod
+    def __read(entry, columns_offset: int, metadata: HeaderMetadata) -> Iterator[VariantRecord]:
+        split_samples = None
+        split_raw = None
+        with entry:
+            while entry.tell() < columns_offset:
+                chunk = json.loads(_read_block(entry))
+                for contig, pos, end, length, id_, ref, alt, variant_type, breakend, shorthand, qual, filter_, raw, \
+                        split in zip(*(chunk[field] for field in _RECORD_FIELDS)):
+                    variant_record = _restore_record(contig, pos, end, length, id_, ref, alt, variant_type, breakend,
+                                                     shorthand, qual, filter_, None, None, None, raw, metadata)
+                    if split is not None:
+                        # The alleles of a record share its samples
+                        if raw != split_raw:
+                            columns = variant_record._raw_columns()
+                            split_samples = TextSplitSamples(columns[1] if len(columns) > 1 else '.', columns[2:],
+                                                             split[1], metadata)
+                            split_raw = raw
+                        variant_record._split = (split_samples, split[0])
+                    yield variant_record
+
+    def load_columns(self, key: str) -> Optional[ColumnBuilder]:
+        """Returns the DataFrame columns of the variants of an entry, or :code:`None` if it is not cached."""
+        opened = self.__open(key)
+        if opened is None:
+            return None
+        entry, columns_offset = opened
+        with entry:
+            entry.seek(columns_offset)
+            try:
+                return _decode_columns(_read_block(entry))
+            except (_InvalidEntry, ValueError, KeyError, TypeError, struct.error):
+                return None
+
+    def store(self, key: str, variant_records: Iterable[VariantRecord], info: Optional[Dict[str, Any]] = None) \
+            -> Iterator[VariantRecord]:
+        """Stores the variants of an iterable while they are iterated. The entry is only added once all of them have
+        been iterated, an extraction that fails or is not completed is discarded.
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix=_ENTRY_SUFFIX, dir=self.__cache_dir)
+        completed = False
+        builder = ColumnBuilder()
+        try:
+            with os.fdopen(fd, 'wb') as entry:
+                entry.write(_MAGIC)
+                chunk = []
+                for variant_record in variant_records:
+                    # The fields are taken before the variant is returned, as it may be modified afterwards
+                    chunk.append(_record_fields(variant_record))
+                    builder.append(variant_record)
+                    if len(chunk) == CACHE_CHUNK_SIZE:
+                        self.__write_chunk(entry, chunk)
+                        chunk = []
+                    yield variant_record
+                if chunk:
+                    self.__write_chunk(entry, chunk)
+                columns_offset = entry.tell()
+                _write_block(entry, _encode_columns(builder))
+                entry.write(_BLOCK_LENGTH.pack(columns_offset))
+            info = dict(info or {}, records=len(builder), created=time.time())
+            with open(self.__path(key, _INFO_SUFFIX), 'w') as info_file:
+                json.dump(info, info_file, default=str)
+            os.replace(tmp_path, self.__path(key, _ENTRY_SUFFIX))
+            completed = True
+        finally:
+            if not completed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if self.__max_size is not None:
+            self.evict(self.__max_size)
+
+    @staticmethod
+    def __write_chunk(entry, chunk: List[tuple]):
+        _write_block(entry, json.dumps(dict(zip(_RECORD_FIELDS, map(list, zip(*chunk))))).encode())
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Returns the key, size, last use and extraction information of each entry, from the most recently used."""
+        entries = []
+        for file_name in os.listdir(self.__cache_dir):
+            if not file_name.endswith(_ENTRY_SUFFIX) or file_name.startswith('.'):
+                continue
+            key = file_name[:-len(_ENTRY_SUFFIX)]
+            try:
+                stat = os.stat(self.__path(key, _ENTRY_SUFFIX))
+            except FileNotFoundError:
+                continue
+            info = {}
+            try:
+                with open(self.__path(key, _INFO_SUFFIX)) as info_file:
+                    info = json.load(info_file)
+            except (FileNotFoundError, ValueError):
+                pass
+            entries.append({'key': key, 'size': stat.st_size, 'last_used': stat.st_mtime, **info})
+        entries.sort(key=lambda entry: entry['last_used'], reverse=True)
+        return entries
+
+    def remove(self, key: str):
+        """Removes an entry."""
+        for suffix in (_ENTRY_SUFFIX, _INFO_SUFFIX):
+            try:
+                os.remove(self.__path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+    def evict(self, max_size: int) -> int:
+        """Removes the least recently used entries until the cache takes at most :code:`max_size` bytes. Returns the
+        number of entries removed.
+        """
+        entries = self.entries()
+        total_size = sum(entry['size'] for entry in entries)
+        removed = 0
+        while entries and total_size > max_size:
+            entry = entries.pop()
+            self.remove(entry['key'])
+            total_size -= entry['size']
+            removed += 1
+        return removed
+
+    def purge(self) -> int:
+        """Removes all the entries. Returns the number of entries removed."""
+        return self.evict(0)
+
+
+def _format_size(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{size:.0f} B'
+        size /= 1024
+    return f'{size:.1f} GiB'
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    """Entry point of the :code:`variant-extractor-cache` command."""
+    parser = ArgumentParser(prog='variant-extractor-cache', description='Inspect or purge an extraction cache')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    list_parser = subparsers.add_parser('list', help='List the entries, from the most recently used')
+    list_parser.add_argument('cache_dir', help='Cache directory')
+    purge_parser = subparsers.add_parser('purge', help='Remove the entries')
+    purge_parser.add_argument('cache_dir', help='Cache directory')
+    purge_parser.add_argument('--max-size', type=int,
+                              help='Only remove the least recently used entries until the cache takes at most this '
+                                   'size (in MiB)')
+    args = parser.parse_args(list(argv) if argv is not None else None)
+
+    cache = ExtractionCache(args.cache_dir, max_size=None)
+    if args.command == 'list':
+        entries = cache.entries()
+        print(f'{"key":<14}{"size":>12}{"records":>10}  {"last used":<20}vcf_file')
+        for entry in entries:
+            last_used = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['last_used']))
+            print(f'{entry["key"][:12]:<14}{_format_size(entry["size"]):>12}{entry.get("records", "?"):>10}  '
+                  f'{last_used:<20}{entry.get("vcf_file", "?")}')
+        print(f'{len(entries)} entries, {_format_size(sum(entry["size"] for entry in entries))}')
+    else:
+        removed = cache.purge() if args.max_size is None else cache.evict(args.max_size * 1024 * 1024)
+        print(f'Removed {removed} entries', file=sys.stderr)
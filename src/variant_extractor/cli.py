@@ -0,0 +1,180 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import csv
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from typing import Iterable, Optional
+
+from .VariantExtractor import VariantExtractor, DATAFRAME_COLUMNS
+from .normalize import _add_arguments as _add_normalize_arguments, _run as _run_normalize
+from .private._ColumnBuilder import row_values, info_column
+from .writer import VariantWriter
+
+# Variants written between flushes of the CSV/TSV output
+_ROWS_PER_FLUSH = 10_000
+
+
+def _extractor(args, **kwargs):
+    return VariantExtractor(args.vcf_file, pass_only=args.pass_only, ensure_pairs=not args.allow_unpaired,
+                            fasta_ref=args.fasta_ref, **kwargs)
+
+
+def _format_value(value) -> str:
+    # Values as written by the CSV output of pandas, except that multiple values are joined with commas
+    if value is None:
+        return ''
+    if isinstance(value, (tuple, list)):
+        return ','.join('' if v is None else str(v) for v in value)
+    return str(value)
+
+
+def _to_delimited(args, delimiter: str):
+    info_fields = args.info_fields
+    extractor = _extractor(args)
+    output = sys.stdout if args.output_file == '-' else open(args.output_file, 'w', newline='')
+    total = 0
+    try:
+        writer = csv.writer(output, delimiter=delimiter, lineterminator='\n')
+        # Same columns as to_dataframe(extra_fields=['id'], info_fields=...) and to-parquet
+        writer.writerow(DATAFRAME_COLUMNS + ['id'] + [info_column(key) for key in info_fields])
+        rows = []
+        for variant_record in extractor:
+            row = list(row_values(variant_record))
+            row.append(_format_value(variant_record.id))
+            row.extend(_format_value(variant_record._info_value(key)) for key in info_fields)
+            rows.append(row)
+            if len(rows) >= _ROWS_PER_FLUSH:
+                writer.writerows(rows)
+                total += len(rows)
+                rows.clear()
+        writer.writerows(rows)
+        total += len(rows)
+    finally:
+        extractor.close()
+        if output is not sys.stdout:
+            output.close()
+    return total
+
+
+def _to_csv(args):
+    return _to_delimited(args, ',')
+
+
+def _to_tsv(args):
+    return _to_delimited(args, '\t')
+
+
+def _to_parquet(args):
+    extractor = _extractor(args)
+    try:
+        extractor.write_parquet(args.output_file, row_group_size=args.row_group_size, extra_fields=['id'],
+                                info_fields=args.info_fields)
+    finally:
+        extractor.close()
+    # pyarrow is only imported by this subcommand (pandas by none), as the command may be run over many small VCF files
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(args.output_file).metadata.num_rows
+
+
+def _stats(args):
+    def progress(stats):
+        print(f'{stats.records_read} records, {stats.total_variants} variants, {stats.bytes_read} bytes read, '
+              f'{stats.records_per_second:.0f} records/s', file=sys.stderr)
+
+    extractor = _extractor(args, stats=True, progress=progress if args.progress else None)
+    try:
+        for _ in extractor:
+            pass
+    finally:
+        extractor.close()
+    stats = extractor.stats
+    print(json.dumps(stats.as_dict(), indent=2) if args.json else stats)
+    return stats.total_variants
+
+
+def _split_by_type(args):
+    extractor = _extractor(args)
+    writers = {}
+    total = 0
+    try:
+        for variant_record in extractor:
+            variant_type = variant_record.variant_type.name
+            writer = writers.get(variant_type)
+            if writer is None:
+                # Only the types found get a file
+                writer = VariantWriter(f'{args.output_prefix}.{variant_type}.{args.format}', extractor.header,
+                                       args.format)
+                writers[variant_type] = writer
+            writer.write(variant_record)
+            total += 1
+    finally:
+        for writer in writers.values():
+            writer.close()
+        extractor.close()
+    for variant_type in sorted(writers):
+        print(f'{args.output_prefix}.{variant_type}.{args.format}', file=sys.stderr)
+    return total
+
+
+def _normalize(args):
+    _run_normalize(args, ' '.join(['variant-extractor'] + args.argv))
+
+
+def _add_extraction_arguments(parser: ArgumentParser):
+    parser.add_argument('-f', '--fasta-ref', help='FASTA reference to fill the bases of SVs')
+    parser.add_argument('--pass-only', action='store_true', help='Only extract the variants with FILTER=PASS')
+    parser.add_argument('--allow-unpaired', action='store_true', help='Do not fail on unpaired SV breakends')
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    """Entry point of the :code:`variant-extractor` command."""
+    argv = list(argv) if argv is not None else sys.argv[1:]
+    parser = ArgumentParser(prog='variant-extractor',
+                            description='Extract the variants of a VCF file. The variants are streamed, so the whole '
+                                        'VCF file is never held in memory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, delimiter in (('to-csv', 'CSV'), ('to-tsv', 'TSV')):
+        subparser = subparsers.add_parser(name, help=f'Write the variants as {delimiter}, with the columns of '
+                                                     'VariantExtractor.to_dataframe()')
+        subparser.add_argument('vcf_file', help='VCF file')
+        subparser.add_argument('output_file', help=f'Output {delimiter} file, or - for the standard output')
+        subparser.add_argument('-i', '--info-fields', nargs='*', default=[], help='INFO fields to include')
+        _add_extraction_arguments(subparser)
+    subparser = subparsers.add_parser('to-parquet', help='Write the variants as Parquet (requires pyarrow)')
+    subparser.add_argument('vcf_file', help='VCF file')
+    subparser.add_argument('output_file', help='Output Parquet file')
+    subparser.add_argument('-i', '--info-fields', nargs='*', default=[], help='INFO fields to include')
+    subparser.add_argument('--row-group-size', type=int, default=1_000_000, help='Variants per row group')
+    _add_extraction_arguments(subparser)
+    _add_normalize_arguments(subparsers.add_parser('normalize', help='Write a normalized and sorted VCF file'))
+    subparser = subparsers.add_parser('stats', help='Print the extraction stats (see ExtractionStats)')
+    subparser.add_argument('vcf_file', help='VCF file')
+    subparser.add_argument('--json', action='store_true', help='Print the stats as JSON')
+    subparser.add_argument('--progress', action='store_true', help='Print the progress to the standard error')
+    _add_extraction_arguments(subparser)
+    subparser = subparsers.add_parser('split-by-type', help='Write the variants of each type to a different file')
+    subparser.add_argument('vcf_file', help='VCF file')
+    subparser.add_argument('output_prefix', help='Prefix of the output files, named <prefix>.<TYPE>.<format>')
+    subparser.add_argument('--format', choices=('vcf', 'vcf.gz', 'bcf'), default='vcf', help='Output format')
+    _add_extraction_arguments(subparser)
+    args = parser.parse_args(argv)
+    args.argv = argv
+
+    commands = {'to-csv': _to_csv, 'to-tsv': _to_tsv, 'to-parquet': _to_parquet, 'normalize': _normalize,
+                'stats': _stats, 'split-by-type': _split_by_type}
+    try:
+        total = commands[args.command](args)
+    except BrokenPipeError:
+        # The standard output was closed by the consumer (for example, head)
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    except Exception as e:
+        # Errors of the extraction, such as unpaired breakends, may list many records, only the first line is shown
+        message = str(e).strip().split('\n', 1)[0] or type(e).__name__
+        print(f'variant-extractor {args.command}: error: {message}', file=sys.stderr)
+        sys.exit(1)
+    if args.command in ('to-csv', 'to-tsv', 'to-parquet', 'split-by-type'):
+        print(f'Written {total} variants', file=sys.stderr)
@@ -0,0 +1,93 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from functools import cmp_to_key
+from typing import Iterable, Iterator, List
+
+import pysam
+
+from .private._utils import compare_contigs
+
+_CONTIG_KEY = cmp_to_key(compare_contigs)
+
+
+class ContigOrder:
+    """Precomputed table with the rank of each contig, so that contigs can be compared as integers.
+    Contigs not in the table are ranked after the known ones, sorted in natural order (:code:`chr2` before
+    :code:`chr10`) among them. When a new contig is ranked, the ranks of the other unknown contigs may change, so add all
+    the contigs with :meth:`update` before using the ranks as sorting keys.
+    """
+
+    def __init__(self, contigs: Iterable[str] = (), sort=True):
+        """
+        Parameters
+        ----------
+        contigs : iterable, optional
+            Known contigs.
+        sort : bool, optional
+            If :code:`True`, the known contigs are sorted in natural order. Otherwise, they keep the given order.
+        """
+        self.__known = list(dict.fromkeys(contigs))
+        if sort:
+            self.__known.sort(key=_CONTIG_KEY)
+        self.__ranks = {contig: rank for rank, contig in enumerate(self.__known)}
+        self.__unknown = []
+
+    @classmethod
+    def from_header(cls, header: pysam.VariantHeader, sort=False) -> 'ContigOrder':
+        """Builds the table from the :code:`##contig` lines of a VCF header, in the declared order by default."""
+        return cls(header.contigs, sort=sort)
+
+    @classmethod
+    def from_fasta(cls, fasta_ref: str, sort=False) -> 'ContigOrder':
+        """Builds the table from the index (:code:`.fai`) of a FASTA file, in the declared order by default."""
+        with pysam.FastaFile(fasta_ref) as fasta_file:
+            return cls(fasta_file.references, sort=sort)
+
+    def rank(self, contig: str) -> int:
+        """Returns the rank of the contig, adding it to the table if it is unknown."""
+        rank = self.__ranks.get(contig)
+        if rank is None:
+            self.add(contig)
+            rank = self.__ranks[contig]
+        return rank
+
+    def add(self, contig: str):
+        """Adds a contig to the table after the known ones."""
+        self.update([contig])
+
+    def update(self, contigs: Iterable[str]):
+        """Adds contigs to the table after the known ones."""
+        new_contigs = [contig for contig in dict.fromkeys(contigs) if contig not in self.__ranks]
+        if not new_contigs:
+            return
+        self.__unknown.extend(new_contigs)
+        self.__unknown.sort(key=_CONTIG_KEY)
+        for rank, contig in enumerate(self.__unknown, len(self.__known)):
+            self.__ranks[contig] = rank
+
+    def compare(self, contig_1: str, contig_2: str) -> int:
+        """Returns -1, 0 or 1 if the first contig goes before, is the same or goes after the second one."""
+        if contig_1 == contig_2:
+            return 0
+        ranks = self.__ranks
+        if contig_1 not in ranks or contig_2 not in ranks:
+            # Both contigs are added at once, as adding one may change the rank of the other
+            self.update([contig_1, contig_2])
+        rank_1 = ranks[contig_1]
+        rank_2 = ranks[contig_2]
+        return (rank_1 > rank_2) - (rank_1 < rank_2)
+
+    @property
+    def contigs(self) -> List[str]:
+        """List of the contigs in the table, in order."""
+        return self.__known + self.__unknown
+
+    def __contains__(self, contig) -> bool:
+        return contig in self.__ranks
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.contigs)
+
+    def __len__(self) -> int:
+        return len(self.__ranks)
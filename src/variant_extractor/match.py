@@ -0,0 +1,246 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from typing import NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .VariantExtractor import DATAFRAME_COLUMNS
+
+# Maximum distance (in bp) between the breakends of matched SVs
+MATCH_WINDOW = 500
+# Minimum ratio between the lengths of matched SVs
+MATCH_LENGTH_RATIO = 0.7
+# Sequence-resolved variants of at least this length are matched as SVs
+SV_MIN_LENGTH = 50
+# Columns of the summary returned by match()
+SUMMARY_COLUMNS = ['truth', 'test', 'tp', 'fp', 'fn', 'precision', 'recall', 'f1']
+# Label of the summary row with all the variant types
+ALL_TYPES = 'ALL'
+_SEQUENCE_REGEX = r'^[ACGTNacgtn*]+$'
+
+
+class MatchResult(NamedTuple):
+    """Result of matching the variants of a test set against a truth set
+    """
+    truth_match: np.ndarray
+    """For each row of the truth set, the row of its matching test variant, or :code:`-1`"""
+    test_match: np.ndarray
+    """For each row of the test set, the row of its matching truth variant, or :code:`-1`"""
+    summary: pd.DataFrame
+    """Number of truth and test variants, true positives, false positives, false negatives, precision, recall and F1
+    score per :code:`type_inferred`, plus a row with all the types"""
+
+
+def _shared_codes(truth_values: pd.Series, test_values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    # Integer codes of the values of a column in both sets, equal values have equal codes. Only the categories are
+    # compared, the columns of to_dataframe are already categorical
+    truth_values = truth_values.astype('category')
+    test_values = test_values.astype('category')
+    categories = truth_values.cat.categories
+    remap = categories.get_indexer(test_values.cat.categories)
+    unseen = remap < 0
+    remap[unseen] = len(categories) + np.arange(unseen.sum())
+    test_codes = test_values.cat.codes.to_numpy(dtype=np.int64)
+    return truth_values.cat.codes.to_numpy(dtype=np.int64), np.where(test_codes < 0, -1, remap[test_codes])
+
+
+def _position_bits(*positions: np.ndarray) -> int:
+    # Bits of the largest position, the codes packed with the positions are shifted by them
+    return max(int(max((p.max(initial=0) for p in positions), default=0)).bit_length(), 1)
+
+
+def _is_sv(df: pd.DataFrame, sv_min_length: int) -> np.ndarray:
+    # SVs are the variants without an explicit sequence (breakend or shorthand notation) and the long ones
+    alt = df['alt'].astype('category')
+    sequence = alt.cat.categories.astype(str).str.match(_SEQUENCE_REGEX)
+    sequence_resolved = np.asarray(sequence, dtype=bool)[alt.cat.codes.to_numpy()] & (alt.cat.codes.to_numpy() >= 0)
+    return ~sequence_resolved | (df['length'].to_numpy(dtype=np.int64) >= sv_min_length)
+
+
+def _one_to_one(truth_rows: np.ndarray, test_rows: np.ndarray, cost: np.ndarray, n_truth: int, n_test: int) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    # Greedy assignment of the candidate pairs by increasing cost (ties broken by rows). Pairs that are the best
+    # remaining candidate of both of their rows belong to the greedy assignment, so they are accepted at once
+    order = np.lexsort((test_rows, truth_rows, cost))
+    truth_rows, test_rows = truth_rows[order], test_rows[order]
+    matched_truth, matched_test = [], []
+    while len(truth_rows):
+        rank = np.arange(len(truth_rows))
+        best_truth = np.full(n_truth, len(truth_rows))
+        best_test = np.full(n_test, len(truth_rows))
+        # Candidates are sorted, so the best one of each row is the first one
+        np.minimum.at(best_truth, truth_rows, rank)
+        np.minimum.at(best_test, test_rows, rank)
+        mutual = (best_truth[truth_rows] == rank) & (best_test[test_rows] == rank)
+        matched_truth.append(truth_rows[mutual])
+        matched_test.append(test_rows[mutual])
+        used_truth = np.zeros(n_truth, dtype=bool)
+        used_truth[truth_rows[mutual]] = True
+        used_test = np.zeros(n_test, dtype=bool)
+        used_test[test_rows[mutual]] = True
+        remaining = ~used_truth[truth_rows] & ~used_test[test_rows]
+        truth_rows, test_rows = truth_rows[remaining], test_rows[remaining]
+    if not matched_truth:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(matched_truth), np.concatenate(matched_test)
+
+
+def _match_exact(truth: pd.DataFrame, test: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    # Sort-based join on contig, position and alleles. Both sets are sorted together, so each run of equal keys has its
+    # truth variants followed by its test variants, which are paired in order of appearance
+    chrom, ref, alt = (np.concatenate(_shared_codes(truth[column], test[column]))
+                       for column in ('start_chrom', 'ref', 'alt'))
+    start = np.concatenate((truth['start'].to_numpy(dtype=np.int64), test['start'].to_numpy(dtype=np.int64)))
+    # Contig and position, and REF and ALT, are packed in a key each, as sorting by fewer keys is faster
+    keys = [(chrom << _position_bits(start)) | start, ref * (alt.max(initial=0) + 1) + alt]
+    n_truth = len(truth)
+    side = np.concatenate((np.zeros(n_truth, dtype=np.int8), np.ones(len(test), dtype=np.int8)))
+    order = np.lexsort([side] + keys[::-1])
+    if not len(order):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    run_start = np.zeros(len(order), dtype=bool)
+    run_start[0] = True
+    for key in keys:
+        sorted_key = key[order]
+        run_start[1:] |= sorted_key[1:] != sorted_key[:-1]
+    run = np.cumsum(run_start) - 1
+    first = np.flatnonzero(run_start)
+    truth_count = np.bincount(run, weights=side[order] == 0).astype(np.int64)
+    test_count = np.diff(np.append(first, len(order))) - truth_count
+    # Position of each truth variant in its run, it is paired with the test variant at the same position
+    truth_sorted = np.flatnonzero(side[order] == 0)
+    occurrence = truth_sorted - first[run[truth_sorted]]
+    paired = occurrence < test_count[run[truth_sorted]]
+    truth_sorted = truth_sorted[paired]
+    test_sorted = first[run[truth_sorted]] + truth_count[run[truth_sorted]] + occurrence[paired]
+    return order[truth_sorted].astype(np.int64), order[test_sorted].astype(np.int64) - n_truth
+
+
+def _match_window(truth: pd.DataFrame, test: pd.DataFrame, window: int, length_ratio: float) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    # Sort and sweep: the variants of both sets are grouped by contigs, breakend orientation and type, and sorted by
+    # position within each group, so the candidates of a truth variant are a contiguous range of the test variants
+    group_columns = ('start_chrom', 'end_chrom', 'brackets', 'type_inferred')
+    truth_group = np.zeros(len(truth), dtype=np.int64)
+    test_group = np.zeros(len(test), dtype=np.int64)
+    for column in group_columns:
+        truth_codes, test_codes = _shared_codes(truth[column], test[column])
+        size = max(truth_codes.max(initial=-1), test_codes.max(initial=-1)) + 2
+        truth_group = truth_group * size + truth_codes + 1
+        test_group = test_group * size + test_codes + 1
+    # Compact codes, so that the position fits in the low bits
+    groups = np.unique(np.concatenate((truth_group, test_group)), return_inverse=True)[1].astype(np.int64)
+    truth_group, test_group = groups[:len(truth)], groups[len(truth):]
+    truth_start = truth['start'].to_numpy(dtype=np.int64)
+    test_start = test['start'].to_numpy(dtype=np.int64)
+    bits = _position_bits(truth_start + window, test_start)
+    max_pos = (1 << bits) - 1
+    test_key = (test_group << bits) | test_start
+    order = np.argsort(test_key, kind='stable')
+    test_key = test_key[order]
+    lower = (truth_group << bits) | np.clip(truth_start - window, 0, max_pos)
+    upper = (truth_group << bits) | np.clip(truth_start + window, 0, max_pos)
+    lo = np.searchsorted(test_key, lower, side='left')
+    counts = np.searchsorted(test_key, upper, side='right') - lo
+    # All the candidate pairs at once
+    truth_rows = np.repeat(np.arange(len(truth), dtype=np.int64), counts)
+    offsets = np.arange(counts.sum(), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+    test_rows = order[np.repeat(lo, counts) + offsets]
+    end_distance = np.abs(truth['end'].to_numpy(dtype=np.int64)[truth_rows] -
+                          test['end'].to_numpy(dtype=np.int64)[test_rows])
+    truth_length = truth['length'].to_numpy(dtype=np.int64)[truth_rows]
+    test_length = test['length'].to_numpy(dtype=np.int64)[test_rows]
+    shorter = np.minimum(truth_length, test_length)
+    # Variants without length (such as translocations) are not compared by length
+    valid = (end_distance <= window) & ((shorter == 0) | (shorter >= length_ratio * np.maximum(truth_length,
+                                                                                                test_length)))
+    truth_rows, test_rows = truth_rows[valid], test_rows[valid]
+    cost = np.abs(truth_start[truth_rows] - test_start[test_rows]) + end_distance[valid]
+    return _one_to_one(truth_rows, test_rows, cost, len(truth), len(test))
+
+
+def _type_counts(types: pd.Series, mask: np.ndarray = None) -> pd.Series:
+    types = types.astype('category')
+    codes = types.cat.codes.to_numpy()
+    if mask is not None:
+        codes = codes[mask]
+    counts = np.bincount(codes[codes >= 0], minlength=len(types.cat.categories))
+    return pd.Series(counts, index=types.cat.categories.astype(str))
+
+
+def _summary(truth_types: pd.Series, test_types: pd.Series, truth_match: np.ndarray, test_match: np.ndarray) \
+        -> pd.DataFrame:
+    counts = pd.DataFrame({
+        'truth': _type_counts(truth_types),
+        'test': _type_counts(test_types),
+        'tp': _type_counts(truth_types, truth_match >= 0),
+        'tp_test': _type_counts(test_types, test_match >= 0),
+    }).fillna(0).astype(np.int64)
+    # Categories may include types without variants
+    counts = counts[(counts['truth'] > 0) | (counts['test'] > 0)].sort_index()
+    counts.loc[ALL_TYPES] = counts.sum()
+    summary = pd.DataFrame(index=counts.index)
+    summary['truth'] = counts['truth']
+    summary['test'] = counts['test']
+    summary['tp'] = counts['tp']
+    summary['fp'] = counts['test'] - counts['tp_test']
+    summary['fn'] = counts['truth'] - counts['tp']
+    summary['precision'] = counts['tp_test'] / counts['test']
+    summary['recall'] = counts['tp'] / counts['truth']
+    summary['f1'] = 2 * summary['precision'] * summary['recall'] / (summary['precision'] + summary['recall'])
+    summary.index.name = 'type_inferred'
+    return summary[SUMMARY_COLUMNS]
+
+
+def match(truth_df: pd.DataFrame, test_df: pd.DataFrame, window: int = MATCH_WINDOW,
+          length_ratio: float = MATCH_LENGTH_RATIO, sv_min_length: int = SV_MIN_LENGTH) -> MatchResult:
+    """Matches the variants of a test set (for example, the calls of a variant caller) against a truth set, one to one.
+    Both sets are DataFrames with the columns of :meth:`VariantExtractor.to_dataframe`, so the variants are homogenized
+    the same way in both (for example, breakend pairs are notated from the same breakend).
+
+    SNVs and indels (sequence-resolved variants shorter than :code:`sv_min_length`) match a variant with the same contig,
+    position, REF and ALT. SVs match a variant with the same contigs, breakend orientation (:code:`brackets`) and
+    :code:`type_inferred`, with both breakends at most :code:`window` bp away and lengths within :code:`length_ratio` of
+    each other. When a variant has several candidates, the pairs are assigned greedily from the closest ones.
+
+    Every step is vectorized over the columns, and the SV candidates are found by sorting the test set and sweeping it
+    with the window of each truth variant.
+
+    Parameters
+    ----------
+    truth_df : pandas.DataFrame
+        Truth set.
+    test_df : pandas.DataFrame
+        Test set.
+    window : int, optional
+        Maximum distance (in bp) between each breakend of matched SVs.
+    length_ratio : float, optional
+        Minimum ratio between the shorter and the longer length of matched SVs. Variants without length, such as
+        translocations, are not compared by length.
+    sv_min_length : int, optional
+        Sequence-resolved variants of at least this length are matched as SVs.
+
+    Returns
+    -------
+    MatchResult
+        The matching row of each variant, by position in the DataFrames (regardless of their index), and the summary per
+        variant type.
+    """
+    for name, df in (('truth_df', truth_df), ('test_df', test_df)):
+        missing = [column for column in DATAFRAME_COLUMNS if column not in df.columns]
+        if missing:
+            raise ValueError(f'{name} is missing the columns {", ".join(missing)}')
+    truth_match = np.full(len(truth_df), -1, dtype=np.int64)
+    test_match = np.full(len(test_df), -1, dtype=np.int64)
+    truth_sv = _is_sv(truth_df, sv_min_length)
+    test_sv = _is_sv(test_df, sv_min_length)
+    for matcher, truth_rows, test_rows in ((_match_exact, np.flatnonzero(~truth_sv), np.flatnonzero(~test_sv)),
+                                           (lambda truth, test: _match_window(truth, test, window, length_ratio),
+                                            np.flatnonzero(truth_sv), np.flatnonzero(test_sv))):
+        truth_matched, test_matched = matcher(truth_df.iloc[truth_rows], test_df.iloc[test_rows])
+        truth_match[truth_rows[truth_matched]] = test_rows[test_matched]
+        test_match[test_rows[test_matched]] = truth_rows[truth_matched]
+    return MatchResult(truth_match, test_match,
+                       _summary(truth_df['type_inferred'], test_df['type_inferred'], truth_match, test_match))
@@ -0,0 +1,169 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import heapq
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser
+from typing import Iterable, Iterator, List, Optional
+
+import pysam
+
+from .VariantExtractor import VariantExtractor
+from .contigs import ContigOrder
+from .writer import VariantWriter, _output_format
+
+# Approximate size (in bytes) of the variants sorted in memory before moving them to a sorted run on disk
+NORMALIZE_MAX_MEMORY = 512 * 1024 * 1024
+# Maximum number of sorted runs merged at once, so that the number of open files is bounded
+MAX_MERGE_RUNS = 64
+# Memory used by each buffered variant besides its text (tuple, rank and position)
+_ENTRY_OVERHEAD = 120
+
+
+def _line_key(contig_order: ContigOrder):
+    def key(line: str):
+        contig, pos, _ = line.split('\t', 2)
+        return contig_order.rank(contig), int(pos)
+    return key
+
+
+def _write_run(lines: List[str], tmp_dir: str, runs: List[str]):
+    run_file = os.path.join(tmp_dir, f'run_{len(runs)}.vcf')
+    with open(run_file, 'w') as run:
+        run.writelines(lines)
+    runs.append(run_file)
+
+
+def _read_run(run_file: str) -> Iterator[str]:
+    with open(run_file, 'r') as run:
+        yield from run
+
+
+def _merge_runs(runs: List[str], contig_order: ContigOrder, tmp_dir: str) -> Iterator[str]:
+    # Merges the runs in batches until they can be merged at once
+    key = _line_key(contig_order)
+    while len(runs) > MAX_MERGE_RUNS:
+        merged_runs = []
+        for i in range(0, len(runs), MAX_MERGE_RUNS):
+            batch = runs[i:i + MAX_MERGE_RUNS]
+            run_file = os.path.join(tmp_dir, f'merge_{len(runs)}_{i}.vcf')
+            with open(run_file, 'w') as run:
+                run.writelines(heapq.merge(*map(_read_run, batch), key=key))
+            for batch_run in batch:
+                os.remove(batch_run)
+            merged_runs.append(run_file)
+        runs = merged_runs
+    return heapq.merge(*map(_read_run, runs), key=key)
+
+
+def _sort_buffer(buffer: list, contig_order: ContigOrder):
+    # The ranks of the unknown contigs change when new ones are added, but not their relative order, so all of them are
+    # added before computing the keys
+    contig_order.update({entry[0] for entry in buffer})
+    buffer.sort(key=lambda entry: (contig_order.rank(entry[0]), entry[1]))
+
+
+def _sorted_lines(extractor: VariantExtractor, max_memory: int, tmp_dir: str) -> Iterator[str]:
+    contig_order = extractor.contig_order
+    runs = []
+    buffer = []
+    buffered = 0
+    for variant_record in extractor:
+        line = str(variant_record) + '\n'
+        buffer.append((variant_record.contig, variant_record.pos, line))
+        buffered += len(line) + _ENTRY_OVERHEAD
+        if buffered >= max_memory:
+            _sort_buffer(buffer, contig_order)
+            _write_run([entry[2] for entry in buffer], tmp_dir, runs)
+            buffer = []
+            buffered = 0
+    _sort_buffer(buffer, contig_order)
+    lines = (entry[2] for entry in buffer)
+    if not runs:
+        return lines
+    _write_run(list(lines), tmp_dir, runs)
+    return _merge_runs(runs, contig_order, tmp_dir)
+
+
+def normalize(vcf_file: str, output_vcf_file: str, max_memory=NORMALIZE_MAX_MEMORY, tmp_dir: Optional[str] = None,
+              index=True, cmdline: Optional[str] = None, **kwargs) -> int:
+    """Writes the variants of a VCF file following the homogenization rules, sorted by contig and position.
+
+    The variants are sorted in memory up to :code:`max_memory` bytes. Larger files are sorted in runs written to
+    temporary files, which are then merged, so that the memory needed does not depend on the size of the file. The
+    contigs are sorted as in :attr:`VariantExtractor.contig_order` (by default, the contigs of the VCF header in natural
+    order), and the variants with the same position keep the extraction order.
+
+    Parameters
+    ----------
+    vcf_file : str
+        Input VCF file.
+    output_vcf_file : str
+        Output VCF file. If it is a bgzipped VCF file (:code:`.vcf.gz`), it is also indexed. BCF output is not
+        supported.
+    max_memory : int, optional
+        Approximate size in bytes of the variants sorted in memory at once.
+    tmp_dir : str, optional
+        Directory of the temporary files of the sorted runs. By default, the system temporary directory.
+    index : bool, optional
+        If :code:`True`, a tabix index (:code:`.tbi`) is built for bgzipped VCF output.
+    cmdline : str, optional
+        Command line added to the output header as a :code:`##cmdline` line.
+    **kwargs
+        Parameters of :class:`VariantExtractor`.
+
+    Returns
+    -------
+    int
+        Number of variants written.
+    """
+    output_format = _output_format(output_vcf_file)
+    if output_format == 'bcf':
+        raise ValueError('BCF output is not supported, use a VCF or bgzipped VCF file')
+    extractor = VariantExtractor(vcf_file, **kwargs)
+    header = extractor.header.copy()
+    if cmdline is not None:
+        header.add_meta('cmdline', cmdline)
+    total = 0
+    try:
+        with tempfile.TemporaryDirectory(dir=tmp_dir) as run_dir:
+            with VariantWriter(output_vcf_file, header, output_format) as writer:
+                for line in _sorted_lines(extractor, max_memory, run_dir):
+                    writer._write_line(line)
+                    total += 1
+    finally:
+        extractor.close()
+    if index and output_format == 'vcf.gz':
+        pysam.tabix_index(output_vcf_file, preset='vcf', force=True)
+    return total
+
+
+def _add_arguments(parser: ArgumentParser):
+    # Shared with the normalize subcommand of variant-extractor
+    parser.add_argument('vcf_file', help='VCF file')
+    parser.add_argument('output_vcf_file', help='Output VCF file, bgzipped and indexed if it ends with .vcf.gz')
+    parser.add_argument('-f', '--fasta-ref', help='FASTA reference to fill the bases of SVs')
+    parser.add_argument('-m', '--max-memory', type=int, default=NORMALIZE_MAX_MEMORY // (1024 * 1024),
+                        help='Approximate memory (in MiB) used to sort the variants')
+    parser.add_argument('-t', '--tmp-dir', help='Directory of the temporary files')
+    parser.add_argument('--no-index', action='store_true', help='Do not index the bgzipped VCF output')
+    parser.add_argument('--allow-unpaired', action='store_true', help='Do not fail on unpaired SV breakends')
+
+
+def _run(args, cmdline: str):
+    total = normalize(args.vcf_file, args.output_vcf_file, max_memory=args.max_memory * 1024 * 1024,
+                      tmp_dir=args.tmp_dir, index=not args.no_index, cmdline=cmdline, fasta_ref=args.fasta_ref,
+                      ensure_pairs=not args.allow_unpaired)
+    print(f'Written {total} variants to {args.output_vcf_file}', file=sys.stderr)
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    """Entry point of the :code:`variant-extractor-normalize` command."""
+    argv = list(argv) if argv is not None else sys.argv[1:]
+    parser = ArgumentParser(prog='variant-extractor-normalize',
+                            description='Generate a normalized and sorted VCF file from a VCF file')
+    _add_arguments(parser)
+    args = parser.parse_args(argv)
+    _run(args, ' '.join(['variant-extractor-normalize'] + argv))
@@ -0,0 +1,170 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from typing import Any, Dict, List, Optional
+
+import pysam
+
+from ._decoder import HeaderMetadata, UNDEFINED_FIELD, header_metadata, decode_format, decode_sample, \
+    decode_sample_values
+
+
+class AlleleRecord:
+    """View of a multiallelic pysam.VariantRecord with a single ALT allele, so that each allele can be parsed
+    without copying (and overriding) the record.
+    """
+    __slots__ = ('rec', 'alts', 'id')
+
+    def __init__(self, rec: pysam.VariantRecord, alt: str, id: Optional[str]):
+        self.rec = rec
+        self.alts = (alt,)
+        self.id = id
+
+    def __getattr__(self, name):
+        return getattr(self.rec, name)
+
+    def __str__(self):
+        return str(self.rec)
+
+
+def _split_values(key, value, number, n_alts):
+    # Values of the FORMAT field for each ALT allele
+    if not hasattr(value, '__iter__') or len(value) == number:
+        return (value,) * n_alts
+    if key == 'GT':
+        return ((0, value[1]),) * n_alts
+    if len(value) == n_alts + 1:
+        # Number=R, REF and ALT values
+        ref_value = value[0]
+        return tuple((ref_value, alt_value) for alt_value in value[1:])
+    if len(value) % n_alts == 0:
+        return tuple(value[index::n_alts] for index in range(n_alts))
+    return (value,) * n_alts
+
+
+class _AlleleSamples:
+    # Samples of a single ALT allele, source of a SamplesView
+    __slots__ = ('split_samples', 'index', 'format')
+
+    def __init__(self, split_samples: 'SplitSamples', index: int):
+        self.split_samples = split_samples
+        self.index = index
+        self.format = split_samples.format
+
+    def sample(self, sample_index: int) -> Dict[str, Any]:
+        return self.split_samples.sample(sample_index)[self.index]
+
+    def values(self, key: str) -> List[Any]:
+        return [values[self.index] for values in self.split_samples.values(key)]
+
+
+class SplitSamples:
+    """Samples of a multiallelic record. Each sample (or FORMAT field of all samples) is decoded and split for all ALT
+    alleles in a single pass the first time it is accessed.
+    """
+    __slots__ = ('__rec', '__splitter', '__samples', '__values', 'format', 'metadata')
+
+    def __init__(self, rec: pysam.VariantRecord, splitter: 'AlleleSplitter', format_keys=None):
+        self.__rec = rec
+        self.__splitter = splitter
+        self.__samples = dict()
+        self.__values = dict()
+        self.format = [key for key in rec.format if format_keys is None or key in format_keys]
+        self.metadata = header_metadata(rec.header)
+
+    def sample(self, sample_index: int) -> List[Dict[str, Any]]:
+        """Returns the FORMAT fields of a sample for each ALT allele."""
+        alleles = self.__samples.get(sample_index)
+        if alleles is None:
+            rec = self.__rec
+            n_alts = len(rec.alts)
+            alleles = [dict() for _ in range(n_alts)]
+            sample = rec.samples[sample_index]
+            for key in self.format:
+                split_values = _split_values(key, sample[key], self.__splitter.number(rec.header, key), n_alts)
+                for allele_dict, allele_value in zip(alleles, split_values):
+                    allele_dict[key] = allele_value
+            self.__samples[sample_index] = alleles
+        return alleles
+
+    def values(self, key: str) -> List[tuple]:
+        """Returns the values of a FORMAT field of every sample for each ALT allele."""
+        values = self.__values.get(key)
+        if values is None:
+            rec = self.__rec
+            n_alts = len(rec.alts)
+            number = self.__splitter.number(rec.header, key)
+            values = [_split_values(key, sample[key], number, n_alts) for sample in rec.samples.values()]
+            self.__values[key] = values
+        return values
+
+    def allele(self, index: int) -> _AlleleSamples:
+        return _AlleleSamples(self, index)
+
+    def allele_samples(self, index: int) -> Dict[str, Dict[str, Any]]:
+        """Returns the samples of an ALT allele, decoding all of them."""
+        return {sample_name: self.sample(i)[index] for i, sample_name in enumerate(self.metadata.samples)}
+
+
+class TextSplitSamples:
+    """Samples of a multiallelic record kept as text, as :class:`SplitSamples` for the alleles of records that are not
+    backed by a pysam.VariantRecord (such as the ones loaded from an extraction cache).
+    """
+    __slots__ = ('__sample_texts', '__n_alts', '__samples', '__values', 'format', 'metadata')
+
+    def __init__(self, format_text: str, sample_texts: List[str], n_alts: int, metadata: HeaderMetadata):
+        self.__sample_texts = sample_texts
+        self.__n_alts = n_alts
+        self.__samples = dict()
+        self.__values = dict()
+        self.format = decode_format(format_text)
+        self.metadata = metadata
+
+    def __number(self, key: str):
+        return self.metadata.formats.get(key, UNDEFINED_FIELD)[1]
+
+    def sample(self, sample_index: int) -> List[Dict[str, Any]]:
+        """Returns the FORMAT fields of a sample for each ALT allele."""
+        alleles = self.__samples.get(sample_index)
+        if alleles is None:
+            n_alts = self.__n_alts
+            alleles = [dict() for _ in range(n_alts)]
+            sample_texts = self.__sample_texts
+            sample_text = sample_texts[sample_index] if sample_index < len(sample_texts) else None
+            sample = decode_sample(self.format, sample_text, self.metadata)
+            for key in self.format:
+                for allele_dict, allele_value in zip(alleles, _split_values(key, sample[key], self.__number(key),
+                                                                            n_alts)):
+                    allele_dict[key] = allele_value
+            self.__samples[sample_index] = alleles
+        return alleles
+
+    def values(self, key: str) -> List[tuple]:
+        """Returns the values of a FORMAT field of every sample for each ALT allele."""
+        values = self.__values.get(key)
+        if values is None:
+            number = self.__number(key)
+            values = [_split_values(key, value, number, self.__n_alts)
+                      for value in decode_sample_values(key, self.format, self.__sample_texts, self.metadata)]
+            self.__values[key] = values
+        return values
+
+    def allele(self, index: int) -> _AlleleSamples:
+        return _AlleleSamples(self, index)
+
+
+class AlleleSplitter:
+    """Splits multiallelic records per ALT allele. The Number of each FORMAT field is looked up in the header once."""
+
+    def __init__(self):
+        self.__numbers = {}
+
+    def number(self, header: pysam.VariantHeader, key: str):
+        number = self.__numbers.get(key)
+        if number is None:
+            number = header.formats[key].number
+            self.__numbers[key] = number
+        return number
+
+    def split(self, rec: pysam.VariantRecord, format_keys=None) -> SplitSamples:
+        return SplitSamples(rec, self, format_keys)
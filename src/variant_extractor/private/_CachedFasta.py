@@ -0,0 +1,90 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Tuple
+
+import pysam
+
+# Size (in bp) of the reference blocks kept in memory
+FASTA_BLOCK_SIZE = 4096
+# Maximum number of reference blocks kept in memory
+FASTA_CACHE_BLOCKS = 1024
+
+
+class FastaCacheInfo(NamedTuple):
+    """Statistics of the reference cache
+    """
+    hits: int
+    """Number of block lookups served from the cache"""
+    misses: int
+    """Number of block lookups read from the FASTA file"""
+    blocks: int
+    """Number of blocks currently cached"""
+    max_blocks: int
+    """Maximum number of blocks cached"""
+
+
+class CachedFasta:
+    """Wrapper of pysam.FastaFile that keeps the most recently used blocks of the reference in memory, so that
+    the single bases fetched for SVs do not need an htslib seek and decompression each.
+    """
+
+    def __init__(self, fasta_ref: str, block_size=FASTA_BLOCK_SIZE, max_blocks=FASTA_CACHE_BLOCKS):
+        self.__fasta = pysam.FastaFile(fasta_ref)
+        self.__block_size = block_size
+        self.__max_blocks = max_blocks
+        self.__blocks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __load(self, key):
+        contig, index = key
+        block = self.__fasta.fetch(contig, index * self.__block_size, (index + 1) * self.__block_size)
+        self.__blocks[key] = block
+        if len(self.__blocks) > self.__max_blocks:
+            self.__blocks.popitem(last=False)
+        return block
+
+    def __block(self, contig, index):
+        key = (contig, index)
+        block = self.__blocks.get(key)
+        if block is None:
+            self.misses += 1
+            return self.__load(key)
+        self.hits += 1
+        self.__blocks.move_to_end(key)
+        return block
+
+    def fetch(self, contig: str, start: int, end: int) -> str:
+        """Same as pysam.FastaFile.fetch, with 0-based half-open coordinates."""
+        block_size = self.__block_size
+        if start < 0 or end <= start or end - start > block_size:
+            # Invalid ranges and long sequences are not cached
+            return self.__fasta.fetch(contig, start, end)
+        first = start // block_size
+        last = (end - 1) // block_size
+        sequence = self.__block(contig, first)
+        if last != first:
+            sequence += self.__block(contig, last)
+        offset = first * block_size
+        return sequence[start - offset:end - offset]
+
+    def prefetch(self, loci: Iterable[Tuple[str, int]]):
+        """Loads the blocks of the given (contig, 0-based position) loci, reading each contig in sorted order.
+        Loci in contigs not present in the reference are ignored.
+        """
+        block_size = self.__block_size
+        keys = sorted({(contig, pos // block_size) for contig, pos in loci if pos >= 0 and contig in self.__fasta})
+        for key in keys[:self.__max_blocks]:
+            if key in self.__blocks:
+                self.__blocks.move_to_end(key)
+            else:
+                self.__load(key)
+
+    def cache_info(self) -> FastaCacheInfo:
+        return FastaCacheInfo(self.hits, self.misses, len(self.__blocks), self.__max_blocks)
+
+    def close(self):
+        self.__blocks.clear()
+        self.__fasta.close()
@@ -0,0 +1,166 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from array import array
+
+from ..variants import VariantRecord, VariantType
+
+NUMERIC_COLUMNS = ['start', 'end', 'length']
+CATEGORICAL_COLUMNS = ['start_chrom', 'end_chrom', 'ref', 'alt', 'brackets', 'type_inferred']
+# Categorical columns whose values are not known beforehand, so their categories grow with the variants
+UNBOUNDED_CATEGORICAL_COLUMNS = ['ref', 'alt']
+# All the values _breakends may return for valid breakend notations
+BRACKETS_VALUES = ['', 'N[', ']N', 'N]', '[N', 'N[[', 'N]]', '[[N', ']]N']
+
+
+def _breakends(variant_record: VariantRecord) -> str:
+    variant_type = variant_record.variant_type
+    if variant_type == VariantType.DEL:
+        return 'N['
+    elif variant_type == VariantType.DUP:
+        return ']N'
+    elif variant_type == VariantType.INV:
+        assert variant_record.alt_sv_breakend is not None
+        prefix = 'N' if variant_record.alt_sv_breakend.prefix else ''
+        suffix = 'N' if variant_record.alt_sv_breakend.suffix else ''
+        return prefix + variant_record.alt_sv_breakend.bracket + suffix
+    elif variant_type == VariantType.TRA:
+        assert variant_record.alt_sv_breakend is not None
+        prefix = 'N' if variant_record.alt_sv_breakend.prefix else ''
+        suffix = 'N' if variant_record.alt_sv_breakend.suffix else ''
+        return prefix + variant_record.alt_sv_breakend.bracket + variant_record.alt_sv_breakend.bracket + suffix
+    return ''
+
+
+def row_values(variant_record: VariantRecord) -> tuple:
+    """Values of the DataFrame columns of a variant, in the order of :code:`DATAFRAME_COLUMNS`."""
+    start_chrom = variant_record.contig.replace('chr', '')
+    end = variant_record.end
+    if variant_record.alt_sv_breakend:
+        end_chrom = variant_record.alt_sv_breakend.contig.replace('chr', '')
+        if start_chrom != end_chrom:
+            end = variant_record.alt_sv_breakend.pos
+    else:
+        end_chrom = start_chrom
+    return start_chrom, variant_record.pos, end_chrom, end, variant_record.ref, variant_record.alt, \
+        variant_record.length, _breakends(variant_record), variant_record.variant_type.name
+
+
+class ColumnBuilder:
+    """Accumulates the DataFrame columns of the extracted variants. Numeric columns are stored in typed arrays and
+    categorical columns as integer codes plus a dictionary of categories, so no Python object is kept per variant.
+    """
+
+    def __init__(self, extra_fields=[], info_fields=[]):
+        self.extra_fields = list(extra_fields)
+        self.info_fields = list(info_fields)
+        self.categories = {column: {} for column in CATEGORICAL_COLUMNS}
+        self.clear()
+
+    def clear(self, reset_categories=()):
+        """Removes the accumulated variants, keeping the categories (and their codes) seen so far, except the ones of the
+        columns in :code:`reset_categories`."""
+        for column in reset_categories:
+            self.categories[column] = {}
+        # New buffers are created, as the previous ones may still be referenced by a DataFrame
+        self.numeric = {column: array('Q') for column in NUMERIC_COLUMNS}
+        self.codes = {column: array('i') for column in CATEGORICAL_COLUMNS}
+        self.extra = {field: [] for field in self.extra_fields}
+        self.info = {key: [] for key in self.info_fields}
+
+    def seed(self, column, values):
+        """Registers the categories of a column beforehand, so that they have the same codes in every DataFrame."""
+        categories = self.categories[column]
+        for value in values:
+            if value not in categories:
+                categories[value] = len(categories)
+
+    def __len__(self):
+        return len(self.numeric['start'])
+
+    def extend(self, other: 'ColumnBuilder'):
+        """Appends the variants of another builder, remapping the codes of its categories to the codes of this one."""
+        for column in NUMERIC_COLUMNS:
+            self.numeric[column].extend(other.numeric[column])
+        for column in CATEGORICAL_COLUMNS:
+            categories = self.categories[column]
+            remap = [categories.setdefault(value, len(categories)) for value in other.categories[column]]
+            self.codes[column].extend(array('i', map(remap.__getitem__, other.codes[column])))
+        for field in self.extra_fields:
+            self.extra[field].extend(other.extra[field])
+        for key in self.info_fields:
+            self.info[key].extend(other.info[key])
+
+    def __append_category(self, column, value):
+        categories = self.categories[column]
+        code = categories.get(value)
+        if code is None:
+            code = len(categories)
+            categories[value] = code
+        self.codes[column].append(code)
+
+    def append(self, variant_record: VariantRecord):
+        start_chrom, start, end_chrom, end, ref, alt, length, brackets, type_inferred = row_values(variant_record)
+        self.numeric['start'].append(start)
+        self.numeric['end'].append(end)
+        self.numeric['length'].append(length)
+        self.__append_category('start_chrom', start_chrom)
+        self.__append_category('end_chrom', end_chrom)
+        self.__append_category('ref', ref)
+        self.__append_category('alt', alt)
+        self.__append_category('brackets', brackets)
+        self.__append_category('type_inferred', type_inferred)
+        for field in self.extra_fields:
+            if field == 'variant_record_obj':
+                self.extra[field].append(variant_record)
+            else:
+                self.extra[field].append(getattr(variant_record, field, None))
+        for key in self.info_fields:
+            # Only the requested INFO fields are decoded
+            self.info[key].append(variant_record._info_value(key))
+
+    def to_dataframe(self, columns, downcast=True, sort_categories=True):
+        import numpy as np
+        import pandas as pd
+        data = {}
+        for column in NUMERIC_COLUMNS:
+            values = pd.Series(np.frombuffer(self.numeric[column], dtype=np.uint64) if len(self) else
+                               np.empty(0, dtype=np.uint64), copy=False)
+            data[column] = _downcast(values) if downcast else values
+        for column in CATEGORICAL_COLUMNS:
+            categories = list(self.categories[column])
+            if not sort_categories:
+                # Categories in order of appearance, so that codes are stable across DataFrames
+                codes = np.frombuffer(self.codes[column], dtype=np.int32) if len(self) else np.empty(0, dtype=np.int32)
+                data[column] = pd.Categorical.from_codes(codes, categories=categories)
+                continue
+            # Categories are sorted, as pandas does when converting a column to category
+            order = sorted(range(len(categories)), key=categories.__getitem__)
+            remap = np.empty(len(categories), dtype=np.int32)
+            remap[order] = np.arange(len(categories), dtype=np.int32)
+            codes = remap[np.frombuffer(self.codes[column], dtype=np.int32)] if len(self) else \
+                np.empty(0, dtype=np.int32)
+            data[column] = pd.Categorical.from_codes(codes, categories=[categories[i] for i in order])
+        df = pd.DataFrame({column: data[column] for column in columns})
+        for field in self.extra_fields:
+            df[field] = pd.Series(self.extra[field], dtype=None if len(self) else object)
+        for key in self.info_fields:
+            df[info_column(key)] = pd.Series(self.info[key], dtype=None if len(self) else object)
+        return df
+
+
+def info_column(key):
+    return f'info_{key}'
+
+
+def _downcast(series):
+    series_max = series.max()
+    if series_max < 2 ** 8:
+        series = series.astype('uint8')
+    elif series_max < 2 ** 16:
+        series = series.astype('uint16')
+    elif series_max < 2 ** 32:
+        series = series.astype('uint32')
+    else:
+        series = series.astype('uint64')
+    return series
@@ -0,0 +1,75 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import numpy as np
+
+# Subtrees up to this height are scanned linearly instead of walked
+_SCAN_HEIGHT = 3
+
+
+class IntervalIndex:
+    """Implicit augmented interval tree over half-open intervals :code:`[start, end)` sorted by start, as in cgranges.
+    The node of each interval is its position in the sorted arrays, and each node stores the maximum end of its subtree,
+    so an overlap query visits O(log n + k) nodes without any pointer.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, ids: np.ndarray):
+        order = np.argsort(starts, kind='stable')
+        self.__starts = starts[order]
+        self.__ends = ends[order]
+        self.__ids = ids[order]
+        self.__max_ends, self.__height = self.__build(self.__starts, self.__ends)
+
+    def __len__(self):
+        return len(self.__starts)
+
+    @staticmethod
+    def __build(starts, ends):
+        n = len(starts)
+        max_ends = ends.copy()
+        if n == 0:
+            return max_ends, -1
+        # Leaves are the even positions, the last one closes the incomplete subtrees on the right
+        last_i = (n - 1) & ~1
+        last = max_ends[last_i]
+        k = 1
+        while (1 << k) <= n:
+            x = 1 << (k - 1)
+            # All the nodes of a level only depend on the level below, so each level is computed at once
+            nodes = np.arange((x << 1) - 1, n, x << 2)
+            right = nodes + x
+            right_max = np.where(right < n, max_ends[np.minimum(right, n - 1)], last)
+            max_ends[nodes] = np.maximum(np.maximum(ends[nodes], max_ends[nodes - x]), right_max)
+            last_i = last_i - x if (last_i >> k) & 1 else last_i + x
+            if last_i < n and max_ends[last_i] > last:
+                last = max_ends[last_i]
+            k += 1
+        return max_ends, k - 1
+
+    def overlap(self, start: int, end: int) -> np.ndarray:
+        """Returns the ids of the intervals overlapping :code:`[start, end)`, sorted by start."""
+        starts, ends, max_ends = self.__starts, self.__ends, self.__max_ends
+        n = len(starts)
+        found = []
+        stack = [((1 << self.__height) - 1, self.__height, False)] if n else []
+        while stack:
+            x, h, visited = stack.pop()
+            if h <= _SCAN_HEIGHT:
+                i0 = x >> h << h
+                i1 = min(i0 + (1 << (h + 1)) - 1, n)
+                mask = (starts[i0:i1] < end) & (ends[i0:i1] > start)
+                found.append(np.flatnonzero(mask) + i0)
+            elif not visited:
+                # The left subtree is skipped if all its intervals end before the query
+                stack.append((x, h, True))
+                left = x - (1 << (h - 1))
+                if left >= n or max_ends[left] > start:
+                    stack.append((left, h - 1, False))
+            elif x < n and starts[x] < end:
+                if ends[x] > start:
+                    found.append(np.array([x]))
+                stack.append((x + (1 << (h - 1)), h - 1, False))
+        if not found:
+            return np.empty(0, dtype=self.__ids.dtype)
+        # The walk visits the nodes in order, so the positions are already sorted by start
+        return self.__ids[np.concatenate(found)]
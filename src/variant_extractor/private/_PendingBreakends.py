@@ -1,30 +1,160 @@
 # Copyright 2022 - Barcelona Supercomputing Center
 # Author: Rodrigo Martin
 # MIT License
+import heapq
+import io
+import os
+import pickle
+import sqlite3
+import tempfile
+import weakref
+from typing import List
 
 from ..variants import VariantRecord
+from ._decoder import HeaderMetadata
+
 
 def _get_mate_id(variant_record: VariantRecord):
     if variant_record.alt_sv_breakend is None:
         raise ValueError('Variant record is not described in breakend notation')
-    # Check if it has MATEID or PARID
-    mate_id = variant_record.info.get('MATEID',
-                                      variant_record.info.get('PARID',
-                                                              f'{variant_record.alt_sv_breakend.contig}{variant_record.alt_sv_breakend.pos}'))
+    # Check if it has MATEID or PARID, reading only those INFO fields
+    mate_id = variant_record._info_value('MATEID')
+    if mate_id is None:
+        mate_id = variant_record._info_value('PARID',
+                                             f'{variant_record.alt_sv_breakend.contig}{variant_record.alt_sv_breakend.pos}')
     mate_id = mate_id[0] if type(mate_id) != str else mate_id
     return mate_id
 
 
+def _has_mate_id(variant_record: VariantRecord):
+    return variant_record._info_value('MATEID') is not None or variant_record._info_value('PARID') is not None
+
+
 def _get_id(variant_record: VariantRecord):
-    if 'MATEID' in variant_record.info or 'PARID' in variant_record.info:
+    if _has_mate_id(variant_record):
         return variant_record.id
     else:
         return f'{variant_record.contig}{variant_record.pos}'
 
 
-class PendingBreakends:
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class _SpillStore:
+    """Temporary sqlite database with the breakends moved out of memory. Records are stored detached and pickled,
+    the header metadata they share is kept in memory and referenced from the pickles.
+    """
+
     def __init__(self):
+        fd, self.__path = tempfile.mkstemp(prefix='variant_extractor_', suffix='.sqlite')
+        os.close(fd)
+        weakref.finalize(self, _remove_file, self.__path)
+        self.__connection = sqlite3.connect(self.__path)
+        self.__connection.execute('PRAGMA journal_mode = OFF')
+        self.__connection.execute('PRAGMA synchronous = OFF')
+        self.__connection.execute('CREATE TABLE pending (group_seq INTEGER, mate_key TEXT, key TEXT, data BLOB)')
+        self.__connection.execute('CREATE INDEX pending_keys ON pending (mate_key, key)')
+        self.__metadata = {}
+
+    def __dumps(self, variant_record: VariantRecord):
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+
+        def persistent_id(obj):
+            if isinstance(obj, HeaderMetadata):
+                self.__metadata[id(obj)] = obj
+                return id(obj)
+            return None
+        pickler.persistent_id = persistent_id
+        pickler.dump(variant_record)
+        return buffer.getvalue()
+
+    def __loads(self, data) -> VariantRecord:
+        unpickler = pickle.Unpickler(io.BytesIO(data))
+        unpickler.persistent_load = self.__metadata.__getitem__
+        return unpickler.load()
+
+    def insert(self, rows):
+        # rows: (group_seq, mate_key, key, variant_record)
+        self.__connection.executemany('INSERT INTO pending VALUES (?, ?, ?, ?)',
+                                      [(group_seq, mate_key, key, self.__dumps(variant_record))
+                                       for group_seq, mate_key, key, variant_record in rows])
+
+    def take(self, mate_key, key):
+        row = self.__connection.execute('SELECT rowid, data FROM pending WHERE mate_key IS ? AND key IS ? LIMIT 1',
+                                        (mate_key, key)).fetchone()
+        if row is None:
+            return None
+        self.__connection.execute('DELETE FROM pending WHERE rowid = ?', (row[0],))
+        return self.__loads(row[1])
+
+    def take_group(self, mate_key):
+        rows = self.__connection.execute('SELECT data FROM pending WHERE mate_key IS ? ORDER BY rowid',
+                                         (mate_key,)).fetchall()
+        self.__connection.execute('DELETE FROM pending WHERE mate_key IS ?', (mate_key,))
+        return [self.__loads(data) for data, in rows]
+
+    def records(self):
+        for group_seq, data in self.__connection.execute('SELECT group_seq, data FROM pending ORDER BY group_seq, rowid'):
+            yield group_seq, self.__loads(data)
+
+    def close(self):
+        self.__connection.close()
+        _remove_file(self.__path)
+
+
+class PendingBreakends:
+    """Breakends waiting for their mate, grouped by the id of the mate they wait for. If max_records is set, the
+    groups that do not fit in memory are moved to a temporary database. If sorted_input is set, the groups whose mate
+    locus (plus mate_slack) has already been passed are moved out of memory too (see advance), and those of breakends
+    without MATEID or PARID, which can no longer be paired, can be returned as unpaired (see expire).
+    """
+
+    def __init__(self, max_records=None, sorted_input=False, mate_slack=0):
         self.__pending_breakends = {}
+        # Creation order of each group, kept so that values() returns them in the same order wherever they are stored
+        self.__group_seqs = {}
+        self.__next_seq = 0
+        self.__length = 0
+        self.__max_records = max_records
+        self.__sorted_input = sorted_input
+        self.__mate_slack = mate_slack
+        self.__store = None
+        # Groups in the store: alt id -> (group seq, number of records)
+        self.__spilled = {}
+        # Per mate contig heap of (mate pos + slack, group seq, alt id) for sorted inputs
+        self.__mate_heaps = {}
+        self.__contig = None
+        self.__pos = 0
+        self.__passed_contigs = set()
+
+    def __spill(self, alt_breakend_ids):
+        if not alt_breakend_ids:
+            return
+        if self.__store is None:
+            self.__store = _SpillStore()
+        rows = []
+        for alt_breakend_id in alt_breakend_ids:
+            group_seq = self.__group_seqs.pop(alt_breakend_id)
+            records = self.__pending_breakends.pop(alt_breakend_id)
+            for breakend_id, variant_record in records.items():
+                rows.append((group_seq, alt_breakend_id, breakend_id, variant_record))
+            self.__spilled[alt_breakend_id] = (group_seq, len(records))
+            self.__length -= len(records)
+        self.__store.insert(rows)
+
+    def __spill_oldest(self):
+        target = self.__max_records // 2
+        alt_breakend_ids = []
+        spilled_length = self.__length
+        for alt_breakend_id, records in self.__pending_breakends.items():
+            if spilled_length <= target:
+                break
+            alt_breakend_ids.append(alt_breakend_id)
+            spilled_length -= len(records)
+        self.__spill(alt_breakend_ids)
 
     def push(self, variant_record: VariantRecord):
         alt_breakend_id = _get_mate_id(variant_record)
@@ -32,25 +162,127 @@ class PendingBreakends:
         # Check if alt is already in the dictionary
         previous_records = self.__pending_breakends.get(alt_breakend_id)
         if previous_records is None:
+            spilled_group = self.__spilled.get(alt_breakend_id)
+            if spilled_group is not None:
+                # The group is already in the store, add the new entry there
+                group_seq, count = spilled_group
+                self.__store.insert([(group_seq, alt_breakend_id, breakend_id, variant_record)])
+                self.__spilled[alt_breakend_id] = (group_seq, count + 1)
+                return
             # Create new entry for alt
             new_records = {breakend_id: variant_record}
             self.__pending_breakends[alt_breakend_id] = new_records
+            self.__group_seqs[alt_breakend_id] = self.__next_seq
+            self.__length += 1
+            if self.__sorted_input:
+                self.__track_mate(alt_breakend_id, self.__next_seq, variant_record)
+            self.__next_seq += 1
         else:
             # Already exists alt entry, add new entry to alt
+            if breakend_id not in previous_records:
+                self.__length += 1
             previous_records[breakend_id] = variant_record
+        if self.__max_records is not None and self.__length > self.__max_records:
+            self.__spill_oldest()
+
+    def __track_mate(self, alt_breakend_id, group_seq, variant_record: VariantRecord):
+        mate_contig = variant_record.alt_sv_breakend.contig
+        if mate_contig in self.__passed_contigs:
+            # The mate should have already been found, the group is passed in the next position
+            mate_contig, mate_pos = self.__contig, -1
+        else:
+            mate_pos = variant_record.alt_sv_breakend.pos + self.__mate_slack
+        # Breakends with MATEID or PARID never expire, since an imprecise mate may be anywhere within its confidence
+        # interval, no matter the position in the ALT field. Only the breakends paired by position expire
+        heapq.heappush(self.__mate_heaps.setdefault(mate_contig, []),
+                       (mate_pos, group_seq, alt_breakend_id, _has_mate_id(variant_record)))
+
+    def __group_seq(self, alt_breakend_id):
+        group_seq = self.__group_seqs.get(alt_breakend_id)
+        if group_seq is None:
+            spilled_group = self.__spilled.get(alt_breakend_id)
+            if spilled_group is not None:
+                group_seq = spilled_group[0]
+        return group_seq
+
+    def __passed_groups(self, contig, pos):
+        # Returns the (group seq, alt id) of the groups whose mate locus is before (contig, pos), in creation order
+        passed = []
+        if contig != self.__contig:
+            if contig in self.__passed_contigs:
+                raise ValueError(f'VCF file is not sorted: contig {contig} found after other contigs')
+            if self.__contig is not None:
+                self.__passed_contigs.add(self.__contig)
+                passed.extend(self.__mate_heaps.pop(self.__contig, []))
+            self.__contig = contig
+        elif pos < self.__pos:
+            raise ValueError(f'VCF file is not sorted: {contig}:{pos} found after {contig}:{self.__pos}')
+        self.__pos = pos
+        heap = self.__mate_heaps.get(contig)
+        while heap and heap[0][0] < pos:
+            passed.append(heapq.heappop(heap))
+        # Skip groups already paired (or recreated later)
+        return sorted((group_seq, alt_breakend_id, has_mate_id) for _, group_seq, alt_breakend_id, has_mate_id in passed
+                      if self.__group_seq(alt_breakend_id) == group_seq)
+
+    def advance(self, contig, pos):
+        """Moves out of memory the groups whose mate locus is before (contig, pos). Only for sorted inputs."""
+        passed = self.__passed_groups(contig, pos)
+        if passed:
+            self.__spill([alt_breakend_id for _, alt_breakend_id, _ in passed if alt_breakend_id in self.__group_seqs])
+
+    def expire(self, contig, pos) -> List[VariantRecord]:
+        """Removes and returns the breakends without MATEID or PARID whose mate locus is before (contig, pos), as they
+        can no longer be paired. Those with MATEID or PARID are moved out of memory instead. Only for sorted inputs.
+        """
+        expired = []
+        kept = []
+        for _, alt_breakend_id, has_mate_id in self.__passed_groups(contig, pos):
+            if has_mate_id:
+                if alt_breakend_id in self.__group_seqs:
+                    kept.append(alt_breakend_id)
+                continue
+            records = self.__pending_breakends.pop(alt_breakend_id, None)
+            if records is not None:
+                self.__group_seqs.pop(alt_breakend_id)
+                self.__length -= len(records)
+                expired.extend(records.values())
+            else:
+                self.__spilled.pop(alt_breakend_id)
+                expired.extend(self.__store.take_group(alt_breakend_id))
+        self.__spill(kept)
+        return expired
+
+    def __take_spilled(self, alt_breakend_id, breakend_id):
+        spilled_group = self.__spilled.get(alt_breakend_id)
+        if spilled_group is None:
+            return None
+        variant_record = self.__store.take(alt_breakend_id, breakend_id)
+        if variant_record is None:
+            return None
+        group_seq, count = spilled_group
+        if count == 1:
+            self.__spilled.pop(alt_breakend_id)
+        else:
+            self.__spilled[alt_breakend_id] = (group_seq, count - 1)
+        return variant_record
 
     def pop(self, alt_variant_record: VariantRecord):
         breakend_id = _get_id(alt_variant_record)
         previous_records = self.__pending_breakends.get(breakend_id)
         if previous_records is None:
-            return None
+            if not self.__spilled:
+                return None
+            return self.__take_spilled(breakend_id, _get_mate_id(alt_variant_record))
         previous_record_alt_breakend_id = _get_mate_id(alt_variant_record)
         previous_record_alt = previous_records.get(previous_record_alt_breakend_id)
         if previous_record_alt is None:
             return None
         previous_records.pop(previous_record_alt_breakend_id)
+        self.__length -= 1
         if len(previous_records) == 0:
             self.__pending_breakends.pop(breakend_id)
+            self.__group_seqs.pop(breakend_id)
         return previous_record_alt
 
     def remove(self, variant_record: VariantRecord):
@@ -58,18 +290,36 @@ class PendingBreakends:
         breakend_id = _get_id(variant_record)
         previous_records = self.__pending_breakends.get(alt_breakend_id)
         if previous_records is None:
+            self.__take_spilled(alt_breakend_id, breakend_id)
             return
         previous_records.pop(breakend_id)
+        self.__length -= 1
         if len(previous_records) == 0:
             self.__pending_breakends.pop(alt_breakend_id)
+            self.__group_seqs.pop(alt_breakend_id)
 
-    def values(self):
-        for alt_dict in self.__pending_breakends.values():
+    def __memory_values(self):
+        for alt_breakend_id, alt_dict in self.__pending_breakends.items():
+            group_seq = self.__group_seqs[alt_breakend_id]
             for variant_record in alt_dict.values():
-                yield variant_record
+                yield group_seq, variant_record
+
+    def values(self):
+        if not self.__spilled:
+            for alt_dict in self.__pending_breakends.values():
+                for variant_record in alt_dict.values():
+                    yield variant_record
+            return
+        # Groups are returned in creation order, either from memory or from the store
+        for _, variant_record in heapq.merge(self.__memory_values(), self.__store.records(), key=lambda item: item[0]):
+            yield variant_record
+
+    def close(self):
+        """Removes the temporary database, if any."""
+        if self.__store is not None:
+            self.__store.close()
+            self.__store = None
+            self.__spilled = {}
 
     def __len__(self):
-        total_len = 0
-        for alt_dicts in self.__pending_breakends.values():
-            total_len += len(alt_dicts)
-        return total_len
+        return self.__length + sum(count for _, count in self.__spilled.values())
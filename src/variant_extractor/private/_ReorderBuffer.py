@@ -0,0 +1,90 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import heapq
+from typing import List, Tuple
+
+from ..contigs import ContigOrder
+from ..variants import VariantRecord
+
+
+class ReorderBuffer:
+    """Sliding window that sorts the variants extracted from a sorted VCF file by contig and position. A variant is
+    returned once the input has moved :code:`window` bp past its position, so that the variants moved back by the
+    extraction (permuted breakends, INV converted to breakends...) are returned in order.
+
+    Variants extracted after others past their position were returned (for example, breakends whose mate is read much
+    later) are kept in a side channel, which is returned sorted when the output moves to the next contig.
+    """
+
+    def __init__(self, contig_order: ContigOrder, window: int):
+        self.__contig_order = contig_order
+        self.__window = window
+        self.__heap = []
+        self.__late = []
+        self.__last = None
+        self.__seq = 0
+        # Rank of the last contig seen, most variants are in the same contig as the previous one
+        self.__contig = None
+        self.__rank = None
+
+    def __key(self, contig: str) -> int:
+        if contig == self.__contig:
+            return self.__rank
+        contig_order = self.__contig_order
+        if contig not in contig_order:
+            # Adding a contig may change the ranks of the other unknown contigs
+            contig_order.add(contig)
+            self.__contig = None
+            self.__rerank()
+            if self.__last is not None:
+                self.__last = (contig_order.rank(self.__last[2]), self.__last[1], self.__last[2])
+        self.__contig = contig
+        self.__rank = contig_order.rank(contig)
+        return self.__rank
+
+    def __rerank(self):
+        rank = self.__contig_order.rank
+        for entries in (self.__heap, self.__late):
+            entries[:] = [(rank(entry[3].contig),) + entry[1:] for entry in entries]
+            heapq.heapify(entries)
+
+    def push(self, vcf_record: VariantRecord):
+        entry = (self.__key(vcf_record.contig), vcf_record.pos, self.__seq, vcf_record)
+        self.__seq += 1
+        last = self.__last
+        if last is not None and (entry[0] < last[0] or (entry[0] == last[0] and entry[1] < last[1])):
+            heapq.heappush(self.__late, entry)
+        else:
+            heapq.heappush(self.__heap, entry)
+
+    def advance(self, contig: str, pos: int) -> List[VariantRecord]:
+        """Returns the variants that are before the window of the input position, in order."""
+        rank = self.__key(contig)
+        pos -= self.__window
+        heap = self.__heap
+        record_list = []
+        while heap and (heap[0][0] < rank or (heap[0][0] == rank and heap[0][1] < pos)):
+            self.__emit(heapq.heappop(heap), record_list)
+        return record_list
+
+    def flush(self) -> List[VariantRecord]:
+        """Returns all the remaining variants, in order."""
+        record_list = self.__pop_late()
+        heap = self.__heap
+        while heap:
+            self.__emit(heapq.heappop(heap), record_list)
+        return record_list
+
+    def __emit(self, entry: Tuple, record_list: List[VariantRecord]):
+        if self.__last is not None and entry[0] != self.__last[0]:
+            # Contig boundary, the late variants are returned before moving to the next contig
+            record_list.extend(self.__pop_late())
+        vcf_record = entry[3]
+        self.__last = (entry[0], entry[1], vcf_record.contig)
+        record_list.append(vcf_record)
+
+    def __pop_late(self) -> List[VariantRecord]:
+        late = self.__late
+        record_list = [heapq.heappop(late)[3] for _ in range(len(late))]
+        return record_list
@@ -0,0 +1,82 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from time import perf_counter
+from typing import Callable, Iterable, Iterator
+
+from ..stats import ExtractionStats
+
+
+class StageTimer:
+    """Times the stages of the extraction into an :class:`ExtractionStats`. Functions are wrapped once, when stats are
+    enabled, so the extraction does not check whether they are on each call. The time of a stage excludes the stages
+    called from it.
+    """
+
+    def __init__(self, stats: ExtractionStats):
+        self.__stats = stats
+        # Time of the stages nested in each running stage
+        self.__nested = [0.0]
+
+    def wrap(self, stage: str, function: Callable) -> Callable:
+        times = self.__stats.stage_times
+        calls = self.__stats.stage_calls
+        nested = self.__nested
+
+        def timed(*args):
+            # An exception ends the extraction, so the stack is not restored when one is raised
+            nested.append(0.0)
+            start = perf_counter()
+            result = function(*args)
+            elapsed = perf_counter() - start
+            times[stage] += elapsed - nested.pop()
+            calls[stage] += 1
+            nested[-1] += elapsed
+            return result
+        return timed
+
+    def wrap_records(self, records: Iterable) -> Iterator:
+        # Times the decoding of each record read from the VCF file
+        stats = self.__stats
+        times = stats.stage_times
+        calls = stats.stage_calls
+        nested = self.__nested
+        iterator = iter(records)
+        while True:
+            start = perf_counter()
+            try:
+                rec = next(iterator)
+            except StopIteration:
+                times['read'] += perf_counter() - start
+                return
+            elapsed = perf_counter() - start
+            times['read'] += elapsed
+            calls['read'] += 1
+            nested[-1] += elapsed
+            stats.records_read += 1
+            yield rec
+
+    def instrument_pending_breakends(self, pending_breakends):
+        # The methods are replaced in the instance, which is owned by a single extraction
+        for method in ('push', 'pop', 'advance', 'expire', 'remove'):
+            setattr(pending_breakends, method, self.wrap('pending_breakends', getattr(pending_breakends, method)))
+        stats = self.__stats
+        push = pending_breakends.push
+
+        def counted_push(variant_record):
+            push(variant_record)
+            if len(pending_breakends) > stats.peak_pending_breakends:
+                stats.peak_pending_breakends = len(pending_breakends)
+        pending_breakends.push = counted_push
+        return pending_breakends
+
+    def instrument_fasta(self, fasta_ref):
+        stats = self.__stats
+        fetch = self.wrap('fasta', fasta_ref.fetch)
+
+        def counted_fetch(contig, start, end):
+            stats.fasta_fetches += 1
+            return fetch(contig, start, end)
+        fasta_ref.fetch = counted_fetch
+        fasta_ref.prefetch = self.wrap('fasta', fasta_ref.prefetch)
+        return fasta_ref
@@ -0,0 +1,103 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import numpy as np
+import pyarrow as pa
+
+from ._ColumnBuilder import ColumnBuilder, NUMERIC_COLUMNS, info_column
+
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+# Arrow types of the VariantRecord fields that can be passed in extra_fields
+EXTRA_FIELD_TYPES = {
+    'contig': pa.string(),
+    'pos': pa.int64(),
+    'end': pa.int64(),
+    'length': pa.int64(),
+    'id': pa.string(),
+    'ref': pa.string(),
+    'alt': pa.string(),
+    'qual': pa.float64(),
+    'filter': pa.list_(pa.string()),
+    'variant_type': pa.string(),
+}
+INFO_TYPES = {
+    'Integer': pa.int64(),
+    'Float': pa.float64(),
+    'String': pa.string(),
+    'Character': pa.string(),
+    'Flag': pa.bool_(),
+}
+
+
+def _info_type(header, key):
+    if key not in header.info:
+        return pa.string()
+    metadata = header.info[key]
+    value_type = INFO_TYPES.get(metadata.type, pa.string())
+    if metadata.number in (0, 1):
+        return value_type
+    return pa.list_(value_type)
+
+
+def build_schema(columns, extra_fields, info_fields, header) -> pa.Schema:
+    fields = []
+    for column in columns:
+        fields.append(pa.field(column, pa.uint64() if column in NUMERIC_COLUMNS else DICTIONARY_TYPE))
+    for field in extra_fields:
+        if field == 'variant_record_obj':
+            raise ValueError('variant_record_obj cannot be stored in Arrow format')
+        fields.append(pa.field(field, EXTRA_FIELD_TYPES.get(field, pa.string())))
+    for key in info_fields:
+        fields.append(pa.field(info_column(key), _info_type(header, key)))
+    return pa.schema(fields)
+
+
+def _convert_value(value, arrow_type):
+    # Converts the Python value of a field so that Arrow can build an array of arrow_type
+    if value is None:
+        return None
+    if pa.types.is_list(arrow_type):
+        if isinstance(value, (tuple, list)):
+            return [_convert_value(v, arrow_type.value_type) for v in value]
+        return [_convert_value(value, arrow_type.value_type)]
+    if pa.types.is_string(arrow_type):
+        if hasattr(value, 'name') and not isinstance(value, str):
+            # Enum values, such as VariantType
+            return value.name
+        return value if isinstance(value, str) else str(value)
+    return value
+
+
+def _convert_column(values, arrow_type):
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([_convert_value(value, arrow_type) for value in values], type=arrow_type)
+
+
+def _dictionary_array(builder: ColumnBuilder, column: str) -> pa.DictionaryArray:
+    # The dictionary only has the values used by the batch, so the Parquet row groups do not carry the categories
+    # seeded beforehand or seen in previous batches
+    codes = np.frombuffer(builder.codes[column], dtype=np.int32) if len(builder) else np.empty(0, dtype=np.int32)
+    used, indices = np.unique(codes, return_inverse=True)
+    categories = list(builder.categories[column])
+    dictionary = pa.array([categories[code] for code in used], type=pa.string())
+    return pa.DictionaryArray.from_arrays(pa.array(indices.reshape(-1).astype(np.int32)), dictionary)
+
+
+def to_record_batch(builder: ColumnBuilder, schema: pa.Schema) -> pa.RecordBatch:
+    length = len(builder)
+    arrays = []
+    # Schema fields follow the order of build_schema: columns, extra fields and INFO fields
+    columns = schema.names[:len(schema) - len(builder.extra_fields) - len(builder.info_fields)]
+    for column in columns:
+        if column in builder.numeric:
+            # Zero-copy view of the typed array
+            arrays.append(pa.Array.from_buffers(pa.uint64(), length, [None, pa.py_buffer(builder.numeric[column])]))
+        else:
+            arrays.append(_dictionary_array(builder, column))
+    for field in builder.extra_fields:
+        arrays.append(_convert_column(builder.extra[field], schema.field(field).type))
+    for key in builder.info_fields:
+        arrays.append(_convert_column(builder.info[key], schema.field(info_column(key)).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
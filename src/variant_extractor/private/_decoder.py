@@ -0,0 +1,159 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+# Decodes the INFO, FORMAT and sample columns of a VCF line into the same Python values pysam returns,
+# so that detached records do not need to keep their pysam.VariantRecord alive
+import re
+import struct
+from collections import OrderedDict
+
+GT_SEPARATOR_REGEX = re.compile(r'[/|]')
+# Type assumed by htslib for fields not defined in the header
+UNDEFINED_FIELD = ('String', 1)
+# Maximum number of headers whose metadata is cached
+METADATA_CACHE_SIZE = 16
+
+_metadata_cache = OrderedDict()
+
+
+class HeaderMetadata:
+    """Types and numbers of the INFO and FORMAT fields and sample names of a VCF header."""
+    __slots__ = ('info', 'formats', 'samples', 'sample_indexes')
+
+    def __init__(self, header):
+        self.info = {key: (metadata.type, metadata.number) for key, metadata in header.info.items()}
+        self.formats = {key: (metadata.type, metadata.number) for key, metadata in header.formats.items()}
+        self.samples = list(header.samples)
+        self.sample_indexes = {sample_name: i for i, sample_name in enumerate(self.samples)}
+
+
+def header_metadata(header) -> HeaderMetadata:
+    # The header is kept referenced by the cache, so its id cannot be reused while it is cached
+    key = id(header)
+    cached = _metadata_cache.get(key)
+    if cached is not None and cached[0] is header:
+        _metadata_cache.move_to_end(key)
+        return cached[1]
+    metadata = HeaderMetadata(header)
+    _metadata_cache[key] = (header, metadata)
+    if len(_metadata_cache) > METADATA_CACHE_SIZE:
+        _metadata_cache.popitem(last=False)
+    return metadata
+
+
+def _to_float32(value):
+    # htslib stores floats in single precision
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+
+def _decode_number(value, value_type):
+    if value == '.':
+        return None
+    try:
+        return int(value) if value_type == 'Integer' else _to_float32(float(value))
+    except ValueError:
+        return value
+
+
+def decode_value(text, value_type, number):
+    if value_type == 'String' or value_type == 'Character':
+        if number == 1:
+            return text
+        return tuple(text.split(','))
+    if value_type == 'Flag':
+        return True
+    values = text.split(',')
+    if number == 1 and len(values) == 1:
+        return _decode_number(values[0], value_type)
+    return tuple(_decode_number(value, value_type) for value in values)
+
+
+def _decode_info_entry(key, separator, value, metadata: HeaderMetadata):
+    value_type, number = metadata.info.get(key, UNDEFINED_FIELD)
+    return True if value_type == 'Flag' or not separator else decode_value(value, value_type, number)
+
+
+def decode_info(text, metadata: HeaderMetadata):
+    info = dict()
+    if text == '.' or not text:
+        return info
+    for entry in text.split(';'):
+        key, separator, value = entry.partition('=')
+        # pysam exposes END as the record stop instead of an INFO field
+        if key == 'END':
+            continue
+        info[key] = _decode_info_entry(key, separator, value, metadata)
+    return info
+
+
+def decode_info_value(text, key, metadata: HeaderMetadata, default=None):
+    # Decodes a single INFO field
+    if text == '.' or not text or key == 'END':
+        return default
+    for entry in text.split(';'):
+        entry_key, separator, value = entry.partition('=')
+        if entry_key == key:
+            return _decode_info_entry(key, separator, value, metadata)
+    return default
+
+
+def decode_format(text):
+    if text == '.' or not text:
+        return []
+    return text.split(':')
+
+
+def decode_sample_value(key, text, metadata: HeaderMetadata):
+    if key == 'GT':
+        return tuple(None if allele == '.' else int(allele) for allele in GT_SEPARATOR_REGEX.split(text))
+    value_type, number = metadata.formats.get(key, UNDEFINED_FIELD)
+    return decode_value(text, value_type, number)
+
+
+def decode_sample(format_keys, sample_text, metadata: HeaderMetadata):
+    values = sample_text.split(':') if sample_text is not None else []
+    return {key: decode_sample_value(key, values[j] if j < len(values) else '.', metadata)
+            for j, key in enumerate(format_keys)}
+
+
+def decode_samples(format_keys, sample_texts, metadata: HeaderMetadata):
+    samples = dict()
+    for i, sample_name in enumerate(metadata.samples):
+        samples[sample_name] = decode_sample(format_keys, sample_texts[i] if i < len(sample_texts) else None, metadata)
+    return samples
+
+
+def decode_sample_values(key, format_keys, sample_texts, metadata: HeaderMetadata):
+    # Decodes a single FORMAT field of every sample
+    j = format_keys.index(key)
+    values = []
+    for i in range(len(metadata.samples)):
+        sample_values = sample_texts[i].split(':', j + 1) if i < len(sample_texts) else []
+        values.append(decode_sample_value(key, sample_values[j] if j < len(sample_values) else '.', metadata))
+    return values
+
+
+def project_info(text, keys):
+    # END is kept first, as it is part of the VCF line even if pysam does not expose it in INFO. The rest of the fields
+    # follow the order of keys, as the INFO of projected pysam records
+    if text == '.' or not text:
+        return text
+    entries = dict()
+    for entry in text.split(';'):
+        key = entry.partition('=')[0]
+        if key in keys or key == 'END':
+            entries[key] = entry
+    ordered_keys = ['END'] + [key for key in keys if key != 'END']
+    return ';'.join(entries[key] for key in ordered_keys if key in entries) if entries else '.'
+
+
+def project_samples(format_text, sample_texts, keys):
+    format_keys = decode_format(format_text)
+    indexes = [i for i, key in enumerate(format_keys) if key in keys]
+    if not indexes:
+        return '.', []
+    projected_samples = []
+    for sample_text in sample_texts:
+        values = sample_text.split(':')
+        projected_samples.append(':'.join(values[i] for i in indexes if i < len(values)))
+    return ':'.join(format_keys[i] for i in indexes), projected_samples
@@ -0,0 +1,32 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import numpy as np
+
+# Value of missing integers (and missing or absent alleles in GT), as integer arrays cannot hold None
+MISSING_INTEGER = -1
+FORMAT_TYPES = {
+    'Integer': (np.int32, MISSING_INTEGER),
+    'Float': (np.float32, np.nan),
+}
+
+
+def _row(value, width, fill):
+    return [fill if v is None else v for v in value] + [fill] * (width - len(value))
+
+
+def format_array(key, values, value_type, number) -> np.ndarray:
+    """Converts the values of a FORMAT field for every sample into an array. Fields with Number=1 are returned as a
+    1D array, the rest (and GT) as a 2D array padded to the longest value.
+    """
+    if key == 'GT':
+        dtype, fill = np.int32, MISSING_INTEGER
+    else:
+        dtype, fill = FORMAT_TYPES.get(value_type, (object, None))
+    if key != 'GT' and number == 1 and not any(isinstance(value, tuple) for value in values):
+        return np.array([fill if value is None else value for value in values], dtype=dtype)
+    rows = [value if isinstance(value, tuple) else (value,) for value in values]
+    width = max(map(len, rows), default=0)
+    if not all(len(row) == width and None not in row for row in rows):
+        rows = [_row(row, width, fill) for row in rows]
+    return np.array(rows, dtype=dtype).reshape(len(rows), width)
@@ -0,0 +1,78 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+
+import time
+
+# Extractor owned by each worker process of the pool, opened once by _init_worker
+_worker_extractor = None
+# Reference shared by the extractions of each worker process of a batch, opened once by init_batch_worker
+_worker_fasta = None
+
+
+def _init_worker(vcf_file, extractor_kwargs):
+    global _worker_extractor
+    from ..VariantExtractor import VariantExtractor
+    _worker_extractor = VariantExtractor(vcf_file, **extractor_kwargs)
+
+
+def _run_task(task):
+    contig, start, stop = task
+    return _worker_extractor._extract_task(contig, start, stop)
+
+
+def split_tasks(regions, contig_lengths, chunk_size):
+    # Split each region into chunks of at most chunk_size bp when its length is known
+    tasks = []
+    for contig, start, stop in regions:
+        length = stop if stop is not None else contig_lengths.get(contig)
+        if length is None or chunk_size is None:
+            tasks.append((contig, start, stop))
+            continue
+        chunk_starts = list(range(start, length, chunk_size)) or [start]
+        for chunk_start in chunk_starts[:-1]:
+            tasks.append((contig, chunk_start, chunk_start + chunk_size))
+        # The last chunk keeps the original stop, so records beyond the declared contig length are not lost
+        tasks.append((contig, chunk_starts[-1], stop))
+    return tasks
+
+
+def run_tasks(vcf_file, extractor_kwargs, tasks, workers):
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(vcf_file, extractor_kwargs)) as executor:
+        # Results are returned in the order of the tasks
+        yield from executor.map(_run_task, tasks)
+
+
+def init_batch_worker(fasta_ref):
+    global _worker_fasta
+    from ._CachedFasta import CachedFasta
+    _worker_fasta = CachedFasta(fasta_ref) if fasta_ref is not None else None
+
+
+def close_batch_worker():
+    global _worker_fasta
+    if _worker_fasta is not None:
+        _worker_fasta.close()
+        _worker_fasta = None
+
+
+def extract_columns(vcf_file, fasta_ref, extractor_kwargs, extra_fields, info_fields):
+    # Returns the columns of the variants of a VCF file, the time taken and the error that stopped the extraction
+    from ..VariantExtractor import VariantExtractor
+    from ._ColumnBuilder import ColumnBuilder
+    start_time = time.perf_counter()
+    try:
+        extractor = VariantExtractor(vcf_file, **extractor_kwargs)
+        try:
+            if _worker_fasta is not None:
+                extractor._share_fasta(_worker_fasta, fasta_ref)
+            builder = ColumnBuilder(extra_fields, info_fields)
+            for variant_record in extractor:
+                builder.append(variant_record)
+        finally:
+            extractor.close()
+    except Exception as e:
+        return None, time.perf_counter() - start_time, f'{type(e).__name__}: {e}'
+    return builder, time.perf_counter() - start_time, None
@@ -2,6 +2,7 @@
 # Author: Rodrigo Martin
 # MIT License
 import re
+import string
 import warnings
 import pysam
 
@@ -12,6 +13,32 @@ BREAKEND_SV_REGEX = re.compile(r'([.A-Za-z]*)(\[|\])([^\]\[:]+:[0-9]+)(\[|\])([.
 SHORTHAND_SV_REGEX = re.compile(r'<(DEL|INS|DUP|INV|CNV])(:[A-Za-z0-9]+)*>')
 SGL_SV_REGEX = re.compile(r'\.[.A-Za-z]+|[.A-Za-z]+\.')
 STANDARD_RECORD_REGEX = re.compile(r'([.A-Za-z]+)')
+# Characters allowed in SGL and standard ALT fields
+ALT_CHARACTERS = string.ascii_letters + '.'
+
+# Classes of ALT fields returned by classify_alt
+ALT_UNKNOWN = 0
+ALT_STANDARD = 1
+ALT_SGL = 2
+ALT_SHORTHAND = 3
+ALT_BREAKEND = 4
+
+
+def classify_alt(alt: str) -> int:
+    """Classifies an ALT field in a single pass, without running the regex of each kind of record.
+    ALT_SGL only means that the ALT field has the SGL notation, SVTYPE must still be checked in INFO.
+    """
+    if not alt:
+        return ALT_UNKNOWN
+    if alt[0] == '<':
+        return ALT_SHORTHAND
+    if '[' in alt or ']' in alt:
+        return ALT_BREAKEND
+    if alt.strip(ALT_CHARACTERS):
+        return ALT_UNKNOWN
+    if len(alt) > 1 and (alt[0] == '.' or alt[-1] == '.'):
+        return ALT_SGL
+    return ALT_STANDARD
 
 
 def parse_breakend_sv(rec: pysam.VariantRecord):
@@ -102,6 +129,11 @@ def parse_sgl_sv(rec: pysam.VariantRecord):
     sv_match_sgl = SGL_SV_REGEX.fullmatch(rec.alts[0])
     if not sv_match_sgl or 'SVTYPE' not in rec.info:
         return None
+    return create_sgl_record(rec)
+
+
+def create_sgl_record(rec: pysam.VariantRecord):
+    # The ALT field must have already been checked to be a SGL
     variant_type = VariantType.SGL
     length = 0
     # Create new record
@@ -115,16 +147,22 @@ def parse_standard_record(rec: pysam.VariantRecord):
     match = STANDARD_RECORD_REGEX.fullmatch(rec.alts[0])
     if not match:
         return None
-    if len(rec.alts[0]) == len(rec.ref):
-        length = len(rec.ref)
+    return create_standard_record(rec, rec.alts[0])
+
+
+def create_standard_record(rec: pysam.VariantRecord, alt: str):
+    # The ALT field must have already been checked to be a standard record
+    ref = rec.ref
+    if len(alt) == len(ref):
+        length = len(ref)
         variant_type = VariantType.SNV
-    elif len(rec.alts[0]) > len(rec.ref):
-        length = len(rec.alts[0]) - 1
+    elif len(alt) > len(ref):
+        length = len(alt) - 1
         variant_type = VariantType.INS
     else:
-        length = len(rec.ref) - 1
+        length = len(ref) - 1
         variant_type = VariantType.DEL
     # Create new record
     vcf_record = VariantRecord(rec, rec.contig, rec.pos, rec.stop, length, rec.id,
-                               rec.ref, rec.alts[0], variant_type, None, None)
+                               ref, alt, variant_type, None, None)
     return vcf_record
@@ -6,6 +6,10 @@ import re
 from ..variants import BreakendSVRecord, VariantRecord, VariantType
 
 NUMBER_CONTIG_REGEX = re.compile(r'[0-9]+')
+# Coordinates of a region, after the last colon of the region string
+COORDINATES_REGEX = re.compile(r'([0-9,]+)(?:-([0-9,]+))?')
+# Contig in braces, so that contigs with colons can be given with coordinates (htslib style)
+BRACED_REGION_REGEX = re.compile(r'\{([^}]+)\}(?::(.*))?')
 
 
 def compare_contigs(contig_1, contig_2):
@@ -22,6 +26,66 @@ def compare_contigs(contig_1, contig_2):
         return -1 if int(match_1.group()) <= int(match_2.group()) else 1
 
 
+def parse_region(region, contigs=None):
+    # Accept (contig, start, stop) tuples with 0-based half-open coordinates
+    # or 'contig:beg-end' strings with 1-based inclusive coordinates (samtools style).
+    # Contigs may contain colons, as in HLA-A*01:01:01:01. As htslib does, a region that is a contig of the header
+    # is the whole contig, and '{contig}:beg-end' gives coordinates to any contig
+    if not isinstance(region, str):
+        contig, start, stop = (tuple(region) + (None, None))[:3]
+        return contig, start or 0, stop
+    match = BRACED_REGION_REGEX.fullmatch(region)
+    if match:
+        contig, coordinates = match.groups()
+        return (contig,) + _parse_coordinates(region, coordinates) if coordinates is not None else (contig, 0, None)
+    contig, _, coordinates = region.rpartition(':')
+    if not contig or not COORDINATES_REGEX.fullmatch(coordinates):
+        return region, 0, None
+    if contigs is not None and region in contigs:
+        if contig in contigs:
+            raise ValueError(f'Ambiguous region: {region}, use {{{contig}}}:{coordinates} or {{{region}}}')
+        return region, 0, None
+    return (contig,) + _parse_coordinates(region, coordinates)
+
+
+def _parse_coordinates(region, coordinates):
+    match = COORDINATES_REGEX.fullmatch(coordinates)
+    if not match:
+        raise ValueError(f'Invalid region: {region}')
+    beg, end = match.groups()
+    start = int(beg.replace(',', '')) - 1
+    stop = int(end.replace(',', '')) if end else None
+    return max(start, 0), stop
+
+
+def merge_regions(regions):
+    # Group regions by contig (keeping the order of first appearance) and merge overlapping intervals,
+    # so that every record belongs to at most one region
+    merged = {}
+    for contig, start, stop in regions:
+        merged.setdefault(contig, []).append((start, stop))
+    result = []
+    for contig, intervals in merged.items():
+        intervals.sort(key=lambda x: x[0])
+        current_start, current_stop = intervals[0]
+        for start, stop in intervals[1:]:
+            if current_stop is None or start <= current_stop:
+                current_stop = None if current_stop is None or stop is None else max(current_stop, stop)
+            else:
+                result.append((contig, current_start, current_stop))
+                current_start, current_stop = start, stop
+        result.append((contig, current_start, current_stop))
+    return result
+
+
+def in_regions(contig, pos, regions):
+    # pos is 1-based as in VariantRecord.pos
+    for region_contig, start, stop in regions:
+        if contig == region_contig and pos > start and (stop is None or pos <= stop):
+            return True
+    return False
+
+
 def permute_breakend_sv(variant_record: VariantRecord, fasta_ref=None):
     assert variant_record.alt_sv_breakend is not None
     # Transform REF/ALT to equivalent notation
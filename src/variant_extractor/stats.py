@@ -0,0 +1,89 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from typing import Any, Dict
+
+# Stages of the extraction timed by ExtractionStats
+STAGES = ['read', 'parse', 'split_multiallelic', 'pending_breakends', 'breakend_notation', 'fasta', 'release']
+# Variants returned between calls to the progress callback
+PROGRESS_INTERVAL = 100_000
+
+
+class ExtractionStats:
+    """Counters and timers of the extractions of a :class:`VariantExtractor` created with :code:`stats=True` (or with a
+    :code:`progress` callback). They accumulate over all the iterations of the extractor, and in parallel mode they
+    only cover the work done by this process.
+
+    The time of each stage excludes the time of the stages nested in it (for example, the FASTA fetches of
+    :code:`breakend_notation`), so the stages add up to the time spent inside the extraction:
+
+    - :code:`read`: decoding of the records by pysam.
+    - :code:`parse`: parsing of the ALT notation and creation of the variants, including the atomization of SNVs. It
+      is called once per record, and once more per allele of multiallelic records.
+    - :code:`split_multiallelic`: splitting of multiallelic records (the parsing of each allele is in :code:`parse`).
+    - :code:`pending_breakends`: search and storage of the breakends waiting for their mate.
+    - :code:`breakend_notation`: permutation of breakends to the lowest breakend of the pair, conversion of INV to
+      breakends and of DEL to INS.
+    - :code:`fasta`: fetches from the FASTA reference (only if it is owned by the extractor).
+    - :code:`release`: detaching of the variants, with :code:`keep_raw=False` or :code:`info_keys`/:code:`format_keys`.
+    """
+
+    def __init__(self):
+        self.stage_times: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        """Time (in seconds) spent in each stage"""
+        self.stage_calls: Dict[str, int] = dict.fromkeys(STAGES, 0)
+        """Number of calls to each stage"""
+        self.records_read = 0
+        """Records read from the VCF file"""
+        self.variants: Dict[str, int] = {}
+        """Variants returned per :code:`VariantType` name"""
+        self.pairs_found = 0
+        """Breakend pairs found"""
+        self.peak_pending_breakends = 0
+        """Maximum number of breakends waiting for their mate at the same time"""
+        self.fasta_fetches = 0
+        """Fetches from the FASTA reference"""
+        self.bytes_read = 0
+        """Bytes of the VCF file read (compressed bytes for bgzipped VCF and BCF files)"""
+        self.elapsed = 0.0
+        """Time (in seconds) from the start to the end of the iterations, including the time spent by the consumer"""
+
+    @property
+    def total_variants(self) -> int:
+        """Variants returned"""
+        return sum(self.variants.values())
+
+    @property
+    def records_per_second(self) -> float:
+        """Records read per second of :attr:`elapsed`"""
+        return self.records_read / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def variants_per_second(self) -> float:
+        """Variants returned per second of :attr:`elapsed`"""
+        return self.total_variants / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns the counters and timers as a dictionary, for example to be saved as JSON."""
+        return {
+            'stage_times': dict(self.stage_times),
+            'stage_calls': dict(self.stage_calls),
+            'records_read': self.records_read,
+            'variants': dict(self.variants),
+            'pairs_found': self.pairs_found,
+            'peak_pending_breakends': self.peak_pending_breakends,
+            'fasta_fetches': self.fasta_fetches,
+            'bytes_read': self.bytes_read,
+            'elapsed': self.elapsed,
+            'records_per_second': self.records_per_second,
+        }
+
+    def __str__(self):
+        lines = [f'{self.records_read} records read ({self.bytes_read} bytes), {self.total_variants} variants in '
+                 f'{self.elapsed:.2f} s ({self.records_per_second:.0f} records/s)']
+        lines.append('Variants: ' + ', '.join(f'{name}={count}' for name, count in sorted(self.variants.items())))
+        lines.append(f'Pairs found: {self.pairs_found}, peak pending breakends: {self.peak_pending_breakends}, '
+                     f'FASTA fetches: {self.fasta_fetches}')
+        for stage in STAGES:
+            lines.append(f'  {stage:<20}{self.stage_times[stage]:>10.3f} s{self.stage_calls[stage]:>12} calls')
+        return '\n'.join(lines)
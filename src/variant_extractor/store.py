@@ -0,0 +1,257 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .variants import VariantRecord, VariantType, _restore_record
+from .private._ColumnBuilder import ColumnBuilder
+from .private._IntervalIndex import IntervalIndex
+
+# Types whose end is a breakend of its own
+_SINGLE_BREAKEND_TYPES = (VariantType.SNV.name, VariantType.SGL.name)
+
+
+def _normalize_contig(contig: str) -> str:
+    # Contigs are named as in the DataFrame columns
+    return contig.replace('chr', '')
+
+
+def _group_rows(contigs: np.ndarray, rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    # Rows of each contig, in order of appearance of the contigs
+    codes = {}
+    contig_codes = np.fromiter((codes.setdefault(contig, len(codes)) for contig in contigs), dtype=np.int64,
+                               count=len(contigs))
+    if rows is None:
+        rows = np.arange(len(contigs), dtype=np.int64)
+    order = np.argsort(contig_codes, kind='stable')
+    groups = np.split(rows[order], np.cumsum(np.bincount(contig_codes, minlength=len(codes)))[:-1])
+    return dict(zip(codes, groups))
+
+
+class _PointIndex:
+    # Sorted positions of the breakends of a contig and the variants they belong to
+
+    def __init__(self, positions: np.ndarray, ids: np.ndarray):
+        order = np.argsort(positions, kind='stable')
+        self.positions = positions[order]
+        self.ids = ids[order]
+
+    def between(self, start: int, end: int) -> np.ndarray:
+        lo = np.searchsorted(self.positions, start, side='left')
+        hi = np.searchsorted(self.positions, end, side='right')
+        return self.ids[lo:hi]
+
+
+class VariantStore:
+    """In-memory index of extracted variants for overlap, nearest breakend and mate breakend queries. Variants are
+    identified by their row, their position in the iterable or DataFrame the store was built from, and the queries
+    return arrays of rows.
+
+    The positions of each contig are kept in sorted NumPy arrays, with an implicit augmented interval tree (as in
+    cgranges) over the spans of the variants, so every query takes logarithmic time plus the number of variants
+    returned. Contigs are named without the :code:`chr` prefix, as in :meth:`VariantExtractor.to_dataframe`, and
+    positions are 1-based and inclusive.
+
+    Stores built with :meth:`from_records` keep the variants detached (see :meth:`VariantRecord.detach`) and only
+    rebuild a :class:`VariantRecord` when it is requested with :meth:`record` or :meth:`records`.
+    """
+
+    def __init__(self, start_chrom: List[str], start: np.ndarray, end_chrom: List[str], end: np.ndarray,
+                 type_inferred: List[str], variant_records: Optional[List] = None, restore: bool = False):
+        """
+        Use :meth:`from_records` or :meth:`from_dataframe` instead.
+        """
+        self.__length = len(start)
+        self.__variant_records = variant_records
+        self.__restore = restore
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        start_chrom = np.asarray(start_chrom, dtype=object)
+        end_chrom = np.asarray(end_chrom, dtype=object)
+        rows = np.arange(self.__length, dtype=np.int64)
+        same_contig = start_chrom == end_chrom
+        # Variants span from start to end within a contig, translocations only cover their first breakend
+        span_end = np.where(same_contig, np.maximum(start, end), start)
+        # The end is the mate breakend of the SVs with two breakends
+        mates = ~np.isin(np.asarray(type_inferred, dtype=object), _SINGLE_BREAKEND_TYPES) & \
+            ~(same_contig & (start == end))
+        self.__intervals: Dict[str, IntervalIndex] = {}
+        self.__breakends: Dict[str, _PointIndex] = {}
+        self.__mates: Dict[str, _PointIndex] = {}
+        first_rows = _group_rows(start_chrom)
+        second_rows = _group_rows(end_chrom[mates], rows[mates])
+        for contig, in_contig in first_rows.items():
+            # Half-open intervals
+            self.__intervals[contig] = IntervalIndex(start[in_contig], span_end[in_contig] + 1, in_contig)
+        for contig in dict.fromkeys(list(first_rows) + list(second_rows)):
+            first = first_rows.get(contig, rows[:0])
+            second = second_rows.get(contig, rows[:0])
+            self.__breakends[contig] = _PointIndex(np.concatenate((start[first], end[second])),
+                                                   np.concatenate((first, second)))
+            self.__mates[contig] = _PointIndex(end[second], second)
+
+    @classmethod
+    def from_records(cls, variant_records: Iterable[VariantRecord]) -> 'VariantStore':
+        """Builds a store from the variants of an iterable, such as a :class:`VariantExtractor`. The variants are
+        detached.
+
+        Parameters
+        ----------
+        variant_records : Iterable[VariantRecord]
+            Variants to index.
+
+        Returns
+        -------
+        VariantStore
+            The store, with a row per variant in iteration order.
+        """
+        builder = ColumnBuilder()
+        detached = []
+        for variant_record in variant_records:
+            builder.append(variant_record)
+            # Plain fields, the record is rebuilt on demand. Detaching it first avoids a copy
+            variant_record.detach()
+            detached.append(variant_record.__reduce__()[1])
+        columns = {}
+        for column in ('start_chrom', 'end_chrom', 'type_inferred'):
+            categories = list(builder.categories[column])
+            columns[column] = [categories[code] for code in builder.codes[column]]
+        return cls(columns['start_chrom'], np.frombuffer(builder.numeric['start'], dtype=np.uint64)
+                   if len(builder) else np.empty(0, dtype=np.int64),
+                   columns['end_chrom'], np.frombuffer(builder.numeric['end'], dtype=np.uint64)
+                   if len(builder) else np.empty(0, dtype=np.int64),
+                   columns['type_inferred'], detached, restore=True)
+
+    @classmethod
+    def from_dataframe(cls, df) -> 'VariantStore':
+        """Builds a store from the output of :meth:`VariantExtractor.to_dataframe`. If it has a
+        :code:`variant_record_obj` column, :meth:`record` returns its variants.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Variants to index.
+
+        Returns
+        -------
+        VariantStore
+            The store, with a row per row of the DataFrame in order (regardless of its index).
+        """
+        variant_records = df['variant_record_obj'].tolist() if 'variant_record_obj' in df.columns else None
+        return cls(df['start_chrom'].astype(str).tolist(), df['start'].to_numpy(dtype=np.int64),
+                   df['end_chrom'].astype(str).tolist(), df['end'].to_numpy(dtype=np.int64),
+                   df['type_inferred'].astype(str).tolist(), variant_records)
+
+    def __len__(self):
+        return self.__length
+
+    @property
+    def contigs(self) -> List[str]:
+        """Contigs with at least one breakend, in order of appearance"""
+        return list(self.__breakends)
+
+    def overlap(self, contig: str, start: int, end: int) -> np.ndarray:
+        """Returns the rows of the variants overlapping a region, sorted by position. Variants span from their position
+        to their end, except translocations, which only cover the position of their first breakend.
+
+        Parameters
+        ----------
+        contig : str
+            Contig of the region.
+        start : int
+            First position of the region.
+        end : int
+            Last position of the region.
+
+        Returns
+        -------
+        numpy.ndarray
+            Rows of the variants.
+        """
+        intervals = self.__intervals.get(_normalize_contig(contig))
+        if intervals is None:
+            return np.empty(0, dtype=np.int64)
+        return intervals.overlap(start, end + 1)
+
+    def mates(self, contig: str, start: int, end: int) -> np.ndarray:
+        """Returns the rows of the SVs whose second breakend (the end of the variant, or the position of the breakend
+        in its ALT, :code:`alt_sv_breakend.contig/pos`, for translocations) is in a region, sorted by that position.
+
+        Parameters
+        ----------
+        contig : str
+            Contig of the region.
+        start : int
+            First position of the region.
+        end : int
+            Last position of the region.
+
+        Returns
+        -------
+        numpy.ndarray
+            Rows of the variants.
+        """
+        mates = self.__mates.get(_normalize_contig(contig))
+        if mates is None:
+            return np.empty(0, dtype=np.int64)
+        return mates.between(start, end)
+
+    def nearest(self, contig: str, pos: int, k: int = 1, max_distance: Optional[int] = None) -> np.ndarray:
+        """Returns the rows of the :code:`k` variants with a breakend (either the first one or, for SVs, the second one)
+        nearest to a position, from the nearest. Ties are returned in order of position.
+
+        Parameters
+        ----------
+        contig : str
+            Contig of the position.
+        pos : int
+            Position.
+        k : int, optional
+            Maximum number of variants.
+        max_distance : int, optional
+            Only variants with a breakend at most this number of bp away are returned.
+
+        Returns
+        -------
+        numpy.ndarray
+            Rows of the variants.
+        """
+        breakends = self.__breakends.get(_normalize_contig(contig))
+        if breakends is None:
+            return np.empty(0, dtype=np.int64)
+        positions, ids = breakends.positions, breakends.ids
+        hi = int(np.searchsorted(positions, pos, side='left'))
+        lo = hi - 1
+        found = {}
+        # Both breakends of a variant may be near the position, so it is returned once
+        while len(found) < k and (lo >= 0 or hi < len(positions)):
+            if hi >= len(positions) or (lo >= 0 and pos - positions[lo] <= positions[hi] - pos):
+                index, distance = lo, pos - positions[lo]
+                lo -= 1
+            else:
+                index, distance = hi, positions[hi] - pos
+                hi += 1
+            if max_distance is not None and distance > max_distance:
+                break
+            found.setdefault(int(ids[index]), None)
+        return np.fromiter(found, dtype=np.int64, count=len(found))
+
+    def record(self, row: int) -> VariantRecord:
+        """Returns the variant of a row.
+
+        Raises
+        ------
+        ValueError
+            If the store was built from a DataFrame without a :code:`variant_record_obj` column.
+        """
+        if self.__variant_records is None:
+            raise ValueError('The store was built from a DataFrame without the variant_record_obj column')
+        if self.__restore:
+            return _restore_record(*self.__variant_records[row])
+        return self.__variant_records[row]
+
+    def records(self, rows: Iterable[int]) -> List[VariantRecord]:
+        """Returns the variants of several rows, see :meth:`record`."""
+        return [self.record(row) for row in rows]
@@ -2,34 +2,163 @@
 # Author: Rodrigo Martin
 # MIT License
 from typing import NamedTuple, Optional, List, Dict, Any, Union
+from collections.abc import Mapping
 from enum import Enum, auto
 
 import pysam
 
+from .private._decoder import HeaderMetadata, header_metadata, decode_info, decode_info_value, decode_format, \
+    decode_sample, decode_sample_values, project_info, project_samples, UNDEFINED_FIELD
+from .private._AlleleSplitter import TextSplitSamples
+
+# Marks a lazily derived field that has not been read yet (None is a valid QUAL)
+_UNSET = object()
+
 
 def _build_filter(rec: pysam.VariantRecord) -> List[Union[str, int]]:
     return [f for f in rec.filter]
 
 
-def _build_info(rec: pysam.VariantRecord) -> Dict[str, Any]:
+def _build_info(rec: pysam.VariantRecord, info_keys=None) -> Dict[str, Any]:
     info = dict()
+    if info_keys is not None:
+        # Only the requested values are decoded, in the order they were requested
+        rec_info = rec.info
+        for key in info_keys:
+            if key in rec_info:
+                info[key] = rec_info[key]
+        return info
     for key, value in rec.info.items():
         info[key] = value
     return info
 
 
-def _build_format(rec: pysam.VariantRecord) -> List[str]:
-    return [f for f in rec.format]
+def _build_format(rec: pysam.VariantRecord, format_keys=None) -> List[str]:
+    return [f for f in rec.format if format_keys is None or f in format_keys]
+
+
+class _RecordSamples:
+    # Samples of a pysam.VariantRecord, each FORMAT field is only decoded by htslib when accessed
+    __slots__ = ('rec', 'format', 'projected')
+
+    def __init__(self, rec: pysam.VariantRecord, format_keys=None):
+        self.rec = rec
+        self.format = _build_format(rec, format_keys)
+        self.projected = format_keys is not None
+
+    def sample(self, index: int) -> Dict[str, Any]:
+        sample = self.rec.samples[index]
+        if self.projected:
+            return {key: sample[key] for key in self.format}
+        return dict(sample.items())
 
+    def values(self, key: str) -> List[Any]:
+        return [sample[key] for sample in self.rec.samples.values()]
 
-def _build_samples(rec: pysam.VariantRecord) -> Dict[str, Dict[str, Any]]:
-    samples = dict()
-    for sample_name in rec.samples:
-        sample_dict = dict()
-        for key, value in rec.samples[sample_name].items():
-            sample_dict[key] = value
-        samples[sample_name] = sample_dict
-    return samples
+
+class _TextSamples:
+    # Samples of a detached record, kept as text
+    __slots__ = ('format', 'sample_texts', 'metadata')
+
+    def __init__(self, format_text: str, sample_texts: List[str], metadata: HeaderMetadata):
+        self.format = decode_format(format_text)
+        self.sample_texts = sample_texts
+        self.metadata = metadata
+
+    def sample(self, index: int) -> Dict[str, Any]:
+        sample_text = self.sample_texts[index] if index < len(self.sample_texts) else None
+        return decode_sample(self.format, sample_text, self.metadata)
+
+    def values(self, key: str) -> List[Any]:
+        return decode_sample_values(key, self.format, self.sample_texts, self.metadata)
+
+
+class SamplesView(Mapping):
+    """Read-only mapping with the genotype information of each sample, accessed by sample name or index. The FORMAT fields
+    of a sample are only decoded when the sample is accessed, and :meth:`format_array` decodes a single FORMAT field of
+    all the samples.
+    """
+    __slots__ = ('__source', '__metadata', '__samples')
+
+    def __init__(self, source, metadata: HeaderMetadata):
+        self.__source = source
+        self.__metadata = metadata
+        self.__samples = [None] * len(metadata.samples)
+
+    def __sample(self, index: int) -> Dict[str, Any]:
+        sample = self.__samples[index]
+        if sample is None:
+            sample = self.__source.sample(index)
+            self.__samples[index] = sample
+        return sample
+
+    def __getitem__(self, key: Union[str, int]) -> Dict[str, Any]:
+        if isinstance(key, int):
+            return self.__sample(range(len(self.__samples))[key])
+        return self.__sample(self.__metadata.sample_indexes[key])
+
+    def __iter__(self):
+        return iter(self.__metadata.samples)
+
+    def __len__(self):
+        return len(self.__samples)
+
+    def __contains__(self, key):
+        return key in self.__metadata.sample_indexes
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def _loaded(self) -> bool:
+        return any(sample is not None for sample in self.__samples)
+
+    def values_of(self, key: str) -> List[Any]:
+        """Returns the values of a FORMAT field for every sample, decoding only that field.
+
+        Parameters
+        ----------
+        key : str
+            FORMAT field, for example :code:`'DP'`.
+
+        Returns
+        -------
+        list
+            Values of the field, in the same order as the samples.
+        """
+        if key not in self.__source.format:
+            raise KeyError(key)
+        values = self.__source.values(key)
+        # Samples already accessed may have been modified
+        for i, sample in enumerate(self.__samples):
+            if sample is not None:
+                values[i] = sample.get(key)
+        return values
+
+    def format_array(self, key: str):
+        """Returns a :code:`numpy.ndarray` with the values of a FORMAT field for every sample, decoding only that field.
+        Requires :code:`numpy`.
+
+        Fields with :code:`Number=1` are returned as a 1D array, the rest (and GT) as a 2D array with one row per sample,
+        padded with missing values to the longest one. Integer fields (and GT alleles) are returned as :code:`int32`, with
+        :code:`-1` for missing values, and Float fields as :code:`float32`, with :code:`NaN` for missing values. Other
+        types are returned as :code:`object` arrays.
+
+        Parameters
+        ----------
+        key : str
+            FORMAT field, for example :code:`'DP'` or :code:`'GT'`.
+
+        Returns
+        -------
+        numpy.ndarray
+            Values of the field, in the same order as the samples.
+        """
+        from .private._numpy import format_array
+        value_type, number = self.__metadata.formats.get(key, UNDEFINED_FIELD)
+        return format_array(key, self.values_of(key), value_type, number)
 
 
 class VariantType(Enum):
@@ -126,7 +255,11 @@ class VariantRecord():
     alt_sv_shorthand: Optional[ShorthandSVRecord]
     """Shorthand SV info, present only for SVs with shorthand notation. For example, :code:`<DUP:TANDEM>`"""
 
-    def __init__(self, rec: pysam.VariantRecord, contig: str, pos: int, end: int,
+    __slots__ = ('_rec', 'contig', 'pos', 'end', 'length', 'id', 'ref', 'alt', 'variant_type',
+                 'alt_sv_breakend', 'alt_sv_shorthand', '_qual', '_filter', '_info', '_format', '_samples',
+                 '_raw', '_metadata', '_split', '_fields')
+
+    def __init__(self, rec: Optional[pysam.VariantRecord], contig: str, pos: int, end: int,
                  length: int, id: Optional[str], ref: str,
                  alt: str, variant_type: VariantType,
                  alt_sv_breakend: Optional[BreakendSVRecord] = None,
@@ -139,21 +272,53 @@ class VariantRecord():
         self.id = id
         self.ref = ref
         self.alt = alt
-        self.qual = rec.qual
-        self.filter = _build_filter(rec)
         self.variant_type = variant_type
         self.alt_sv_breakend = alt_sv_breakend
         self.alt_sv_shorthand = alt_sv_shorthand
 
+        self._qual = _UNSET
+        self._filter = None
         self._info = None
         self._format = None
         self._samples = None
+        # INFO, FORMAT and sample columns of detached records, decoded with the header metadata
+        self._raw = None
+        self._metadata = None
+        # Samples of the multiallelic record and index of the allele, split when accessed
+        self._split = None
+        # INFO and FORMAT keys (ordered dicts) decoded from the pysam record, shared by all the records of an extraction
+        self._fields = None
+
+    @property
+    def qual(self):
+        """Quality score for the assertion made in ALT"""
+        if self._qual is _UNSET:
+            self._qual = self._rec.qual if self._rec is not None else None
+        return self._qual
+
+    @qual.setter
+    def qual(self, value):
+        self._qual = value
+
+    @property
+    def filter(self):
+        """Filter status. PASS if this position has passed all filters. Otherwise, it contains the filters that failed"""
+        if self._filter is None:
+            self._filter = _build_filter(self._rec) if self._rec is not None else []
+        return self._filter
+
+    @filter.setter
+    def filter(self, value):
+        self._filter = value
 
     @property
     def info(self):
         """Additional information"""
         if self._info is None:
-            self._info = _build_info(self._rec)
+            if self._rec is not None:
+                self._info = _build_info(self._rec, self._info_keys())
+            else:
+                self._info = decode_info(self._raw_columns()[0], self._metadata) if self._raw is not None else {}
         return self._info
 
     @info.setter
@@ -164,7 +329,11 @@ class VariantRecord():
     def format(self):
         """Specifies data types and order of the genotype information"""
         if self._format is None:
-            self._format = _build_format(self._rec)
+            if self._rec is not None:
+                self._format = _build_format(self._rec, self._format_keys())
+            else:
+                raw_columns = self._raw_columns()
+                self._format = decode_format(raw_columns[1]) if len(raw_columns) > 1 else []
         return self._format
 
     @format.setter
@@ -173,24 +342,169 @@ class VariantRecord():
 
     @property
     def samples(self):
-        """Genotype information for each sample"""
+        """Genotype information for each sample. Unless replaced, it is a :class:`SamplesView` that only decodes the
+        samples that are accessed"""
         if self._samples is None:
-            self._samples = _build_samples(self._rec)
+            if self._split is not None:
+                split_samples, index = self._split
+                self._samples = SamplesView(split_samples.allele(index), split_samples.metadata)
+            elif self._rec is not None:
+                self._samples = SamplesView(_RecordSamples(self._rec, self._format_keys()),
+                                            header_metadata(self._rec.header))
+            elif self._metadata is not None:
+                raw_columns = self._raw_columns()
+                self._samples = SamplesView(_TextSamples(raw_columns[1] if len(raw_columns) > 1 else '.', raw_columns[2:],
+                                                         self._metadata), self._metadata)
+            else:
+                self._samples = {}
         return self._samples
 
     @samples.setter
     def samples(self, value):
         self._samples = value
 
+    def format_array(self, key: str):
+        """Returns a :code:`numpy.ndarray` with the values of a FORMAT field for every sample, decoding only that field.
+        Requires :code:`numpy`. See :meth:`SamplesView.format_array`.
+
+        Parameters
+        ----------
+        key : str
+            FORMAT field, for example :code:`'DP'` or :code:`'GT'`.
+
+        Returns
+        -------
+        numpy.ndarray
+            Values of the field, in the same order as the samples.
+        """
+        samples = self.samples
+        if isinstance(samples, SamplesView):
+            return samples.format_array(key)
+        # Samples replaced by the user
+        from .private._numpy import format_array
+        metadata = self._metadata if self._rec is None else header_metadata(self._rec.header)
+        value_type, number = metadata.formats.get(key, UNDEFINED_FIELD) if metadata is not None else UNDEFINED_FIELD
+        return format_array(key, [sample[key] for sample in samples.values()], value_type, number)
+
+    def _info_keys(self):
+        return self._fields[0] if self._fields is not None else None
+
+    def _format_keys(self):
+        return self._fields[1] if self._fields is not None else None
+
+    def _info_value(self, key: str, default=None):
+        # Reads a single INFO field without decoding the rest
+        if self._info is not None:
+            return self._info.get(key, default)
+        info_keys = self._info_keys()
+        if info_keys is not None and key not in info_keys:
+            return default
+        if self._rec is not None:
+            # pysam get() raises for fields not defined in the header
+            rec_info = self._rec.info
+            return rec_info[key] if key in rec_info else default
+        if self._raw is not None:
+            return decode_info_value(self._raw.partition('\t')[0], key, self._metadata, default)
+        return default
+
+    def _samples_loaded(self) -> bool:
+        # Whether the samples have been decoded (and maybe modified), so that they cannot be taken from the text
+        return self._samples is not None and (not isinstance(self._samples, SamplesView) or self._samples._loaded())
+
+    def _tail_unchanged(self) -> bool:
+        # Whether the INFO, FORMAT and sample columns are the same as in the original line
+        return self._info is None and self._format is None and self._split is None and self._fields is None and \
+            not self._samples_loaded() and (self._rec is not None or self._raw is not None)
+
+    def _raw_columns(self) -> List[str]:
+        return self._raw.split('\t') if self._raw is not None else []
+
+    def _clone(self) -> 'VariantRecord':
+        new_record = VariantRecord.__new__(VariantRecord)
+        for slot in VariantRecord.__slots__:
+            setattr(new_record, slot, getattr(self, slot))
+        return new_record
+
     def _replace(self, **kwargs):
-        new_record = VariantRecord(self._rec, self.contig, self.pos, self.end,
-                                   self.length, self.id, self.ref, self.alt,
-                                   self.variant_type, self.alt_sv_breakend,
-                                   self.alt_sv_shorthand)
+        new_record = self._clone()
+        # Derived fields are rebuilt from the pysam record, detached records keep them since they are their only source
+        if self._rec is not None:
+            new_record._qual = _UNSET
+            new_record._filter = None
+            new_record._info = None
+            new_record._format = None
+            new_record._samples = None
         for key, value in kwargs.items():
             setattr(new_record, key, value)
         return new_record
 
+    def detach(self):
+        """Captures the fields of the underlying :code:`pysam.VariantRecord` and releases it, so that long-lived records do
+        not keep the htslib buffers alive. The INFO, FORMAT and sample columns are kept as text and decoded when accessed.
+        """
+        if self._rec is not None:
+            self._detach(header_metadata(self._rec.header))
+
+    def _detach(self, metadata: HeaderMetadata):
+        if self._rec is None:
+            return
+        rec = self._rec
+        info_keys = self._info_keys()
+        format_keys = self._format_keys()
+        self._qual = self.qual
+        self._filter = self.filter
+        split = self._split
+        self._split = None
+        if split is not None and self._samples_loaded():
+            self._samples = dict(self._samples)
+            split = None
+        elif not self._samples_loaded():
+            # The text is decoded again when needed
+            self._samples = None
+        elif isinstance(self._samples, SamplesView):
+            self._samples = dict(self._samples)
+        columns = str(rec).rstrip('\n').split('\t')[7:]
+        # Fields already loaded are kept as Python values, the rest are kept as text
+        if info_keys is not None:
+            if self._info is not None:
+                self._info = {key: value for key, value in self._info.items() if key in info_keys}
+            elif columns:
+                columns[0] = project_info(columns[0], info_keys)
+        if format_keys is not None:
+            if self._format is not None or self._samples is not None:
+                self._format = [key for key in self.format if key in format_keys]
+                samples = self.samples
+                self._samples = {sample_name: {key: samples[sample_name][key] for key in self._format}
+                                 for sample_name in samples}
+                columns = columns[:1]
+            elif len(columns) > 1:
+                columns[1], columns[2:] = project_samples(columns[1], columns[2:], format_keys)
+        self._raw = '\t'.join(columns) if columns else None
+        if split is not None:
+            # The samples of the allele are split from the text again when accessed
+            self._split = (TextSplitSamples(columns[1] if len(columns) > 1 else '.', columns[2:], len(rec.alts),
+                                            metadata), split[1])
+        self._metadata = metadata
+        self._rec = None
+        # The text only contains the projected fields
+        self._fields = None
+
+    def __reduce__(self):
+        # pysam records cannot be pickled, so a detached copy is pickled. Plain tuples keep pickling cheap
+        record = self
+        if self._rec is not None:
+            record = self._clone()
+            record.detach()
+        return (_restore_record, (record.contig, record.pos, record.end, record.length, record.id, record.ref,
+                                  record.alt, record.variant_type.value,
+                                  tuple(record.alt_sv_breakend) if record.alt_sv_breakend is not None else None,
+                                  tuple(record.alt_sv_shorthand) if record.alt_sv_shorthand is not None else None,
+                                  record._qual, record._filter, record._info, record._format,
+                                  # The alleles of multiallelic records without a pysam record have their samples split
+                                  dict(record.samples) if record._split is not None else
+                                  record._samples if record._samples_loaded() else None,
+                                  record._raw, record._metadata))
+
     def _info_str(self, rec_str: List[str]) -> str:
         # If info has not been loaded, return the original info string
         if self._info is None and len(rec_str) > 7:
@@ -214,23 +528,55 @@ class VariantRecord():
 
     def _samples_str(self, rec_str: List[str]) -> str:
         # If samples and format have not been loaded, return the original samples string
-        if self._samples is None and self._format is None and len(rec_str) > 9:
+        if not self._samples_loaded() and self._format is None and self._split is None and len(rec_str) > 9:
             return '\t'.join(rec_str[9:])
         samples_list = [":".join([_convert_sample_value(k, self.samples[sample_name][k])
                                  for k in self.format]) for sample_name in self.samples]
         samples = "\t".join(samples_list)
         return samples
 
+    def __projected_columns(self, columns: List[str]) -> List[str]:
+        # INFO, FORMAT and sample columns of the pysam record with only the requested fields
+        columns[-1] = columns[-1].rstrip('\n')
+        info_keys, format_keys = self._fields
+        if info_keys is not None and columns:
+            columns[0] = project_info(columns[0], info_keys)
+        if format_keys is not None and len(columns) > 1:
+            columns[1], columns[2:] = project_samples(columns[1], columns[2:], format_keys)
+        return columns
+
     def __str__(self):
-        rec_str_split = str(self._rec).split('\t')
-        contig = self.contig
-        pos = self.pos
         id_ = self.id if self.id else '.'
-        ref = self.ref
-        alt = self.alt
         qual = _str_value(self.qual)
         filter_ = ";".join(map(str, self.filter)) if self.filter else '.'
+        head = f'{self.contig}\t{self.pos}\t{id_}\t{self.ref}\t{self.alt}\t{qual}\t{filter_}'
+        if self._tail_unchanged():
+            # The INFO, FORMAT and sample columns are copied as a single string
+            tail = str(self._rec).split('\t', 7)[7] if self._rec is not None else self._raw
+            return f'{head}\t{tail}'.strip()
+        if self._rec is not None:
+            rec_str_split = str(self._rec).split('\t')
+            if self._fields is not None:
+                rec_str_split[7:] = self.__projected_columns(rec_str_split[7:])
+        else:
+            # Only the columns from INFO onwards are used
+            rec_str_split = [''] * 7 + self._raw_columns()
         info = self._info_str(rec_str_split)
         format_ = self._format_str(rec_str_split)
         samples = self._samples_str(rec_str_split)
-        return f'{contig}\t{pos}\t{id_}\t{ref}\t{alt}\t{qual}\t{filter_}\t{info}\t{format_}\t{samples}'.strip()
+        return f'{head}\t{info}\t{format_}\t{samples}'.strip()
+
+
+def _restore_record(contig, pos, end, length, id, ref, alt, variant_type, alt_sv_breakend, alt_sv_shorthand,
+                    qual, filter, info, format, samples, raw, metadata) -> VariantRecord:
+    variant_record = VariantRecord(None, contig, pos, end, length, id, ref, alt, VariantType(variant_type),
+                                   BreakendSVRecord(*alt_sv_breakend) if alt_sv_breakend is not None else None,
+                                   ShorthandSVRecord(*alt_sv_shorthand) if alt_sv_shorthand is not None else None)
+    variant_record._qual = qual
+    variant_record._filter = filter
+    variant_record._info = info
+    variant_record._format = format
+    variant_record._samples = samples
+    variant_record._raw = raw
+    variant_record._metadata = metadata
+    return variant_record
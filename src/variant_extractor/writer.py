@@ -0,0 +1,207 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from typing import Iterable, Optional
+
+import pysam
+
+from .variants import VariantRecord, _UNSET
+
+# Size (in characters) of the blocks of VCF text written at once
+WRITER_BUFFER_SIZE = 4 * 1024 * 1024
+OUTPUT_FORMATS = ('vcf', 'vcf.gz', 'bcf')
+
+
+def _output_format(path: str) -> str:
+    if path.endswith('.bcf'):
+        return 'bcf'
+    if path.endswith('.gz') or path.endswith('.bgz'):
+        return 'vcf.gz'
+    return 'vcf'
+
+
+def _same_core(variant_record: VariantRecord, rec: pysam.VariantRecord) -> bool:
+    # Whether the first columns of the record are the same as in its pysam.VariantRecord
+    alts = rec.alts
+    return variant_record.contig == rec.contig and variant_record.pos == rec.pos and \
+        variant_record.ref == rec.ref and alts is not None and len(alts) == 1 and variant_record.alt == alts[0] and \
+        (variant_record.id or None) == rec.id and \
+        (variant_record._qual is _UNSET or variant_record._qual == rec.qual) and \
+        (variant_record._filter is None or variant_record._filter == list(rec.filter))
+
+
+def _original_end(variant_record: VariantRecord) -> Optional[int]:
+    # END of the INFO column of the original line, if any
+    rec = variant_record._rec
+    if rec is not None:
+        return rec.stop if rec.stop != rec.start + len(rec.ref) else None
+    if variant_record._raw is not None:
+        for entry in variant_record._raw.partition('\t')[0].split(';'):
+            if entry.startswith('END='):
+                return int(entry[4:])
+    return None
+
+
+def _sample_value(value, number, n_alleles: int):
+    # A missing value of a field with several values is read as a single None, but htslib only encodes all of them
+    if not isinstance(value, tuple) or len(value) != 1 or value[0] is not None:
+        return value
+    if number == 'A':
+        count = n_alleles - 1
+    elif number == 'R':
+        count = n_alleles
+    elif number == 'G':
+        # Diploid genotypes
+        count = n_alleles * (n_alleles + 1) // 2
+    elif isinstance(number, int):
+        count = number
+    else:
+        return value
+    return (None,) * count
+
+
+class VariantWriter:
+    """Writes :class:`~variant_extractor.variants.VariantRecord` objects to a plain VCF, bgzipped VCF or BCF file.
+
+    VCF lines are the same as :code:`str(variant_record)`. The INFO, FORMAT and sample columns that have not been
+    accessed are copied from the original line as a single string, and the lines are written in large blocks. BCF
+    records are encoded by htslib from the :code:`pysam.VariantRecord` of each variant, which is only copied if any of
+    its fields changed. Variants whose INFO, FORMAT or samples were accessed (or detached variants) are encoded from
+    their Python values.
+    """
+
+    def __init__(self, path: str, header: pysam.VariantHeader, output_format: Optional[str] = None,
+                 buffer_size=WRITER_BUFFER_SIZE):
+        """
+        Parameters
+        ----------
+        path : str
+            Output file.
+        header : pysam.VariantHeader
+            Header of the output file, for example :attr:`VariantExtractor.header`. BCF output requires the INFO and
+            FORMAT fields of the variants to match their definition in it. The variants split from a multiallelic record
+            keep the INFO fields of the original line, so Number=A, R or G INFO fields cannot be written to BCF, nor
+            genotypes with other ALT alleles of the original line.
+        output_format : str, optional
+            One of :code:`'vcf'`, :code:`'vcf.gz'` (bgzipped VCF) or :code:`'bcf'`. By default, it is inferred from the
+            extension of :code:`path`.
+        buffer_size : int, optional
+            Number of characters of VCF text buffered before writing them to the file.
+        """
+        self.__format = output_format if output_format is not None else _output_format(path)
+        if self.__format not in OUTPUT_FORMATS:
+            raise ValueError(f'Invalid output format {self.__format}, must be one of {", ".join(OUTPUT_FORMATS)}')
+        self.__header = header
+        self.__buffer_size = buffer_size
+        self.__buffer = []
+        self.__buffered = 0
+        self.__variant_file = None
+        self.__file = None
+        if self.__format == 'bcf':
+            self.__variant_file = pysam.VariantFile(path, 'wb', header=header)
+        else:
+            self.__file = pysam.BGZFile(path, 'wb') if self.__format == 'vcf.gz' else open(path, 'wb')
+            self.__buffer.append(str(header))
+
+    def write(self, variant_record: VariantRecord):
+        """Writes a variant.
+
+        Parameters
+        ----------
+        variant_record : VariantRecord
+            Variant to write.
+        """
+        if self.__variant_file is not None:
+            self.__variant_file.write(self.__pysam_record(variant_record))
+        else:
+            self._write_line(str(variant_record) + '\n')
+
+    def _write_line(self, line: str):
+        # Writes a line of VCF text, not available for BCF output
+        self.__buffer.append(line)
+        self.__buffered += len(line)
+        if self.__buffered >= self.__buffer_size:
+            self.__flush()
+
+    def write_all(self, variant_records: Iterable[VariantRecord]):
+        """Writes all the variants of an iterable, for example a :class:`VariantExtractor`.
+
+        Parameters
+        ----------
+        variant_records : Iterable[VariantRecord]
+            Variants to write.
+        """
+        for variant_record in variant_records:
+            self.write(variant_record)
+
+    def close(self):
+        """Writes the buffered variants and closes the file.
+        """
+        if self.__variant_file is not None:
+            self.__variant_file.close()
+        elif self.__file is not None:
+            self.__flush()
+            self.__file.close()
+            self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __flush(self):
+        self.__file.write(''.join(self.__buffer).encode())
+        self.__buffer = []
+        self.__buffered = 0
+
+    def __pysam_record(self, variant_record: VariantRecord) -> pysam.VariantRecord:
+        rec = variant_record._rec
+        if rec is None or not variant_record._tail_unchanged():
+            return self.__new_record(variant_record)
+        if _same_core(variant_record, rec):
+            return rec
+        new_rec = rec.copy()
+        end = _original_end(variant_record)
+        new_rec.contig = variant_record.contig
+        new_rec.pos = variant_record.pos
+        new_rec.id = variant_record.id
+        # htslib recomputes END when the alleles change
+        new_rec.alleles = (variant_record.ref, variant_record.alt)
+        if end is not None:
+            new_rec.stop = end
+        new_rec.qual = variant_record.qual
+        if variant_record._filter is not None:
+            new_rec.filter.clear()
+            for filter_ in variant_record._filter:
+                new_rec.filter.add(filter_)
+        return new_rec
+
+    def __new_record(self, variant_record: VariantRecord) -> pysam.VariantRecord:
+        # Encodes the Python values of the record, decoding them in a copy so that the record is not modified
+        loaded_samples = variant_record._samples_loaded()
+        loaded_info = variant_record._info is not None
+        variant_record = variant_record._clone()
+        if not loaded_samples:
+            variant_record._samples = None
+        if variant_record.alt_sv_shorthand:
+            end = variant_record.end
+        else:
+            # As in str(), the END of the original line is only kept if the INFO column was not loaded
+            end = None if loaded_info else _original_end(variant_record)
+        try:
+            new_rec = self.__header.new_record(contig=variant_record.contig, start=variant_record.pos - 1,
+                                               alleles=(variant_record.ref, variant_record.alt), id=variant_record.id,
+                                               qual=variant_record.qual, filter=variant_record.filter,
+                                               info=variant_record.info)
+            if end is not None and 'END' in self.__header.info:
+                new_rec.stop = end
+            formats = self.__header.formats
+            for sample_name, sample in variant_record.samples.items():
+                new_sample = new_rec.samples[sample_name]
+                for key in variant_record.format:
+                    new_sample[key] = _sample_value(sample[key], formats[key].number, 2)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f'Variant {variant_record.contig}:{variant_record.pos} cannot be encoded with the header '
+                             f'of the output file: {e}') from e
+        return new_rec
@@ -0,0 +1,68 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import pytest
+
+from variant_extractor import VariantExtractor
+
+HEADER = '''##fileformat=VCFv4.2
+##contig=<ID=1,length=1000000>
+##contig=<ID=2,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=IMPRECISE,Number=0,Type=Flag,Description="Imprecise SV">
+##INFO=<ID=CIPOS,Number=2,Type=Integer,Description="Confidence interval around POS">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+'''
+
+PAIRS = [
+    # Imprecise mate further than any fixed slack from the position in the ALT field
+    '1\t100\tb1\tA\tA[1:5000[\t.\tPASS\tSVTYPE=BND;MATEID=b2',
+    '1\t6500\tb2\tC\t]1:100]C\t.\tPASS\tSVTYPE=BND;MATEID=b1;IMPRECISE;CIPOS=-2000,2000',
+    # Precise pair with MATEID
+    '1\t7000\tp1\tG\tG]2:300]\t.\tPASS\tSVTYPE=BND;MATEID=p2',
+    '1\t8000\tsnv\tA\tT\t.\tPASS\t.',
+    # Pair without MATEID, paired by position
+    '1\t9000\tq1\tT\t]1:12000]T\t.\tPASS\tSVTYPE=BND',
+    '1\t12000\tq2\tT\tT[1:9000[\t.\tPASS\tSVTYPE=BND',
+    '2\t300\tp2\tT\tT]1:7000]\t.\tPASS\tSVTYPE=BND;MATEID=p1',
+    # Imprecise mate on another contig, before the position in its ALT field
+    '2\t400\tc1\tA\tA[2:9000[\t.\tPASS\tSVTYPE=BND;MATEID=c2',
+    '2\t9800\tc2\tG\t]2:400]G\t.\tPASS\tSVTYPE=BND;MATEID=c1;IMPRECISE;CIPOS=-1000,1000',
+]
+
+
+def _write(tmp_path, lines):
+    vcf_file = tmp_path / 'sorted.vcf'
+    vcf_file.write_text(HEADER + '\n'.join(lines) + '\n')
+    return str(vcf_file)
+
+
+def _extract(vcf_file, **kwargs):
+    extractor = VariantExtractor(vcf_file, **kwargs)
+    variants = [str(variant_record) for variant_record in extractor]
+    extractor.close()
+    return variants
+
+
+@pytest.mark.parametrize('ensure_pairs', [True, False])
+def test_same_output_as_default(tmp_path, ensure_pairs):
+    vcf_file = _write(tmp_path, PAIRS)
+    expected = _extract(vcf_file, ensure_pairs=ensure_pairs)
+    assert len(expected) == 5
+    assert _extract(vcf_file, ensure_pairs=ensure_pairs, assume_sorted=True) == expected
+
+
+def test_same_output_as_default_with_spilled_breakends(tmp_path):
+    vcf_file = _write(tmp_path, PAIRS)
+    assert _extract(vcf_file, assume_sorted=True, max_pending_breakends=1) == _extract(vcf_file)
+
+
+def test_unpaired_breakend_without_mate_id_expires(tmp_path):
+    # The mate of u1 would be at 1:200, which has been passed when 1:300 is read
+    vcf_file = _write(tmp_path, [
+        '1\t100\tu1\tA\tA[1:200[\t.\tPASS\tSVTYPE=BND',
+        '1\t300\tsnv\tA\tT\t.\tPASS\t.',
+    ])
+    variants = _extract(vcf_file, ensure_pairs=False, assume_sorted=True)
+    assert sorted(variants) == sorted(_extract(vcf_file, ensure_pairs=False))
@@ -0,0 +1,107 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from variant_extractor import VariantExtractor  # noqa: E402
+from variant_extractor.batch import extract_many  # noqa: E402
+
+HEADER = '''##fileformat=VCFv4.2
+##contig=<ID=chr1,length=1000000>
+##contig=<ID=chr2,length=1000000>
+##contig=<ID=chrX,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+'''
+
+VCFS = {
+    'a': HEADER + '''chr1\t100\ta1\tA\tT\t.\tPASS\tDP=10
+chr1\t200\ta2\tAC\tA\t.\tPASS\tDP=20
+chr1\t300\ta3\tA\tA[chr2:500[\t.\tPASS\tSVTYPE=BND;MATEID=a4
+chr2\t500\ta4\tC\t]chr1:300]C\t.\tPASS\tSVTYPE=BND;MATEID=a3
+''',
+    'b': HEADER + '''chr2\t100\tb1\tG\tGTTT\t.\tPASS\tDP=5
+chrX\t1000\tb2\tT\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=5000
+chrX\t2000\tb3\tC\tA,G\t.\tPASS\t.
+''',
+    # Unpaired breakend, the extraction fails with ensure_pairs
+    'unpaired': HEADER + '''chr1\t100\tu1\tA\tT\t.\tPASS\t.
+chr1\t300\tu2\tA\tA[chr2:500[\t.\tPASS\tSVTYPE=BND;MATEID=u3
+chr1\t400\tu4\tA\tA[chr2:600[\t.\tPASS\tSVTYPE=BND;MATEID=u5
+chr2\t600\tu5\tC\t]chr1:400]C\t.\tPASS\tSVTYPE=BND;MATEID=u4
+''',
+}
+
+CATEGORICAL_COLUMNS = ['start_chrom', 'end_chrom', 'ref', 'alt', 'brackets', 'type_inferred']
+
+
+@pytest.fixture
+def vcf_files(tmp_path):
+    files = {}
+    for name, vcf in VCFS.items():
+        path = tmp_path / f'{name}.vcf'
+        path.write_text(vcf)
+        files[name] = str(path)
+    files['missing'] = str(tmp_path / 'missing.vcf')
+    return files
+
+
+def _dataframe(vcf_file):
+    return VariantExtractor(vcf_file).to_dataframe(extra_fields=['id'], info_fields=['DP'])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_batch_is_the_extraction_of_each_file(vcf_files, workers):
+    names = ['a', 'unpaired', 'b', 'missing']
+    result = extract_many([vcf_files[name] for name in names], workers=workers, sources=names, extra_fields=['id'],
+                          info_fields=['DP'])
+    df = result.table
+    assert list(df.columns) == ['source'] + list(_dataframe(vcf_files['a']).columns)
+    assert list(df['source'].cat.categories) == names
+    expected = {name: _dataframe(vcf_files[name]) for name in ('a', 'b')}
+    assert list(df['source']) == ['a'] * len(expected['a']) + ['b'] * len(expected['b'])
+    for name, expected_df in expected.items():
+        file_df = df[df['source'] == name].drop(columns='source').reset_index(drop=True)
+        pd.testing.assert_frame_equal(file_df, expected_df, check_dtype=False, check_categorical=False)
+    # The categories are the union of the categories of each file
+    for column in CATEGORICAL_COLUMNS:
+        assert list(df[column].cat.categories) == \
+            sorted(set().union(*(expected_df[column].cat.categories for expected_df in expected.values())))
+    assert [(report.source, report.variants) for report in result.reports] == \
+        [('a', len(expected['a'])), ('unpaired', 0), ('b', len(expected['b'])), ('missing', 0)]
+    assert [report.source for report in result.failed] == ['unpaired', 'missing']
+    assert result.failed[0].error.startswith('Exception: There are 1 unpaired SV breakends')
+    assert 'missing.vcf' in result.failed[1].error
+
+
+def test_batch_options_are_passed_to_the_extraction(vcf_files):
+    result = extract_many([vcf_files['unpaired'], vcf_files['a']], sources=['u', 'u'], ensure_pairs=False)
+    assert result.failed == []
+    df = result.table
+    # Files with the same label share it
+    assert list(df['source'].cat.categories) == ['u']
+    expected = pd.concat([VariantExtractor(vcf_files[name], ensure_pairs=False).to_dataframe()
+                          for name in ('unpaired', 'a')], ignore_index=True)
+    pd.testing.assert_frame_equal(df.drop(columns='source'), expected, check_dtype=False, check_categorical=False)
+
+
+def test_batch_arrow_is_the_dataframe(vcf_files):
+    pytest.importorskip('pyarrow')
+    names = ['a', 'missing', 'b']
+    kwargs = {'sources': names, 'extra_fields': ['id'], 'info_fields': ['DP']}
+    df = extract_many([vcf_files[name] for name in names], **kwargs).table
+    table = extract_many([vcf_files[name] for name in names], output='arrow', **kwargs).table
+    assert table.column_names == list(df.columns)
+    pd.testing.assert_frame_equal(table.to_pandas(), df, check_dtype=False, check_categorical=False)
+
+
+def test_batch_invalid_arguments(vcf_files):
+    with pytest.raises(ValueError, match='Invalid output'):
+        extract_many([vcf_files['a']], output='csv')
+    with pytest.raises(ValueError, match='same length'):
+        extract_many([vcf_files['a']], sources=['a', 'b'])
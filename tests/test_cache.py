@@ -0,0 +1,90 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import os
+import pickle
+
+import pytest
+
+from variant_extractor import VariantExtractor
+from variant_extractor.cache import ExtractionCache
+
+VCF = '''##fileformat=VCFv4.2
+##contig=<ID=1,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2
+1\t100\tsnv\tA\tT\t30.5\tPASS\tAF=0.5\tGT:AD\t0/1:10,5\t0/0:12,0
+1\t200\tma\tC\tG,CTT\t.\tPASS\tAF=0.25,0.5\tGT:AD\t1/2:3,4,5\t0/1:6,7,0
+1\t300\tb1\tA\tA[1:5000[\t.\tLowQual\tSVTYPE=BND;MATEID=b2\tGT:AD\t0/1:1,2\t0/1:3,4
+1\t1000\tdel\tG\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=2000\tGT:AD\t0/1:5,5\t./.:.
+1\t5000\tb2\tC\t]1:300]C\t.\tLowQual\tSVTYPE=BND;MATEID=b1\tGT:AD\t0/1:1,2\t0/1:3,4
+'''
+
+
+@pytest.fixture
+def vcf_file(tmp_path):
+    path = tmp_path / 'variants.vcf'
+    path.write_text(VCF)
+    return str(path)
+
+
+def _variants(vcf_file, **kwargs):
+    extractor = VariantExtractor(vcf_file, **kwargs)
+    variants = list(extractor)
+    extractor.close()
+    return variants
+
+
+def test_cached_variants_are_the_extracted_ones(vcf_file, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    expected = _variants(vcf_file)
+    assert [str(v) for v in _variants(vcf_file, cache_dir=cache_dir)] == [str(v) for v in expected]
+    cached = _variants(vcf_file, cache_dir=cache_dir)
+    assert len(ExtractionCache(cache_dir).entries()) == 1
+    assert [str(v) for v in cached] == [str(v) for v in expected]
+    for variant_record, expected_record in zip(cached, expected):
+        assert variant_record.qual == expected_record.qual
+        assert variant_record.filter == expected_record.filter
+        assert variant_record.info == expected_record.info
+        assert dict(variant_record.samples) == dict(expected_record.samples)
+        # The alleles of multiallelic records keep their split samples when pickled
+        assert str(pickle.loads(pickle.dumps(variant_record))) == str(expected_record)
+
+
+def test_cached_dataframe_is_the_extracted_one(vcf_file, tmp_path):
+    pytest.importorskip('pandas')
+    cache_dir = str(tmp_path / 'cache')
+    expected = VariantExtractor(vcf_file).to_dataframe()
+    VariantExtractor(vcf_file, cache_dir=cache_dir).to_dataframe()
+    df = VariantExtractor(vcf_file, cache_dir=cache_dir).to_dataframe()
+    assert df.equals(expected)
+    assert (df.dtypes == expected.dtypes).all()
+
+
+def test_invalid_entries_are_not_loaded(vcf_file, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    expected = [str(v) for v in _variants(vcf_file)]
+    _variants(vcf_file, cache_dir=cache_dir)
+    entry_key = ExtractionCache(cache_dir).entries()[0]['key']
+    entry_file = [name for name in os.listdir(cache_dir) if name.startswith(entry_key) and
+                  not name.endswith('.json')][0]
+    # A pickle is never loaded, even if it has the name of an entry
+    with open(os.path.join(cache_dir, entry_file), 'wb') as entry:
+        pickle.dump(['not', 'an', 'entry'], entry)
+    cache = ExtractionCache(cache_dir)
+    assert cache.load(entry_key, None) is None
+    assert cache.load_columns(entry_key) is None
+    assert [str(v) for v in _variants(vcf_file, cache_dir=cache_dir)] == expected
+
+
+def test_incomplete_iterations_are_not_stored(vcf_file, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    iterator = iter(VariantExtractor(vcf_file, cache_dir=cache_dir))
+    next(iterator)
+    del iterator
+    assert ExtractionCache(cache_dir).entries() == []
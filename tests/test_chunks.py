@@ -0,0 +1,78 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import random
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from pandas.api.types import union_categoricals  # noqa: E402
+
+from variant_extractor import VariantExtractor  # noqa: E402
+
+HEADER = '''##fileformat=VCFv4.2
+##contig=<ID=chr1,length=1000000>
+##contig=<ID=chr2,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+'''
+
+
+def _vcf_file(tmp_path):
+    rng = random.Random(0)
+    lines = []
+    for i in range(60):
+        pos = 100 + i * 100
+        ref = rng.choice('ACGT')
+        alt = ref + ''.join(rng.choice('ACGT') for _ in range(rng.randint(0, 5))) if i % 3 else \
+            rng.choice('ACGT'.replace(ref, ''))
+        lines.append(f'chr1\t{pos}\tv{i}\t{ref}\t{alt}\t.\tPASS\t.')
+        if i == 5:
+            # Breakend whose mate is read several chunks later
+            lines.append(f'chr1\t{pos + 1}\tb1\tA\tA[chr2:500[\t.\tPASS\tSVTYPE=BND;MATEID=b2')
+    lines.append('chr2\t500\tb2\tC\t]chr1:601]C\t.\tPASS\tSVTYPE=BND;MATEID=b1')
+    vcf_file = tmp_path / 'variants.vcf'
+    vcf_file.write_text(HEADER + '\n'.join(lines) + '\n')
+    return str(vcf_file)
+
+
+def test_concatenated_dataframes_are_the_dataframe(tmp_path):
+    vcf_file = _vcf_file(tmp_path)
+    expected = VariantExtractor(vcf_file).to_dataframe()
+    chunks = list(VariantExtractor(vcf_file).iter_dataframes(chunk_size=7))
+    assert len(chunks) > 5
+    assert sum(len(chunk) for chunk in chunks) == len(expected)
+    for chunk in chunks:
+        # Each DataFrame only has the REF and ALT values of its variants
+        for column in ('ref', 'alt'):
+            assert set(chunk[column].cat.categories) == set(chunk[column])
+    df = pd.concat(chunks, ignore_index=True)
+    for column in ('start_chrom', 'end_chrom', 'ref', 'alt', 'brackets', 'type_inferred'):
+        df[column] = union_categoricals([chunk[column] for chunk in chunks], sort_categories=True)
+        assert df[column].dtype == 'category'
+    for column in ('start', 'end', 'length'):
+        df[column] = df[column].astype(expected[column].dtype)
+    pd.testing.assert_frame_equal(df, expected, check_categorical=False)
+
+
+def test_record_batches_have_their_own_dictionaries(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    vcf_file = _vcf_file(tmp_path)
+    expected = VariantExtractor(vcf_file).to_dataframe()
+    batches = list(VariantExtractor(vcf_file).iter_record_batches(batch_size=7))
+    assert len(batches) > 5
+    for batch in batches:
+        for column in ('start_chrom', 'ref', 'alt', 'type_inferred'):
+            array = batch.column(column)
+            # Only the values of the batch, each one once
+            assert sorted(array.dictionary.to_pylist()) == sorted(set(array.to_pylist()))
+    parquet_file = str(tmp_path / 'variants.parquet')
+    VariantExtractor(vcf_file).write_parquet(parquet_file, row_group_size=7)
+    assert pq.ParquetFile(parquet_file).metadata.num_row_groups == len(batches)
+    for df in (pa.Table.from_batches(batches).to_pandas(), pq.read_table(parquet_file).to_pandas()):
+        for column in ('start', 'end', 'length'):
+            df[column] = df[column].astype(expected[column].dtype)
+        pd.testing.assert_frame_equal(df, expected, check_categorical=False)
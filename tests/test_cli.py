@@ -0,0 +1,77 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import pytest
+
+from variant_extractor import VariantExtractor
+from variant_extractor.cli import main
+
+VCF = '''##fileformat=VCFv4.2
+##contig=<ID=chr1,length=1000000>
+##contig=<ID=chr2,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1
+chr1\t100\tsnv\tA\tT\t.\tPASS\t.\tGT\t0/1
+chr1\t200\t.\tA\tACGT\t.\tPASS\t.\tGT\t0/1
+chr1\t300\tmnv\tAC\tGT\t.\tPASS\t.\tGT\t1/1
+chr1\t1000\tdel\tG\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=5000\tGT\t0/1
+chr1\t10000\tb1\tA\tA[chr2:5000[\t.\tPASS\tSVTYPE=BND;MATEID=b2\tGT\t0/1
+chr2\t5000\tb2\tC\t]chr1:10000]C\t.\tPASS\tSVTYPE=BND;MATEID=b1\tGT\t0/1
+'''
+UNPAIRED = 'chr2\t9000\tb3\tC\t]chr1:20000]C\t.\tPASS\tSVTYPE=BND;MATEID=b4\tGT\t0/1\n'
+
+
+@pytest.fixture
+def vcf_file(tmp_path):
+    path = tmp_path / 'variants.vcf'
+    path.write_text(VCF)
+    return str(path)
+
+
+@pytest.mark.parametrize('command, separator', [('to-csv', ','), ('to-tsv', '\t')])
+def test_delimited_output_is_the_dataframe(vcf_file, tmp_path, command, separator):
+    pytest.importorskip('pandas')
+    output_file = tmp_path / 'variants.txt'
+    main([command, vcf_file, str(output_file), '-i', 'SVTYPE'])
+    df = VariantExtractor(vcf_file).to_dataframe(extra_fields=['id'], info_fields=['SVTYPE'])
+    assert output_file.read_text() == df.to_csv(index=False, sep=separator)
+
+
+def test_parquet_output_has_the_columns_of_the_csv(vcf_file, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    main(['to-csv', vcf_file, str(tmp_path / 'variants.csv'), '-i', 'SVTYPE'])
+    main(['to-parquet', vcf_file, str(tmp_path / 'variants.parquet'), '-i', 'SVTYPE'])
+    header = (tmp_path / 'variants.csv').read_text().split('\n', 1)[0]
+    assert pq.read_schema(str(tmp_path / 'variants.parquet')).names == header.split(',')
+
+
+def test_split_by_type(vcf_file, tmp_path, capsys):
+    prefix = str(tmp_path / 'split')
+    main(['split-by-type', vcf_file, prefix])
+    expected = {}
+    for variant_record in VariantExtractor(vcf_file):
+        expected.setdefault(variant_record.variant_type.name, []).append(str(variant_record))
+    assert 'Written 6 variants' in capsys.readouterr().err
+    for variant_type, variants in expected.items():
+        extractor = VariantExtractor(f'{prefix}.{variant_type}.vcf')
+        assert [str(variant_record) for variant_record in extractor] == variants
+        extractor.close()
+    assert sorted(path.name for path in tmp_path.glob('split.*')) == \
+        sorted(f'split.{variant_type}.vcf' for variant_type in expected)
+
+
+def test_extraction_errors_are_reported_in_one_line(tmp_path, capsys):
+    vcf_file = tmp_path / 'unpaired.vcf'
+    vcf_file.write_text(VCF + UNPAIRED)
+    with pytest.raises(SystemExit) as exit_info:
+        main(['to-csv', str(vcf_file), str(tmp_path / 'variants.csv')])
+    assert exit_info.value.code == 1
+    err = capsys.readouterr().err
+    assert err.startswith('variant-extractor to-csv: error: There are 1 unpaired SV breakends.')
+    assert err.count('\n') == 1
+    # The same file can be written ignoring the unpaired breakend
+    main(['to-csv', str(vcf_file), str(tmp_path / 'variants.csv'), '--allow-unpaired'])
+    assert len((tmp_path / 'variants.csv').read_text().splitlines()) == 1 + 7
@@ -0,0 +1,84 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from variant_extractor import VariantExtractor  # noqa: E402
+from variant_extractor.match import ALL_TYPES, match  # noqa: E402
+
+HEADER = '''##fileformat=VCFv4.2
+##contig=<ID=1,length=1000000>
+##contig=<ID=2,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+'''
+
+VARIANTS = [
+    '1\t100\tsnv\tA\tT\t.\tPASS\t.',
+    # Duplicated variant
+    '1\t100\tsnv_dup\tA\tT\t.\tPASS\t.',
+    '1\t200\tins\tA\tACGT\t.\tPASS\t.',
+    '1\t1000\tdel\tG\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=5000',
+    '1\t10000\tb1\tA\tA[2:5000[\t.\tPASS\tSVTYPE=BND;MATEID=b2',
+    '2\t5000\tb2\tC\t]1:10000]C\t.\tPASS\tSVTYPE=BND;MATEID=b1',
+]
+
+
+def _dataframe(tmp_path, name, lines):
+    vcf_file = tmp_path / f'{name}.vcf'
+    vcf_file.write_text(HEADER + '\n'.join(lines) + '\n')
+    extractor = VariantExtractor(str(vcf_file))
+    df = extractor.to_dataframe()
+    extractor.close()
+    return df
+
+
+def test_match_itself(tmp_path):
+    df = _dataframe(tmp_path, 'truth', VARIANTS)
+    assert len(df) == 5
+    result = match(df, df.copy())
+    assert result.truth_match.tolist() == list(range(len(df)))
+    assert result.test_match.tolist() == list(range(len(df)))
+    summary = result.summary
+    assert summary.loc[ALL_TYPES, 'tp'] == len(df)
+    assert summary['fp'].sum() == summary['fn'].sum() == 0
+    assert (summary[['precision', 'recall', 'f1']] == 1).all().all()
+
+
+def test_match_disjoint_sets(tmp_path):
+    truth = _dataframe(tmp_path, 'truth', VARIANTS)
+    # The same variants in other contigs
+    test = truth.assign(start_chrom='x' + truth['start_chrom'].astype(str),
+                        end_chrom='x' + truth['end_chrom'].astype(str))
+    result = match(truth, test)
+    assert (result.truth_match == -1).all()
+    assert (result.test_match == -1).all()
+    all_types = result.summary.loc[ALL_TYPES]
+    assert all_types['tp'] == 0
+    assert all_types['fp'] == len(test)
+    assert all_types['fn'] == len(truth)
+    assert all_types['precision'] == all_types['recall'] == 0
+
+
+def test_match_svs_within_window(tmp_path):
+    truth = _dataframe(tmp_path, 'truth', VARIANTS)
+    test = _dataframe(tmp_path, 'test', [
+        '1\t1200\tdel\tG\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=5300',
+        '1\t10600\tb1\tA\tA[2:5000[\t.\tPASS\tSVTYPE=BND;MATEID=b2',
+        '2\t5000\tb2\tC\t]1:10600]C\t.\tPASS\tSVTYPE=BND;MATEID=b1',
+    ])
+    result = match(truth, test, window=500)
+    # The deletion is within the window, the translocation is 600 bp away
+    assert result.test_match.tolist() == [truth.index[truth['type_inferred'] == 'DEL'][0], -1]
+    assert match(truth, test, window=600).test_match.tolist()[1] >= 0
+
+
+def test_match_missing_columns(tmp_path):
+    df = _dataframe(tmp_path, 'truth', VARIANTS)
+    with pytest.raises(ValueError, match='test_df is missing the columns brackets'):
+        match(df, df.drop(columns=['brackets']))
@@ -0,0 +1,112 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import pickle
+
+import pysam
+import pytest
+
+from variant_extractor import VariantExtractor
+
+VCF = '''##fileformat=VCFv4.2
+##contig=<ID=1,length=1000000>
+##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">
+##FORMAT=<ID=FA,Number=A,Type=Float,Description="Allele fractions">
+##FORMAT=<ID=PL,Number=G,Type=Integer,Description="Genotype likelihoods">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">
+##FORMAT=<ID=FT,Number=.,Type=String,Description="Filters">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2\tS3
+1\t100\tm1\tA\tT,G\t50\tPASS\tAF=0.1,0.2\tGT:AD:FA:PL:DP:FT\t1/2:3,4,5:0.1,0.2:0,1,2,3,4,5:12:a,b\t0/1:6,7,0:0.5,0:0,9,9,9,9,9:13:c\t./.:.:.:.:.:.
+1\t200\tm2\tAC\tAT,GC,A\t.\tPASS\tAF=0.1,0.2,0.3\tGT:AD:FA:PL:DP\t0/3:1,2,3,4:0.1,0.2,0.3:0,1,2,3,4,5,6,7,8,9:10\t1|2:5,6,7,8:0.4,0.5,0.6:9,8,7,6,5,4,3,2,1,0:26\t0/1
+1\t300\t.\tG\tGA,GAA\t.\tPASS\t.\tGT:AD\t1/1:0,9,1\t2/2:1,0,9\t0/0:5,0,0
+'''
+
+
+@pytest.fixture
+def vcf_file(tmp_path):
+    path = tmp_path / 'variants.vcf'
+    path.write_text(VCF)
+    return str(path)
+
+
+def _split_samples(rec, index):
+    # FORMAT fields of each sample for an ALT allele, sliced from the whole pysam record
+    n_alts = len(rec.alts)
+    samples = {}
+    for sample_name, sample in rec.samples.items():
+        allele_sample = {}
+        for key, value in sample.items():
+            if not hasattr(value, '__iter__') or len(value) == rec.header.formats[key].number:
+                allele_sample[key] = value
+            elif key == 'GT':
+                allele_sample[key] = (0, value[1])
+            elif len(value) == n_alts + 1:
+                allele_sample[key] = (value[0], value[index + 1])
+            elif len(value) % n_alts == 0:
+                allele_sample[key] = value[index::n_alts]
+            else:
+                allele_sample[key] = value
+        samples[sample_name] = allele_sample
+    return samples
+
+
+def _expected_samples(vcf_file):
+    # Samples of each variant, in the order of the serial extraction
+    expected = []
+    with pysam.VariantFile(vcf_file) as variant_file:
+        for rec in variant_file:
+            for index, alt in enumerate(rec.alts):
+                # Indels of the same allele are a single variant, each SNV of the REF is a different one
+                n_variants = sum(r != a for r, a in zip(rec.ref, alt)) if len(rec.ref) == len(alt) else 1
+                expected.extend([_split_samples(rec, index)] * n_variants)
+    return expected
+
+
+def _variants(vcf_file, **kwargs):
+    extractor = VariantExtractor(vcf_file, **kwargs)
+    variants = list(extractor)
+    extractor.close()
+    return variants
+
+
+@pytest.mark.parametrize('keep_raw', [True, False])
+def test_split_samples_are_the_allele_slices(vcf_file, keep_raw):
+    variants = _variants(vcf_file, keep_raw=keep_raw)
+    expected = _expected_samples(vcf_file)
+    assert [v.id for v in variants] == ['m1_0', 'm1_1', 'm2_0_1', 'm2_1_0', 'm2_2', None, None]
+    assert len(variants) == len(expected)
+    for variant_record, expected_samples in zip(variants, expected):
+        assert {sample_name: dict(sample) for sample_name, sample in variant_record.samples.items()} == \
+            expected_samples
+        # Pickled alleles keep their own samples
+        assert dict(pickle.loads(pickle.dumps(variant_record)).samples) == expected_samples
+
+
+@pytest.mark.parametrize('keep_raw', [True, False])
+def test_split_sample_values(vcf_file, keep_raw):
+    variants = _variants(vcf_file, keep_raw=keep_raw)
+    for variant_record, expected_samples in zip(variants, _expected_samples(vcf_file)):
+        # Single fields of all the samples are the values of each sample
+        for key in variant_record.format:
+            assert variant_record.samples.values_of(key) == [sample[key] for sample in expected_samples.values()]
+        assert variant_record.samples[1] == expected_samples['S2']
+
+
+def test_split_samples_str(vcf_file):
+    variants = _variants(vcf_file)
+    assert str(variants[0]).split('\t')[8:] == ['GT:AD:FA:PL:DP:FT', '0/2:3,4:0.10:0,2,4:12:a',
+                                                '0/1:6,7:0.50:0,9,9:13:c', '0/.:.:.:.:.:.']
+    assert str(variants[1]).split('\t')[9] == '0/2:3,5:0.20:1,3,5:12:b'
+    # Detached alleles are written the same way
+    assert [str(v) for v in _variants(vcf_file, keep_raw=False)] == [str(v) for v in variants]
+
+
+def test_split_samples_format_keys(vcf_file):
+    variants = _variants(vcf_file, format_keys=['AD', 'DP'])
+    for variant_record, expected_samples in zip(variants, _expected_samples(vcf_file)):
+        assert variant_record.format == [key for key in ('AD', 'DP') if key in expected_samples['S1']]
+        for sample_name, sample in variant_record.samples.items():
+            assert dict(sample) == {key: value for key, value in expected_samples[sample_name].items()
+                                    if key in variant_record.format}
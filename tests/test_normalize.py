@@ -0,0 +1,104 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import importlib
+import random
+
+import pysam
+import pytest
+
+from variant_extractor import VariantExtractor
+
+# The module, shadowed by the function of the same name
+normalize_module = importlib.import_module('variant_extractor.normalize')
+
+HEADER = '''##fileformat=VCFv4.2
+##contig=<ID=chr1,length=1000000>
+##contig=<ID=chr2,length=1000000>
+##contig=<ID=chr10,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1
+'''
+
+# Contigs of the records, the last ones are not in the header
+CONTIGS = ['chr1', 'chr2', 'chr10', 'chrUn_10', 'chrUn_9']
+
+
+def _vcf_file(tmp_path):
+    rng = random.Random(0)
+    lines = []
+    for i in range(300):
+        contig = rng.choice(CONTIGS)
+        # Few positions, so that many variants share them
+        pos = rng.randrange(1, 40) * 100
+        ref = rng.choice('ACGT')
+        alt = rng.choice([rng.choice('ACGT'.replace(ref, '')), ref + 'TT', ref + ',' + ref + 'G', '<DEL>'])
+        info = f'SVTYPE=DEL;END={pos + 50}' if alt == '<DEL>' else '.'
+        lines.append(f'{contig}\t{pos}\tv{i}\t{ref}\t{alt}\t.\tPASS\t{info}\tGT\t0/1')
+    for i in range(20):
+        contig, mate_contig = rng.choice(CONTIGS), rng.choice(CONTIGS)
+        pos, mate_pos = rng.randrange(1, 40) * 100 + 1, rng.randrange(1, 40) * 100 + 2
+        lines.append(f'{contig}\t{pos}\tb{i}_1\tA\tA[{mate_contig}:{mate_pos}[\t.\tPASS\tSVTYPE=BND;MATEID=b{i}_2\t'
+                     'GT\t0/1')
+        lines.append(f'{mate_contig}\t{mate_pos}\tb{i}_2\tC\t]{contig}:{pos}]C\t.\tPASS\tSVTYPE=BND;MATEID=b{i}_1\t'
+                     'GT\t0/1')
+    # Unsorted file
+    rng.shuffle(lines)
+    vcf_file = tmp_path / 'variants.vcf'
+    vcf_file.write_text(HEADER + '\n'.join(lines) + '\n')
+    return str(vcf_file)
+
+
+def _expected_lines(vcf_file):
+    # Serial extraction, sorted by contig and position keeping the extraction order of each position
+    extractor = VariantExtractor(vcf_file)
+    variants = list(extractor)
+    contig_order = extractor.contig_order
+    contig_order.update(variant_record.contig for variant_record in variants)
+    variants.sort(key=lambda variant_record: (contig_order.rank(variant_record.contig), variant_record.pos))
+    return [str(variant_record) for variant_record in variants]
+
+
+def _records(vcf_file):
+    with pysam.VariantFile(vcf_file) as variant_file:
+        return [str(rec).rstrip('\n') for rec in variant_file]
+
+
+@pytest.mark.parametrize('max_memory, max_merge_runs', [(1_000_000, None), (5000, None), (1000, 3)],
+                         ids=['memory', 'runs', 'merged_runs'])
+def test_normalized_variants_are_the_sorted_extraction(tmp_path, monkeypatch, max_memory, max_merge_runs):
+    vcf_file = _vcf_file(tmp_path)
+    expected = _expected_lines(vcf_file)
+    assert len(expected) == len(set(expected)) > 300
+    if max_merge_runs is not None:
+        monkeypatch.setattr(normalize_module, 'MAX_MERGE_RUNS', max_merge_runs)
+    tmp_dir = tmp_path / 'tmp'
+    tmp_dir.mkdir()
+    output_file = str(tmp_path / 'normalized.vcf')
+    assert normalize_module.normalize(vcf_file, output_file, max_memory=max_memory, tmp_dir=str(tmp_dir)) == \
+        len(expected)
+    with open(output_file) as output:
+        assert [line.rstrip('\n') for line in output if not line.startswith('#')] == expected
+    assert list(tmp_dir.iterdir()) == []
+
+
+def test_normalized_bgzipped_file_is_indexed(tmp_path):
+    vcf_file = _vcf_file(tmp_path)
+    expected_file = str(tmp_path / 'normalized.vcf')
+    output_file = str(tmp_path / 'normalized.vcf.gz')
+    normalize_module.normalize(vcf_file, expected_file, cmdline='normalize test')
+    normalize_module.normalize(vcf_file, output_file, max_memory=2000, cmdline='normalize test')
+    assert _records(output_file) == _records(expected_file)
+    with pysam.VariantFile(output_file) as variant_file:
+        assert variant_file.index is not None
+        assert '##cmdline=normalize test' in str(variant_file.header)
+        assert [str(rec).rstrip('\n') for rec in variant_file.fetch('chr2')] == \
+            [line for line in _records(expected_file) if line.startswith('chr2\t')]
+
+
+def test_normalize_bcf_is_not_supported(tmp_path):
+    with pytest.raises(ValueError, match='BCF output is not supported'):
+        normalize_module.normalize(_vcf_file(tmp_path), str(tmp_path / 'normalized.bcf'))
@@ -0,0 +1,128 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import random
+
+import pysam
+import pytest
+
+from variant_extractor import VariantExtractor
+
+HEADER = '''##fileformat=VCFv4.2
+##contig=<ID=chr1,length=1000000>
+##contig=<ID=chr2,length=1000000>
+##contig=<ID=chr10,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+'''
+
+VCF = HEADER + '''chr1\t100\tsnv1\tA\tT\t.\tPASS\t.
+chr1\t200\tnear_a\tA\tA[chr1:600[\t.\tPASS\tSVTYPE=BND;MATEID=near_b
+chr1\t300\tfar_a\tA\tA[chr1:5000[\t.\tPASS\tSVTYPE=BND;MATEID=far_b
+chr1\t400\ttra_a\tA\tA[chr2:150[\t.\tPASS\tSVTYPE=BND;MATEID=tra_b
+chr1\t500\tsnv2\tA\tT\t.\tPASS\t.
+chr1\t600\tnear_b\tC\t]chr1:200]C\t.\tPASS\tSVTYPE=BND;MATEID=near_a
+chr1\t3000\tsnv3\tA\tT\t.\tPASS\t.
+chr1\t5000\tfar_b\tC\t]chr1:300]C\t.\tPASS\tSVTYPE=BND;MATEID=far_a
+chr1\t6000\tinv\tT\t<INV>\t.\tPASS\tSVTYPE=INV;END=6500
+chr1\t6100\tsnv4\tA\tT\t.\tPASS\t.
+chr2\t100\tsnv5\tA\tT\t.\tPASS\t.
+chr2\t120\tlate_tra_a\tA\tA[chrUn_1:100[\t.\tPASS\tSVTYPE=BND;MATEID=late_tra_b
+chr2\t150\ttra_b\tC\t]chr1:400]C\t.\tPASS\tSVTYPE=BND;MATEID=tra_a
+chr2\t200\tsnv6\tA\tT\t.\tPASS\t.
+chr10\t100\tsnv7\tA\tT\t.\tPASS\t.
+chrUn_1\t100\tlate_tra_b\tC\t]chr2:120]C\t.\tPASS\tSVTYPE=BND;MATEID=late_tra_a
+chrUn_1\t200\tsnv8\tA\tT\t.\tPASS\t.
+'''
+
+
+@pytest.fixture
+def vcf_file(tmp_path):
+    path = tmp_path / 'variants.vcf'
+    path.write_text(VCF)
+    return str(path)
+
+
+def _extract(vcf_file, **kwargs):
+    extractor = VariantExtractor(vcf_file, **kwargs)
+    variants = list(extractor)
+    extractor.close()
+    return variants
+
+
+def _sorted(vcf_file, variants):
+    # Variants sorted by contig and position, keeping the extraction order of each position
+    contig_order = VariantExtractor(vcf_file).contig_order
+    contig_order.update(variant_record.contig for variant_record in variants)
+    return sorted(variants, key=lambda variant_record: (contig_order.rank(variant_record.contig), variant_record.pos))
+
+
+@pytest.mark.parametrize('reorder_window, expected_ids', [
+    # Breakends whose mate is further than the window are returned at the end of their contig
+    (10, ['snv1', 'near_a', 'snv2', 'snv3', 'inv_1', 'inv_2', 'snv4', 'far_a', 'tra_a', 'snv5', 'snv6', 'late_tra_a',
+          'snv7', 'snv8']),
+    (100_000, ['snv1', 'near_a', 'far_a', 'snv2', 'snv3', 'inv_1', 'inv_2', 'snv4', 'tra_a', 'snv5', 'snv6',
+               'late_tra_a', 'snv7', 'snv8']),
+])
+def test_ordered_window(vcf_file, reorder_window, expected_ids):
+    expected = _extract(vcf_file)
+    variants = _extract(vcf_file, ordered=True, reorder_window=reorder_window)
+    # The mate of late_tra_a is read after the output has passed its position, so it is returned at the next contig
+    # boundary
+    assert [variant_record.id for variant_record in variants] == expected_ids
+    # The same variants as the serial extraction
+    assert sorted(str(variant_record) for variant_record in variants) == \
+        sorted(str(variant_record) for variant_record in expected)
+
+
+def _random_vcf_file(tmp_path, max_distance):
+    # Sorted file whose breakend pairs are at most max_distance bp apart
+    rng = random.Random(0)
+    records = []
+    for contig in ('chr1', 'chr2', 'chr10'):
+        for i in range(100):
+            pos = rng.randrange(1, 100_000)
+            records.append((contig, pos, f'{contig}_{i}', 'A', rng.choice(['T', 'AT', '<DEL>']),
+                            f'SVTYPE=DEL;END={pos + 10}'))
+        for i in range(20):
+            pos = rng.randrange(1, 100_000)
+            mate_pos = pos + rng.randrange(1, max_distance)
+            records.append((contig, pos, f'{contig}_b{i}_1', 'A', f'A[{contig}:{mate_pos}[',
+                            f'SVTYPE=BND;MATEID={contig}_b{i}_2'))
+            records.append((contig, mate_pos, f'{contig}_b{i}_2', 'C', f']{contig}:{pos}]C',
+                            f'SVTYPE=BND;MATEID={contig}_b{i}_1'))
+    contigs = ['chr1', 'chr2', 'chr10']
+    records.sort(key=lambda record: (contigs.index(record[0]), record[1]))
+    vcf_file = tmp_path / 'random.vcf'
+    vcf_file.write_text(HEADER + ''.join(f'{contig}\t{pos}\t{id_}\t{ref}\t{alt}\t.\tPASS\t{info}\n'
+                                         for contig, pos, id_, ref, alt, info in records))
+    return pysam.tabix_index(str(vcf_file), preset='vcf')
+
+
+@pytest.mark.parametrize('reorder_window', [5000, 20_000])
+def test_ordered_is_the_sorted_extraction(tmp_path, reorder_window):
+    vcf_file = _random_vcf_file(tmp_path, max_distance=5000)
+    expected = [str(variant_record) for variant_record in _sorted(vcf_file, _extract(vcf_file))]
+    # Within the window, the output is the serial extraction sorted
+    assert [str(variant_record) for variant_record in
+            _extract(vcf_file, ordered=True, reorder_window=reorder_window)] == expected
+    # Regions with the mates of their breakends
+    regions = ['chr2', 'chr10']
+    assert [str(variant_record) for variant_record in
+            _extract(vcf_file, ordered=True, reorder_window=reorder_window, regions=regions)] == \
+        [str(variant_record) for variant_record in _sorted(vcf_file, _extract(vcf_file, regions=regions))]
+
+
+def test_ordered_small_window_keeps_the_variants(tmp_path):
+    vcf_file = _random_vcf_file(tmp_path, max_distance=5000)
+    variants = [str(variant_record) for variant_record in _extract(vcf_file, ordered=True, reorder_window=100)]
+    expected = [str(variant_record) for variant_record in _sorted(vcf_file, _extract(vcf_file))]
+    assert variants != expected
+    assert sorted(variants) == sorted(expected)
+
+
+def test_ordered_is_not_available_in_parallel(vcf_file):
+    with pytest.raises(ValueError, match='parallel'):
+        VariantExtractor(vcf_file, ordered=True, parallel=2)
@@ -0,0 +1,96 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import importlib
+import random
+
+import pysam
+import pytest
+
+from variant_extractor import VariantExtractor
+
+# The module, shadowed by the class in the package
+variant_extractor_module = importlib.import_module('variant_extractor.VariantExtractor')
+
+HEADER = '''##fileformat=VCFv4.2
+##contig=<ID=chr1,length=100000>
+##contig=<ID=chr2,length=100000>
+##contig=<ID=chr10,length=100000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1
+'''
+
+# Breakend pairs (id, contig, pos, mate contig, mate pos), with mates in the same chunk, in another chunk of the same
+# contig and in other contigs
+BREAKENDS = [('a', 'chr1', 1200, 'chr1', 1500), ('b', 'chr1', 2500, 'chr1', 9500), ('c', 'chr1', 4200, 'chr10', 300),
+             ('d', 'chr2', 700, 'chr1', 8800), ('e', 'chr2', 5100, 'chr10', 7700)]
+
+
+def _vcf_file(tmp_path, unpaired=False):
+    rng = random.Random(0)
+    records = []
+    for contig in ('chr1', 'chr2', 'chr10'):
+        for i in range(80):
+            pos = 100 + i * 120
+            ref = rng.choice('ACGT')
+            alt = rng.choice([rng.choice('ACGT'.replace(ref, '')), ref + 'TTA', ref + ',' + ref + 'G', '<DEL>'])
+            info = f'SVTYPE=DEL;END={pos + 300}' if alt == '<DEL>' else '.'
+            records.append((contig, pos, f'{contig}_{i}', ref, alt, info))
+    for name, contig, pos, mate_contig, mate_pos in BREAKENDS:
+        records.append((contig, pos, f'{name}1', 'A', f'A[{mate_contig}:{mate_pos}[', f'SVTYPE=BND;MATEID={name}2'))
+        if not unpaired or name != 'e':
+            records.append((mate_contig, mate_pos, f'{name}2', 'C', f']{contig}:{pos}]C',
+                            f'SVTYPE=BND;MATEID={name}1'))
+    contigs = ['chr1', 'chr2', 'chr10']
+    records.sort(key=lambda record: (contigs.index(record[0]), record[1]))
+    lines = [f'{contig}\t{pos}\t{id_}\t{ref}\t{alt}\t.\tPASS\t{info}\tGT\t0/1'
+             for contig, pos, id_, ref, alt, info in records]
+    vcf_file = tmp_path / 'variants.vcf'
+    vcf_file.write_text(HEADER + '\n'.join(lines) + '\n')
+    # Compresses the file and removes the original
+    return pysam.tabix_index(str(vcf_file), preset='vcf')
+
+
+def _extract(vcf_file, **kwargs):
+    extractor = VariantExtractor(vcf_file, **kwargs)
+    variants = [str(variant_record) for variant_record in extractor]
+    extractor.close()
+    return variants
+
+
+@pytest.fixture(params=[None, 1000], ids=['contigs', 'chunks'])
+def chunk_size(request, monkeypatch):
+    if request.param is not None:
+        monkeypatch.setattr(variant_extractor_module, 'PARALLEL_CHUNK_SIZE', request.param)
+    return request.param
+
+
+def test_parallel_order_is_the_serial_order(tmp_path, chunk_size):
+    vcf_file = _vcf_file(tmp_path)
+    expected = _extract(vcf_file)
+    assert len(expected) == 3 * 80 + len(BREAKENDS)
+    assert _extract(vcf_file, parallel=2) == expected
+    assert _extract(vcf_file, parallel=3, keep_raw=False) == expected
+
+
+def test_parallel_regions_are_the_serial_regions(tmp_path, chunk_size):
+    vcf_file = _vcf_file(tmp_path)
+    regions = ['chr1:1000-5000', 'chr10']
+    assert _extract(vcf_file, parallel=2, regions=regions) == _extract(vcf_file, regions=regions)
+
+
+def test_parallel_unpaired_breakends(tmp_path, chunk_size):
+    vcf_file = _vcf_file(tmp_path, unpaired=True)
+    with pytest.raises(Exception, match='There are 1 unpaired SV breakends'):
+        _extract(vcf_file, parallel=2)
+    assert _extract(vcf_file, parallel=2, ensure_pairs=False) == _extract(vcf_file, ensure_pairs=False)
+
+
+def test_parallel_requires_an_index(tmp_path):
+    vcf_file = tmp_path / 'variants.vcf'
+    vcf_file.write_text(HEADER + 'chr1\t100\tv\tA\tT\t.\tPASS\t.\tGT\t0/1\n')
+    with pytest.raises(ValueError, match='indexed'):
+        _extract(str(vcf_file), parallel=2)
@@ -0,0 +1,78 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import pysam
+import pytest
+
+from variant_extractor import VariantExtractor
+from variant_extractor.private._utils import parse_region
+
+CONTIGS = ['chr1', 'HLA-A*01:01:01:01', 'chrUn:1']
+
+VCF = '''##fileformat=VCFv4.2
+##contig=<ID=chr1,length=100000>
+##contig=<ID=HLA-A*01:01:01:01,length=3503>
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+chr1\t1\tc1\tA\tT\t.\tPASS\t.
+chr1\t500\tc2\tA\tT\t.\tPASS\t.
+HLA-A*01:01:01:01\t1\th1\tA\tT\t.\tPASS\t.
+HLA-A*01:01:01:01\t500\th2\tA\tT\t.\tPASS\t.
+'''
+
+
+@pytest.mark.parametrize('region, expected', [
+    ('chr1', ('chr1', 0, None)),
+    ('chr1:100', ('chr1', 99, None)),
+    ('chr1:1,000-2,000', ('chr1', 999, 2000)),
+    ('chr2:100-200', ('chr2', 99, 200)),
+    # Whole contigs with colons
+    ('HLA-A*01:01:01:01', ('HLA-A*01:01:01:01', 0, None)),
+    ('HLA-A*01:01:01:01:100-200', ('HLA-A*01:01:01:01', 99, 200)),
+    ('chr1:abc', ('chr1:abc', 0, None)),
+    # Braces, as in htslib
+    ('{HLA-A*01:01:01:01}', ('HLA-A*01:01:01:01', 0, None)),
+    ('{HLA-A*01:01:01}:1-10', ('HLA-A*01:01:01', 0, 10)),
+    (('chr1', 10, 20), ('chr1', 10, 20)),
+])
+def test_parse_region(region, expected):
+    assert parse_region(region, CONTIGS) == expected
+
+
+def test_parse_region_without_contigs():
+    assert parse_region('chr1:100-200') == ('chr1', 99, 200)
+    assert parse_region('HLA-A*01:01:01:01') == ('HLA-A*01:01:01', 0, None)
+    assert parse_region('chrUn') == ('chrUn', 0, None)
+
+
+def test_ambiguous_region():
+    # Both the contig HLA-A*01:01:01:01 and the position 1 of HLA-A*01:01:01
+    with pytest.raises(ValueError, match='Ambiguous'):
+        parse_region('HLA-A*01:01:01:01', CONTIGS + ['HLA-A*01:01:01'])
+
+
+def test_invalid_braced_coordinates():
+    with pytest.raises(ValueError, match='Invalid'):
+        parse_region('{chr1}:abc', CONTIGS)
+
+
+def test_regions_with_colons(tmp_path):
+    vcf_file = tmp_path / 'variants.vcf'
+    vcf_file.write_text(VCF)
+    indexed_file = pysam.tabix_index(str(vcf_file), preset='vcf')
+
+    def ids(**kwargs):
+        extractor = VariantExtractor(indexed_file, **kwargs)
+        variant_ids = [variant_record.id for variant_record in extractor]
+        extractor.close()
+        return variant_ids
+
+    def fetch_ids(region):
+        extractor = VariantExtractor(indexed_file)
+        variant_ids = [variant_record.id for variant_record in extractor.fetch(region=region)]
+        extractor.close()
+        return variant_ids
+
+    assert ids(regions=['HLA-A*01:01:01:01']) == ['h1', 'h2']
+    assert ids(regions=['HLA-A*01:01:01:01:400-600', 'chr1:1-10']) == ['h2', 'c1']
+    assert fetch_ids('HLA-A*01:01:01:01') == ['h1', 'h2']
+    assert fetch_ids('{HLA-A*01:01:01:01}:1-10') == ['h1']
@@ -0,0 +1,116 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import random
+import tempfile
+
+import pysam
+import pytest
+
+from variant_extractor import VariantExtractor
+from variant_extractor.private import _PendingBreakends
+
+HEADER = '''##fileformat=VCFv4.2
+##contig=<ID=chr1,length=1000000>
+##contig=<ID=chr2,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##FILTER=<ID=LowQual,Description="Low quality">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1
+'''
+
+BREAKEND_PAIRS = 40
+
+
+def _vcf_file(tmp_path, unpaired=0, indexed=False):
+    rng = random.Random(0)
+    records = []
+    for i in range(BREAKEND_PAIRS):
+        # All the breakends are pending in the middle of the file
+        pos = 1000 + i * 10
+        mate_contig, mate_pos = rng.choice(['chr1', 'chr2']), 100_000 + rng.randrange(0, 10_000) * 10 + i % 10
+        filter_ = 'LowQual' if i % 7 == 0 else 'PASS'
+        if i % 3:
+            info, mate_info = f'SVTYPE=BND;MATEID=m{i}', f'SVTYPE=BND;MATEID=b{i}'
+        else:
+            # Paired by position
+            info = mate_info = 'SVTYPE=BND'
+        records.append(('chr1', pos, f'b{i}', 'A', f'A[{mate_contig}:{mate_pos}[', filter_, info))
+        if i >= unpaired:
+            records.append((mate_contig, mate_pos, f'm{i}', 'C', f']chr1:{pos}]C', filter_, mate_info))
+    for i in range(100):
+        records.append(('chr1', 2000 + i * 1000, f'v{i}', 'G', 'T', 'PASS', '.'))
+    records.sort(key=lambda record: (record[0], record[1]))
+    lines = [f'{contig}\t{pos}\t{id_}\t{ref}\t{alt}\t.\t{filter_}\t{info}\tGT\t0/1'
+             for contig, pos, id_, ref, alt, filter_, info in records]
+    vcf_file = tmp_path / 'variants.vcf'
+    vcf_file.write_text(HEADER + '\n'.join(lines) + '\n')
+    if indexed:
+        return pysam.tabix_index(str(vcf_file), preset='vcf')
+    return str(vcf_file)
+
+
+class _CountingSpillStore(_PendingBreakends._SpillStore):
+    inserted = 0
+
+    def insert(self, rows):
+        rows = list(rows)
+        _CountingSpillStore.inserted += len(rows)
+        super().insert(rows)
+
+
+@pytest.fixture
+def spill_store(monkeypatch):
+    _CountingSpillStore.inserted = 0
+    monkeypatch.setattr(_PendingBreakends, '_SpillStore', _CountingSpillStore)
+    return _CountingSpillStore
+
+
+def _extract(vcf_file, **kwargs):
+    extractor = VariantExtractor(vcf_file, **kwargs)
+    variants = [str(variant_record) for variant_record in extractor]
+    extractor.close()
+    return variants
+
+
+@pytest.mark.parametrize('indexed', [False, True], ids=['plain', 'indexed'])
+@pytest.mark.parametrize('max_pending_breakends', [1, 5])
+def test_spilled_breakends_are_paired(tmp_path, spill_store, indexed, max_pending_breakends):
+    vcf_file = _vcf_file(tmp_path, indexed=indexed)
+    expected = _extract(vcf_file)
+    assert spill_store.inserted == 0
+    assert len(expected) == BREAKEND_PAIRS + 100
+    assert _extract(vcf_file, max_pending_breakends=max_pending_breakends) == expected
+    assert spill_store.inserted >= BREAKEND_PAIRS - max_pending_breakends
+    assert _extract(vcf_file, max_pending_breakends=max_pending_breakends, pass_only=True) == \
+        _extract(vcf_file, pass_only=True)
+
+
+@pytest.mark.parametrize('indexed', [False, True], ids=['plain', 'indexed'])
+def test_spilled_unpaired_breakends(tmp_path, spill_store, indexed):
+    vcf_file = _vcf_file(tmp_path, unpaired=10, indexed=indexed)
+    # Unpaired breakends are returned in the same order, wherever they were stored
+    expected = _extract(vcf_file, ensure_pairs=False)
+    assert _extract(vcf_file, ensure_pairs=False, max_pending_breakends=3) == expected
+    assert spill_store.inserted > 0
+    assert _extract(vcf_file, ensure_pairs=False, max_pending_breakends=3, pass_only=True) == \
+        _extract(vcf_file, ensure_pairs=False, pass_only=True)
+    with pytest.raises(Exception) as expected_error:
+        _extract(vcf_file)
+    with pytest.raises(Exception) as error:
+        _extract(vcf_file, max_pending_breakends=3)
+    assert str(error.value) == str(expected_error.value)
+
+
+def test_spill_store_is_removed(tmp_path, monkeypatch):
+    vcf_file = _vcf_file(tmp_path)
+    tmp_dir = tmp_path / 'tmp'
+    tmp_dir.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_dir))
+    iterator = iter(VariantExtractor(vcf_file, max_pending_breakends=1))
+    # The first variant is returned after all the breakends have been read
+    next(iterator)
+    assert len(list(tmp_dir.iterdir())) == 1
+    list(iterator)
+    assert list(tmp_dir.iterdir()) == []
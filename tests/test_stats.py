@@ -0,0 +1,43 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+from variant_extractor import VariantExtractor
+
+HEADER = '''##fileformat=VCFv4.2
+##contig=<ID=1,length=1000000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+'''
+
+BIALLELIC = [
+    '1\t100\tsnv\tA\tT\t.\tPASS\t.',
+    # Atomized into two SNVs
+    '1\t200\tmnv\tAC\tGT\t.\tPASS\t.',
+    '1\t300\tins\tA\tACGT\t.\tPASS\t.',
+    '1\t400\tdel\tACGT\tA\t.\tPASS\t.',
+    '1\t500\tsv\tA\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=1000',
+]
+
+
+def _stats(tmp_path, lines):
+    vcf_file = tmp_path / 'variants.vcf'
+    vcf_file.write_text(HEADER + '\n'.join(lines) + '\n')
+    extractor = VariantExtractor(str(vcf_file), stats=True)
+    variants = list(extractor)
+    extractor.close()
+    return extractor.stats, variants
+
+
+def test_parse_is_called_once_per_record(tmp_path):
+    stats, variants = _stats(tmp_path, BIALLELIC)
+    assert stats.records_read == len(BIALLELIC)
+    assert stats.stage_calls['parse'] == stats.records_read
+    assert stats.total_variants == len(variants) == 6
+
+
+def test_parse_is_called_once_per_allele_of_multiallelic_records(tmp_path):
+    stats, variants = _stats(tmp_path, ['1\t100\tma\tA\tT,G,C\t.\tPASS\t.'])
+    assert stats.stage_calls['split_multiallelic'] == 1
+    assert stats.stage_calls['parse'] == 1 + 3
+    assert len(variants) == 3
@@ -0,0 +1,94 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from variant_extractor import VariantExtractor  # noqa: E402
+from variant_extractor.private._IntervalIndex import IntervalIndex  # noqa: E402
+from variant_extractor.store import VariantStore  # noqa: E402
+
+VCF = '''##fileformat=VCFv4.2
+##contig=<ID=chr1,length=100000>
+##contig=<ID=chr2,length=100000>
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+chr1\t90\tsnv1\tA\tT\t.\tPASS\t.
+chr1\t100\ttra1\tA\tA[chr2:5000[\t.\tPASS\tSVTYPE=BND;MATEID=tra2
+chr1\t110\tsnv2\tC\tG\t.\tPASS\t.
+chr1\t1000\tdel\tG\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=2000
+chr2\t5000\ttra2\tC\t]chr1:100]C\t.\tPASS\tSVTYPE=BND;MATEID=tra1
+'''
+
+
+def _brute_force(starts, ends, start, end):
+    order = np.argsort(starts, kind='stable')
+    return np.array([i for i in order if starts[i] < end and ends[i] > start], dtype=np.int64)
+
+
+@pytest.mark.parametrize('n', [0, 1, 2, 3, 5, 7, 8, 9, 15, 16, 17, 31, 33, 100, 257, 1000])
+def test_interval_index_overlap(n):
+    rng = np.random.default_rng(n)
+    starts = rng.integers(0, 1000, n)
+    # Some long intervals, so that the maximum ends of the subtrees matter
+    ends = starts + np.where(rng.random(n) < 0.1, rng.integers(1, 1000, n), rng.integers(1, 20, n))
+    index = IntervalIndex(starts, ends, np.arange(n, dtype=np.int64))
+    assert len(index) == n
+    queries = [(0, 2000), (-10, 0), (2000, 3000)] + [tuple(sorted(rng.integers(0, 1100, 2))) for _ in range(50)]
+    for start, end in queries:
+        assert index.overlap(start, end).tolist() == _brute_force(starts, ends, start, end).tolist()
+
+
+@pytest.fixture
+def store(tmp_path):
+    vcf_file = tmp_path / 'variants.vcf'
+    vcf_file.write_text(VCF)
+    extractor = VariantExtractor(str(vcf_file))
+    store = VariantStore.from_records(extractor)
+    extractor.close()
+    return store
+
+
+def _ids(store, rows):
+    return [variant_record.id for variant_record in store.records(rows)]
+
+
+def test_empty_store():
+    store = VariantStore.from_records([])
+    assert len(store) == 0
+    assert store.overlap('1', 0, 100).tolist() == []
+    assert store.nearest('1', 100).tolist() == []
+    assert store.mates('1', 0, 100).tolist() == []
+
+
+def test_overlap(store):
+    assert len(store) == 4
+    assert _ids(store, store.overlap('chr1', 1, 100)) == ['snv1', 'tra1']
+    assert _ids(store, store.overlap('1', 1500, 1500)) == ['del']
+    assert store.overlap('3', 1, 100000).tolist() == []
+
+
+def test_nearest_ties_and_max_distance(store):
+    # snv1 and snv2 are both 10 bp away, ties are returned in order of position
+    assert _ids(store, store.nearest('1', 100, k=3)) == ['tra1', 'snv1', 'snv2']
+    assert _ids(store, store.nearest('1', 105, k=1)) == ['tra1']
+    assert _ids(store, store.nearest('1', 95, k=2)) == ['snv1', 'tra1']
+    assert _ids(store, store.nearest('1', 80, k=10, max_distance=20)) == ['snv1', 'tra1']
+    assert store.nearest('1', 500, k=10, max_distance=100).tolist() == []
+    # Both breakends of the deletion are near the position, it is returned once
+    assert _ids(store, store.nearest('1', 1500, k=10, max_distance=500)) == ['del']
+
+
+def test_translocation_mates(store):
+    # The translocation is a single variant, with its second breakend in chr2
+    assert _ids(store, store.mates('chr2', 4000, 6000)) == ['tra1']
+    assert store.mates('2', 5001, 6000).tolist() == []
+    assert _ids(store, store.mates('1', 1, 3000)) == ['del']
+    assert _ids(store, store.nearest('2', 4990)) == ['tra1']
+    # Translocations only cover the position of their first breakend
+    assert _ids(store, store.overlap('1', 100, 100)) == ['tra1']
+    assert store.overlap('2', 1, 100000).tolist() == []
+    assert store.contigs == ['1', '2']
@@ -0,0 +1,140 @@
+# Copyright 2022 - Barcelona Supercomputing Center
+# Author: Rodrigo Martin
+# MIT License
+import pysam
+import pytest
+
+from variant_extractor import VariantExtractor
+from variant_extractor.writer import VariantWriter
+
+VCF = '''##fileformat=VCFv4.2
+##contig=<ID=1,length=1000000>
+##contig=<ID=2,length=1000000>
+##contig=<ID=3,length=1000000>
+##FILTER=<ID=LowQual,Description="Low quality">
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of the SV">
+##INFO=<ID=MATEID,Number=.,Type=String,Description="ID of the mate breakend">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=EXTRA,Number=1,Type=String,Description="Extra information">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tNORMAL\tTUMOR
+1\t100\tsnv\tG\tA\t30.5\tPASS\tEXTRA=SNV\tGT:AD:DP\t0/0:10,0:10\t0/1:6,4:10
+1\t1000\tmultiallelic\tG\tC,T\t.\tPASS\tEXTRA=MULTIALLELIC\tGT:AD:DP\t0/0:162,6,8:176\t0/1:237,9,16:262
+1\t1500\tmnp\tGAA\tACA\t.\tLowQual\tEXTRA=MNP\tGT:AD:DP\t0/0:.:.\t0/1:.:.
+1\t2000\tdel\tCT\tC\t.\tPASS\t.\tGT:AD:DP\t0/0:5,0:5\t0/1:3,2:5
+1\t2100\tins\tC\tCAA\t.\tPASS\t.\tGT\t0/0\t0/1
+1\t3000\tshorthand_del\tT\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=5000\tGT\t0/0\t0/1
+2\t3000\tbnd_a\tT\t]2:5000]T\t.\tPASS\tSVTYPE=BND;MATEID=bnd_b\tGT\t0/0\t0/1
+2\t5000\tbnd_b\tT\tT[2:3000[\t.\tPASS\tSVTYPE=BND;MATEID=bnd_a\tGT\t0/0\t0/1
+2\t6000\tinv\tT\t<INV>\t.\tPASS\tSVTYPE=INV;END=8000\tGT\t0/0\t0/1
+3\t100\ttra_a\tA\tA]1:9000]\t.\tPASS\tSVTYPE=BND\tGT\t0/0\t0/1
+1\t9000\ttra_b\tG\tG]3:100]\t.\tPASS\tSVTYPE=BND\tGT\t0/0\t0/1
+'''
+
+OUTPUT_FORMATS = ['vcf', 'vcf.gz', 'bcf']
+
+
+@pytest.fixture
+def vcf_file(tmp_path):
+    path = tmp_path / 'variants.vcf'
+    path.write_text(VCF)
+    return str(path)
+
+
+def _write(path, variants, header, **kwargs):
+    with VariantWriter(path, header, **kwargs) as writer:
+        writer.write_all(variants)
+
+
+def _missing(value):
+    # Missing values of fields with several values are read from VCF text as a single None
+    if isinstance(value, tuple) and all(v is None for v in value):
+        return None
+    return value
+
+
+def _records(path):
+    # Fields of the records of a file, as decoded by htslib
+    with pysam.VariantFile(path) as variant_file:
+        return [(rec.contig, rec.pos, rec.id, rec.ref, rec.alts, rec.qual, list(rec.filter), rec.stop,
+                 {key: _missing(value) for key, value in rec.info.items()}, list(rec.format),
+                 [{key: _missing(value) for key, value in sample.items()} for sample in rec.samples.values()])
+                for rec in variant_file]
+
+
+def _extracted(path, **kwargs):
+    extractor = VariantExtractor(path, **kwargs)
+    variants = [(v.contig, v.pos, v.end, v.ref, v.alt, v.variant_type, v.id) for v in extractor]
+    extractor.close()
+    return variants
+
+
+@pytest.mark.parametrize('output_format', OUTPUT_FORMATS)
+@pytest.mark.parametrize('keep_raw', [True, False])
+def test_written_records_are_the_extracted_ones(vcf_file, tmp_path, output_format, keep_raw):
+    extractor = VariantExtractor(vcf_file, keep_raw=keep_raw)
+    expected = [str(variant_record) for variant_record in extractor]
+    output_file = str(tmp_path / f'output.{output_format}')
+    _write(output_file, VariantExtractor(vcf_file, keep_raw=keep_raw), extractor.header)
+    if output_format == 'vcf':
+        with open(output_file) as output:
+            assert [line.rstrip('\n') for line in output if not line.startswith('#')] == expected
+    expected_file = str(tmp_path / 'expected.vcf')
+    with open(expected_file, 'w') as output:
+        output.write(str(extractor.header) + ''.join(f'{line}\n' for line in expected))
+    assert _records(output_file) == _records(expected_file)
+    with pysam.VariantFile(output_file) as variant_file:
+        assert list(variant_file.header.samples) == list(extractor.header.samples)
+        assert list(variant_file.header.contigs) == list(extractor.header.contigs)
+    # The written variants are extracted as the same variants
+    assert _extracted(output_file, ensure_pairs=False) == _extracted(expected_file, ensure_pairs=False)
+
+
+@pytest.mark.parametrize('output_format', OUTPUT_FORMATS)
+def test_written_modified_records(vcf_file, tmp_path, output_format):
+    extractor = VariantExtractor(vcf_file)
+    variants = list(extractor)
+    for variant_record in variants[::2]:
+        variant_record.samples['TUMOR']['GT'] = (1, 1)
+        variant_record.info['EXTRA'] = 'MODIFIED'
+    for variant_record in variants[1::3]:
+        variant_record.qual = 12.5
+        variant_record.filter = ['LowQual']
+    expected_file = str(tmp_path / 'expected.vcf')
+    with open(expected_file, 'w') as output:
+        output.write(str(extractor.header).replace('#CHROM', '##FILTER=<ID=LowQual,Description="Low quality">\n#CHROM')
+                     + ''.join(f'{variant_record}\n' for variant_record in variants))
+    output_file = str(tmp_path / f'output.{output_format}')
+    _write(output_file, variants, pysam.VariantFile(expected_file).header)
+    assert _records(output_file) == _records(expected_file)
+    records = _records(output_file)
+    assert records[0][8] == {'EXTRA': 'MODIFIED'}
+    assert records[0][10][1] == {'GT': (1, 1), 'AD': (6, 4), 'DP': 10}
+    assert records[1][5:7] == (12.5, ['LowQual'])
+
+
+def test_split_genotypes_of_other_alleles_are_not_written_to_bcf(vcf_file, tmp_path):
+    extractor = VariantExtractor(vcf_file)
+    multiallelic = [variant_record for variant_record in extractor if variant_record.id.startswith('multiallelic')]
+    multiallelic[1].samples['TUMOR']['GT'] = (1, 2)
+    _write(str(tmp_path / 'output.vcf'), multiallelic, extractor.header)
+    with pytest.raises(ValueError, match='cannot be encoded'):
+        _write(str(tmp_path / 'output.bcf'), multiallelic, extractor.header)
+
+
+def test_written_buffered_lines(vcf_file, tmp_path):
+    extractor = VariantExtractor(vcf_file)
+    output_file = str(tmp_path / 'output.vcf')
+    # Smaller buffers than a line are written right away
+    _write(output_file, VariantExtractor(vcf_file), extractor.header, buffer_size=1)
+    expected_file = str(tmp_path / 'expected.vcf')
+    _write(expected_file, VariantExtractor(vcf_file), extractor.header)
+    with open(output_file) as output, open(expected_file) as expected:
+        assert output.read() == expected.read()
+
+
+def test_invalid_output_format(vcf_file, tmp_path):
+    with pytest.raises(ValueError, match='Invalid output format'):
+        VariantWriter(str(tmp_path / 'output.txt'), VariantExtractor(vcf_file).header, output_format='txt')